@@ -0,0 +1,291 @@
+# Python3
+# Measure decoding speed of every config against synthetic and recorded audio.
+# Nino Carrillo
+# 17 Oct 2026
+# Exit codes
+# 1 Wrong Python version
+# 2 Wrong arguments
+# 5 Regressions found against the baseline
+
+import sys
+import os
+import io
+import glob
+import json
+import argparse
+import time
+import resource
+import contextlib
+import traceback
+from queue import Empty
+from multiprocessing import Process, Queue
+from numpy import array_equal, clip, float64, int16
+from numpy.random import default_rng
+from scipy.io.wavfile import read as readwav
+from scipy.signal import resample_poly
+
+from pymodem import build_stacks
+from modems_codecs.chain_execute import run_tree
+from modems_codecs.stage_stats import NewTreeStats, STAGE_NAMES
+from modems_codecs.synthetic import synthetic_frames
+from modems_codecs.agc import AGC
+
+# Synthetic audio: seeded frames for the chains of each config, in seeded
+# noise, so every run measures identical input and fewer frames decoded is a
+# regression.
+SYNTHETIC_SEED = 1200
+SYNTHETIC_SAMPLE_RATE = 48000
+# RMS of the synthetic signals, in 16 bit sample units
+SYNTHETIC_LEVEL = 6000.0
+
+def synthetic_audio(demod_trees, seconds, sample_rate):
+	audio = synthetic_frames(demod_trees, sample_rate, seconds, SYNTHETIC_SEED) * SYNTHETIC_LEVEL
+	return clip(audio, -32768, 32767).astype(int16)
+
+# AGC.apply is measured at this rate, against the per-sample loop it replaced,
+# with each of these settings.
+AGC_SAMPLE_RATE = 44100
+AGC_SETTINGS = [
+	['default', {}],
+	['sustain 0.01 s', {'sustain_time': 0.01}],
+	['sustain 0', {'sustain_time': 0.0}],
+	['sustain 0.01 s, decimation 8', {'sustain_time': 0.01, 'decimation': 8}],
+	['sustain 0, decimation 8', {'sustain_time': 0.0, 'decimation': 8}]
+]
+
+def load_audio_sets(audio_dir, seconds):
+	# [name, sample_rate, samples], first seconds of each recording. The
+	# synthetic samples depend on the config, and are made once its stacks
+	# are built.
+	audio_sets = [[
+		'synthetic frames',
+		SYNTHETIC_SAMPLE_RATE,
+		None
+	]]
+	for filename in sorted(glob.glob(os.path.join(audio_dir, '*.wav'))):
+		sample_rate, audio = readwav(filename)
+		if audio.ndim > 1:
+			audio = audio[:, 0]
+		audio_sets.append([os.path.basename(filename), sample_rate, audio[:round(seconds * sample_rate)]])
+	return audio_sets
+
+def benchmark_tree(tree, audio, queue):
+	# Run one DemodTree over audio in this process and put the CPU seconds of
+	# each stage of each chain on queue. Shared stages count toward every
+	# chain that uses them, as they would if the chain ran alone.
+	# The process is forked, and starts with the pages of the benchmark
+	# process in its resident set, so its peak memory is reported as the
+	# increase over its resident set at the start. Linux starts the peak of a
+	# forked process at its resident set, not at the parent's peak.
+	start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	try:
+		with contextlib.redirect_stdout(io.StringIO()):
+			result = time_stages(tree, audio)
+	except Exception:
+		queue.put([None, traceback.format_exc()])
+		return
+	# kilobytes on Linux
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss
+	queue.put([result, peak_rss])
+
+def time_stages(tree, audio):
+	# CPU seconds of each stage, and valid frames, by chain name
+	tree_stats = NewTreeStats(tree)
+	decoded_datas = run_tree(tree, audio, tree_stats)
+	result = {}
+	for chain, chain_stats, decoded_data in zip(tree.chains(), tree_stats, decoded_datas):
+		result[chain[0]] = {stage_name: chain_stats[stage_name].cpu_time for stage_name in STAGE_NAMES}
+		result[chain[0]]['frames'] = len([packet for packet in decoded_data if packet.CalcCRC()])
+	return result
+
+def run_tree_process(tree, audio):
+	# Each tree runs alone in a fresh process, so peak memory is its own and
+	# other trees don't compete for the CPU.
+	queue = Queue()
+	process = Process(target=benchmark_tree, args=(tree, audio, queue))
+	process.start()
+	while True:
+		try:
+			result = queue.get(timeout=1.0)
+			break
+		except Empty:
+			if process.exitcode is not None:
+				result = [None, f"exited with code {process.exitcode}"]
+				break
+	process.join()
+	return result
+
+def benchmark_config(config_filename, audio_set, repeat, seconds):
+	name, sample_rate, audio = audio_set
+	stack_plan = []
+	config_file = open(config_filename, 'r')
+	for line in config_file:
+		stack_plan.append(json.loads(line))
+	config_file.close()
+	results = {}
+	try:
+		with contextlib.redirect_stdout(io.StringIO()):
+			demod_trees, report_stack = build_stacks(stack_plan, sample_rate, config_filename)
+	except Exception as error:
+		print(f"{os.path.basename(config_filename)} on {name}: can't build, {error}")
+		return results
+	if audio is None:
+		audio = synthetic_audio(demod_trees, seconds, sample_rate)
+	audio_seconds = len(audio) / sample_rate
+	for tree in demod_trees:
+		# keep the fastest time of each stage, the one least disturbed by
+		# anything else running on the machine
+		chain_results, peak_rss = run_tree_process(tree, audio)
+		for run in range(repeat - 1):
+			if chain_results is None:
+				break
+			run_results, run_peak_rss = run_tree_process(tree, audio)
+			if run_results is None:
+				# a failed repeat fails the tree, with its error
+				chain_results, peak_rss = run_results, run_peak_rss
+				break
+			peak_rss = max(peak_rss, run_peak_rss)
+			for chain_name, stages in run_results.items():
+				for stage in STAGE_NAMES:
+					chain_results[chain_name][stage] = min(chain_results[chain_name][stage], stages[stage])
+		if chain_results is None:
+			print(f"{os.path.basename(config_filename)} on {name}: {tree.names()} failed, {peak_rss}")
+			continue
+		for chain_name, stages in chain_results.items():
+			cpu_time = sum(stages[stage] for stage in STAGE_NAMES)
+			stage_rates = {}
+			for stage in STAGE_NAMES:
+				stage_rates[stage] = round(len(audio) / max(stages[stage], 1e-9))
+			key = f"{os.path.basename(config_filename)} | {name} | {chain_name}"
+			results[key] = {
+				'realtime_factor': round(audio_seconds / max(cpu_time, 1e-9), 3),
+				'samples_per_second': stage_rates,
+				'peak_rss_kb': peak_rss,
+				'frames': stages['frames']
+			}
+			print(f"{key}: {results[key]['realtime_factor']}x real time, {stages['frames']} frames, {peak_rss} kB peak")
+	return results
+
+def per_sample_apply(agc, buffer):
+	# The per-sample loop of AGC.apply, before it followed the envelope a
+	# block at a time.
+	agc.normal = max(buffer)
+	for index in range(len(buffer)):
+		agc.peak_detect(buffer[index])
+		if agc.envelope != 0:
+			buffer[index] = agc.target_amplitude * buffer[index] / agc.envelope
+
+def benchmark_agc(audio_dir, seconds, repeat):
+	# CPU seconds of AGC.apply and of the per-sample loop on seconds of each
+	# recording resampled to AGC_SAMPLE_RATE, and of seeded noise, with each
+	# of AGC_SETTINGS. Decimated settings approximate the envelope, the
+	# others must match the per-sample loop exactly.
+	audio_sets = [['noise', default_rng(SYNTHETIC_SEED).normal(0.0, SYNTHETIC_LEVEL, round(seconds * AGC_SAMPLE_RATE))]]
+	for name, sample_rate, audio in load_audio_sets(audio_dir, seconds)[1:]:
+		audio = resample_poly(audio.astype(float64), AGC_SAMPLE_RATE, sample_rate)
+		audio_sets.append([name, audio])
+	mismatches = 0
+	for name, audio in audio_sets:
+		for setting_name, settings in AGC_SETTINGS:
+			reference_settings = {key: settings[key] for key in settings if key != 'decimation'}
+			reference_time = None
+			block_time = None
+			for run in range(repeat):
+				# the modems pass the AGC numpy arrays
+				reference = audio.copy()
+				start_time = time.process_time()
+				per_sample_apply(AGC(sample_rate=AGC_SAMPLE_RATE, **reference_settings), reference)
+				run_time = time.process_time() - start_time
+				if reference_time is None or run_time < reference_time:
+					reference_time = run_time
+				output = audio.copy()
+				start_time = time.process_time()
+				AGC(sample_rate=AGC_SAMPLE_RATE, **settings).apply(output)
+				run_time = time.process_time() - start_time
+				if block_time is None or run_time < block_time:
+					block_time = run_time
+			exact = array_equal(output, reference)
+			if 'decimation' not in settings and not exact:
+				mismatches += 1
+			print(
+				f"AGC {name} | {setting_name}: per-sample {round(reference_time * 1000, 1)} ms, "
+				f"apply {round(block_time * 1000, 1)} ms, {round(reference_time / max(block_time, 1e-9), 1)}x"
+				f"{', exact' if exact else ''}"
+			)
+	return mismatches
+
+def compare(results, baseline, threshold):
+	# Regressions: slower by more than threshold, more memory by more than
+	# threshold, or fewer frames.
+	regressions = []
+	for key in sorted(results):
+		if key not in baseline:
+			continue
+		old = baseline[key]
+		new = results[key]
+		if new['realtime_factor'] < old['realtime_factor'] * (1.0 - threshold):
+			regressions.append(f"{key}: real-time factor {old['realtime_factor']} -> {new['realtime_factor']}")
+		if new['peak_rss_kb'] > old['peak_rss_kb'] * (1.0 + threshold):
+			regressions.append(f"{key}: peak RSS {old['peak_rss_kb']} -> {new['peak_rss_kb']} kB")
+		if new['frames'] < old['frames']:
+			regressions.append(f"{key}: frames {old['frames']} -> {new['frames']}")
+	return regressions
+
+def main():
+	if sys.version_info < (3, 0):
+		print("Python version should be 3.x, exiting")
+		sys.exit(1)
+	parser = argparse.ArgumentParser(
+		description="Measure decoding speed of every config against synthetic and recorded audio."
+	)
+	parser.add_argument('configs', nargs='*', help="config json files (default: configs/*.json)")
+	parser.add_argument('--audio-dir', default='audio_samples', help="directory of recorded .wav files")
+	parser.add_argument('--seconds', type=float, default=10.0, help="seconds of each audio set to decode (default 10)")
+	parser.add_argument('--repeat', type=int, default=1, help="runs of each chain, the fastest is kept (default 1)")
+	parser.add_argument(
+		'--agc',
+		action='store_true',
+		help="measure AGC.apply against its per-sample loop at 44.1 kHz instead of the configs"
+	)
+	parser.add_argument('--save', help="write the results as a JSON baseline")
+	parser.add_argument('--compare', help="JSON baseline to check the results against")
+	parser.add_argument(
+		'--threshold',
+		type=float,
+		default=0.1,
+		help="fractional slowdown or memory growth reported as a regression (default 0.1)"
+	)
+	args = parser.parse_args()
+	if args.agc:
+		if benchmark_agc(args.audio_dir, args.seconds, max(1, args.repeat)) > 0:
+			print("REGRESSION AGC.apply output differs from the per-sample loop")
+			sys.exit(5)
+		return
+	config_filenames = args.configs
+	if len(config_filenames) == 0:
+		config_filenames = sorted(glob.glob('configs/*.json'))
+
+	audio_sets = load_audio_sets(args.audio_dir, args.seconds)
+	results = {}
+	for config_filename in config_filenames:
+		for audio_set in audio_sets:
+			results.update(benchmark_config(config_filename, audio_set, max(1, args.repeat), args.seconds))
+
+	if args.save:
+		baseline_file = open(args.save, 'w')
+		json.dump(results, baseline_file, indent=1, sort_keys=True)
+		baseline_file.close()
+		print(f"Wrote {args.save}")
+	if args.compare:
+		baseline_file = open(args.compare, 'r')
+		baseline = json.load(baseline_file)
+		baseline_file.close()
+		regressions = compare(results, baseline, args.threshold)
+		for regression in regressions:
+			print(f"REGRESSION {regression}")
+		if len(regressions) > 0:
+			sys.exit(5)
+		print(f"No regressions against {args.compare}")
+
+if __name__ == "__main__":
+	main()
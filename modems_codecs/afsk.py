@@ -9,6 +9,8 @@ from math import ceil
 from numpy import arange, sin, cos, pi, convolve, sqrt
 from numpy import abs as npabs
 from numpy.fft import fft
+from modems_codecs.fir import FIR
+from modems_codecs.sliding_dft import SlidingDFT
 
 class AFSKModem:
 
@@ -66,6 +68,11 @@ class AFSKModem:
 			self.correlator_offset = 0.0		# frequency offset for correlator in hz
 
 		self.output_oversample = 1.0
+		# 'correlator' convolves the audio with quadrature tone correlators.
+		# 'sliding_dft' gives the same tone magnitudes from running sums of the
+		# audio mixed down by each tone, at a cost per sample independent of
+		# correlator_span.
+		self.detector = 'correlator'
 
 		self.tune()
 
@@ -81,6 +88,7 @@ class AFSKModem:
 		self.output_lpf_span = kwargs.get('output_lpf_span', self.output_lpf_span)
 		self.correlator_span = kwargs.get('correlator_span', self.correlator_span)
 		self.correlator_offset = kwargs.get('correlator_offset', self.correlator_offset)
+		self.detector = kwargs.get('detector', self.detector)
 		self.sample_rate = kwargs.get('sample_rate', self.sample_rate)
 		self.tune()
 
@@ -97,6 +105,7 @@ class AFSKModem:
 		self.space_freq = float(options.get('space_freq', self.space_freq))
 		self.correlator_span = float(options.get('correlator_span', self.correlator_span))
 		self.correlator_offset = float(options.get('correlator_offset', self.correlator_offset))
+		self.detector = options.get('detector', self.detector)
 		self.tune()
 
 	def tune(self):
@@ -145,23 +154,59 @@ class AFSKModem:
 
 		self.output_sample_rate = self.output_oversample*self.sample_rate
 
+		# Filter objects carry their overlap between calls to demod, so audio
+		# can be processed in consecutive blocks.
+		self.InputBPF = FIR(taps=self.input_bpf)
+		if self.detector == 'sliding_dft':
+			self.MarkDFT = SlidingDFT(
+				sample_rate = self.sample_rate,
+				frequency = self.mark_freq + self.correlator_offset,
+				lengths = [len(time_indices)]
+			)
+			self.SpaceDFT = SlidingDFT(
+				sample_rate = self.sample_rate,
+				frequency = self.space_freq + self.correlator_offset,
+				lengths = [len(time_indices)]
+			)
+		else:
+			self.MarkCorrelatorI = FIR(taps=self.mark_correlator_i)
+			self.MarkCorrelatorQ = FIR(taps=self.mark_correlator_q)
+			self.SpaceCorrelatorI = FIR(taps=self.space_correlator_i)
+			self.SpaceCorrelatorQ = FIR(taps=self.space_correlator_q)
+		self.OutputLPF = FIR(taps=self.output_lpf)
+
+	def reset(self):
+		# Clear the state carried between calls to demod, keeping the filters
+		# tune designed.
+		stages = [self.InputBPF, self.OutputLPF]
+		if self.detector == 'sliding_dft':
+			stages += [self.MarkDFT, self.SpaceDFT]
+		else:
+			stages += [self.MarkCorrelatorI, self.MarkCorrelatorQ, self.SpaceCorrelatorI, self.SpaceCorrelatorQ]
+		for stage in stages:
+			stage.reset()
+
 	def demod(self, input_audio):
 
 		# Apply the input filter.
-		audio = convolve(input_audio, self.input_bpf, 'valid')
+		audio = self.InputBPF.update(input_audio)
 		# Create the correlation products.
-		mark_mag = sqrt(
-			convolve(audio, self.mark_correlator_i, 'valid')**2
-			+ convolve(audio, self.mark_correlator_q, 'valid')**2
-		)
-		space_mag = sqrt(
-			convolve(audio, self.space_correlator_i, 'valid')**2
-			+ convolve(audio, self.space_correlator_q, 'valid')**2
-		)
+		if self.detector == 'sliding_dft':
+			mark_mag = self.MarkDFT.update(audio)[0]
+			space_mag = abs(self.space_gain) * self.SpaceDFT.update(audio)[0]
+		else:
+			mark_mag = sqrt(
+				self.MarkCorrelatorI.update(audio)**2
+				+ self.MarkCorrelatorQ.update(audio)**2
+			)
+			space_mag = sqrt(
+				self.SpaceCorrelatorI.update(audio)**2
+				+ self.SpaceCorrelatorQ.update(audio)**2
+			)
 		# The demodulated signal is mark-space:
 		audio = mark_mag - space_mag
 		# Apply the output filter:
 		if (self.output_oversample > 1.0):
 			audio = resample_poly(audio, self.output_oversample, 1)
-		audio = convolve(audio, self.output_lpf, 'valid')
+		audio = self.OutputLPF.update(audio)
 		return audio
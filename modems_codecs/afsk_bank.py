@@ -0,0 +1,145 @@
+# Python3
+# Functions for demodulating AFSK with a bank of tone pair variants
+# Nino Carrillo
+# 17 Oct 2026
+
+from scipy.signal import firwin, resample_poly
+from math import ceil
+from numpy import arange, sin, cos, pi, sqrt
+from modems_codecs.afsk import AFSKModem
+from modems_codecs.fir import FIR
+from modems_codecs.sliding_dft import SlidingDFT
+
+# Settings each variant may give, defaulting to the modem's own.
+VARIANT_SETTINGS = ['mark_freq', 'space_freq', 'space_gain', 'correlator_span', 'correlator_offset']
+
+class AFSKBankModem(AFSKModem):
+	# An AFSK modem that demodulates several variants of the same signal in
+	# one pass, and returns one demodulated stream per variant from demod. A
+	# variant is a dict of mark_freq, space_freq, space_gain, correlator_span
+	# and correlator_offset. The input and output filter settings are shared
+	# by all variants.
+	# Each distinct tone frequency and correlator length gets one pair of
+	# quadrature correlators and one output filter, shared by every variant
+	# that uses it. A correlator's magnitude scales with its taps, and the
+	# output filter is linear, so space_gain is applied to the filtered space
+	# magnitude instead of to the correlator taps:
+	#	variant output = LPF(mark magnitude) - |space_gain| * LPF(space magnitude)
+	# With the sliding_dft detector, the tones of every length at one
+	# frequency share one mixer and running sum.
+	def __init__(self, **kwargs):
+		self.variants = kwargs.get('variants', [])
+		AFSKModem.__init__(self, **kwargs)
+
+	def retune(self, **kwargs):
+		self.variants = kwargs.get('variants', self.variants)
+		AFSKModem.retune(self, **kwargs)
+
+	def StringOptionsRetune(self, options):
+		self.variants = options.get('variants', self.variants)
+		AFSKModem.StringOptionsRetune(self, options)
+
+	def tune(self):
+		self.input_bpf_tap_count = round(
+			self.sample_rate * self.input_bpf_span / self.symbol_rate
+		)
+		self.output_lpf_tap_count = round(
+			self.sample_rate * self.output_lpf_span / self.symbol_rate
+		)
+		self.input_bpf = firwin(
+			self.input_bpf_tap_count,
+			[ self.input_bpf_low_cutoff, self.input_bpf_high_cutoff ],
+			pass_zero='bandpass',
+			fs=self.sample_rate
+		)
+		self.output_lpf = firwin(
+			self.output_lpf_tap_count,
+			self.output_lpf_cutoff,
+			fs=self.sample_rate
+		)
+		self.output_sample_rate = self.output_oversample*self.sample_rate
+		self.InputBPF = FIR(taps=self.input_bpf)
+
+		# With no variants given, the bank demodulates the modem's own tone
+		# pair, like AFSKModem.
+		variants = self.variants
+		if len(variants) == 0:
+			variants = [{}]
+		# [correlator frequency, tap count] of each distinct tone
+		self.tones = []
+		# [mark tone index, space tone index, space gain] of each variant
+		self.variant_tones = []
+		for variant in variants:
+			settings = {name: float(variant.get(name, getattr(self, name))) for name in VARIANT_SETTINGS}
+			tap_count = ceil(settings['correlator_span'] * self.sample_rate / self.symbol_rate)
+			indices = []
+			for frequency in [settings['mark_freq'], settings['space_freq']]:
+				tone = [frequency + settings['correlator_offset'], tap_count]
+				if tone not in self.tones:
+					self.tones.append(tone)
+				indices.append(self.tones.index(tone))
+			self.variant_tones.append([indices[0], indices[1], abs(settings['space_gain'])])
+
+		# Filter objects carry their overlap between calls to demod, so audio
+		# can be processed in consecutive blocks.
+		self.CorrelatorsI = []
+		self.CorrelatorsQ = []
+		self.OutputLPFs = []
+		# one SlidingDFT per distinct frequency, and the [SlidingDFT index,
+		# length index] of each tone
+		self.DFTs = []
+		self.tone_outputs = []
+		if self.detector == 'sliding_dft':
+			frequencies = []
+			for frequency, tap_count in self.tones:
+				if frequency not in frequencies:
+					frequencies.append(frequency)
+			for frequency in frequencies:
+				self.DFTs.append(SlidingDFT(
+					sample_rate = self.sample_rate,
+					frequency = frequency,
+					lengths = [tap_count for tone_frequency, tap_count in self.tones if tone_frequency == frequency]
+				))
+			for frequency, tap_count in self.tones:
+				index = frequencies.index(frequency)
+				self.tone_outputs.append([index, self.DFTs[index].lengths.index(tap_count)])
+		for frequency, tap_count in self.tones:
+			if self.detector != 'sliding_dft':
+				tone_indices = arange(tap_count) * (2.0 * pi * frequency / self.sample_rate)
+				self.CorrelatorsI.append(FIR(taps=cos(tone_indices)))
+				self.CorrelatorsQ.append(FIR(taps=sin(tone_indices)))
+			self.OutputLPFs.append(FIR(taps=self.output_lpf))
+		self.reset()
+
+	def reset(self):
+		# Clear the state carried between calls to demod, keeping the filters
+		# tune designed.
+		for stage in [self.InputBPF] + self.CorrelatorsI + self.CorrelatorsQ + self.OutputLPFs + self.DFTs:
+			stage.reset()
+		# Shorter correlators complete their first output sooner. Each tone
+		# drops its first outputs until it lines up with the longest one, so
+		# all streams end on the same input sample, in every block.
+		longest = max(tap_count for frequency, tap_count in self.tones)
+		self.tone_skips = [longest - tap_count for frequency, tap_count in self.tones]
+
+	def demod(self, input_audio):
+		# Returns a list of demodulated streams, in variant order.
+		audio = self.InputBPF.update(input_audio)
+		detected = [detector.update(audio) for detector in self.DFTs]
+		magnitudes = []
+		for index in range(len(self.tones)):
+			if self.detector == 'sliding_dft':
+				detector, length = self.tone_outputs[index]
+				magnitude = detected[detector][length]
+			else:
+				magnitude = sqrt(
+					self.CorrelatorsI[index].update(audio)**2
+					+ self.CorrelatorsQ[index].update(audio)**2
+				)
+			skip = min(self.tone_skips[index], len(magnitude))
+			self.tone_skips[index] -= skip
+			magnitude = magnitude[skip:]
+			if (self.output_oversample > 1.0):
+				magnitude = resample_poly(magnitude, self.output_oversample, 1)
+			magnitudes.append(self.OutputLPFs[index].update(magnitude))
+		return [magnitudes[mark] - space_gain * magnitudes[space] for mark, space, space_gain in self.variant_tones]
@@ -12,6 +12,7 @@ from modems_codecs.data_classes import IQData
 from modems_codecs.pi_control import PI_control
 from modems_codecs.iir import IIR_1
 from modems_codecs.nco import NCO
+from modems_codecs.fir import FIR
 
 class AFSKPLLModem:
 
@@ -52,6 +53,7 @@ class AFSKPLLModem:
 			)
 
 		self.oscillator_amplitude = 1.0
+		self.agc_decimation = 1			# AGC envelope samples per update
 
 
 
@@ -77,6 +79,7 @@ class AFSKPLLModem:
 		self.output_lpf_span = float(options.get('output_lpf_span', self.output_lpf_span))
 		self.sample_rate = float(options.get('sample_rate', self.sample_rate))
 		self.carrier_freq = float(options.get('carrier_freq', self.carrier_freq))
+		self.agc_decimation = int(options.get('agc_decimation', self.agc_decimation))
 		self.tune()
 
 	def tune(self):
@@ -126,7 +129,8 @@ class AFSKPLLModem:
 			sustain_time = self.agc_sustain_time,
 			decay_rate = self.agc_decay_rate,
 			target_amplitude = self.oscillator_amplitude,
-			record_envelope = False
+			record_envelope = False,
+			decimation = self.agc_decimation
 		)
 
 		self.NCO = NCO(
@@ -137,10 +141,21 @@ class AFSKPLLModem:
 		)
 		self.output_sample_rate = self.sample_rate
 
+		# Filter objects carry their overlap between calls to demod, so audio
+		# can be processed in consecutive blocks.
+		self.InputBPF = FIR(taps=self.input_bpf)
+		self.OutputLPF = FIR(taps=self.output_lpf)
+
+	def reset(self):
+		# Clear the state carried between calls to demod, keeping the filters
+		# tune designed.
+		for stage in [self.InputBPF, self.AGC, self.NCO, self.LoopFilter, self.FeedbackController, self.OutputLPF]:
+			stage.reset()
+
 	def demod(self, input_audio):
 
 		# Apply the input filter.
-		audio = convolve(input_audio, self.input_bpf, 'valid')
+		audio = self.InputBPF.update(input_audio)
 
 		# perform AGC on the audio samples, saving over the original samples
 		self.AGC.apply(audio)
@@ -165,6 +180,6 @@ class AFSKPLLModem:
 			self.pi_i.append(self.FeedbackController.integral)
 
 		# Apply the output filter:
-		demod_audio = convolve(demod_audio, self.output_lpf, 'valid')
+		demod_audio = self.OutputLPF.update(demod_audio)
 
 		return demod_audio
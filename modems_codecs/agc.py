@@ -3,6 +3,25 @@
 # Nino Carrillo
 # 9 Apr 2024
 
+from math import ceil
+from numpy import abs as absolute, arange, asarray, concatenate, cumsum, divide, empty, flatnonzero, full, maximum, searchsorted, subtract, zeros
+
+# After an attack, samples are followed one at a time until this many pass
+# without another, since attacks come in bursts at the start of a signal.
+# While the next attack after each run comes sooner than the run's length,
+# attacks are too close together for windows to pay, and the run doubles up
+# to MAX_SCALAR_RUN.
+SCALAR_RUN = 32
+MAX_SCALAR_RUN = 256
+# Samples converted for the sample loop at a time.
+SCALAR_SPAN = 256
+# Between attacks the envelope is predicted for a window of samples at once.
+# The first window after an attack covers the rest of the sustain time and
+# MIN_WINDOW samples of decay, and the window doubles after every window
+# without an attack.
+MIN_WINDOW = 64
+MAX_WINDOW = 65536
+
 class AGC:
 	def __init__(self, **kwargs):
 		self.attack_rate = kwargs.get('attack_rate', 500.0)
@@ -11,17 +30,35 @@ class AGC:
 		self.sample_rate = kwargs.get('sample_rate', 8000.0)
 		self.target_amplitude = kwargs.get('target_amplitude', 10000.0)
 		self.record_envelope = kwargs.get('record_envelope', False)
+		# follow the envelope of the peak of every group of this many samples,
+		# and interpolate the gain between groups. 1 follows every sample and
+		# gives exactly the per-sample envelope.
+		self.decimation = max(1, int(kwargs.get('decimation', 1)))
 		# adjust the agc attack and decay rates to per-sample values
 		self.scaled_attack_rate = self.attack_rate / self.sample_rate
 		self.scaled_decay_rate = self.decay_rate / self.sample_rate
 		self.sustain_increment = 1 / self.sample_rate
+		self.hold_samples = sustain_samples(self.sustain_time, self.sustain_increment)
+		# False scales the rates by the peak of each buffer passed to apply, as
+		# a whole file is processed. True scales them by the running peak of
+		# all samples so far, so consecutive blocks give the same envelope
+		# wherever the block boundaries fall.
+		self.running_peak = kwargs.get('running_peak', False)
+		self.reset()
+
+	def reset(self):
+		# Forget the envelope, as before the first sample.
 		self.envelope = 0
 		self.positive_envelope = 0
 		self.negative_envelope = 0
 		self.zero = 0
 		self.normal = 1.0
 		self.envelope_buffer = []
-		self.sustain_count = 0
+		# samples since the last attack
+		self.sustain_samples = 0
+		# samples without an attack in the current sample loop run of follow
+		self.quiet_samples = 0
+		self.input_peak = 0
 
 	def peak_detect(self, sample):
 		compare_value = abs(sample)
@@ -29,25 +66,25 @@ class AGC:
 			self.envelope += (self.scaled_attack_rate * self.normal)
 			if self.envelope > compare_value:
 				self.envelope = compare_value
-			self.sustain_count = 0.0
-		if self.sustain_count >= self.sustain_time:
+			self.sustain_samples = 0
+		if self.sustain_samples >= self.hold_samples:
 			self.envelope -= (self.scaled_decay_rate * self.normal)
 			if self.envelope < 0:
 				self.envelope = 0
-		self.sustain_count += self.sustain_increment
+		self.sustain_samples += 1
 
 	def simple_peak_detect(self, sample):
 		if sample > self.positive_envelope:
 			self.positive_envelope += self.attack_rate
 			if self.positive_envelope > sample:
 				self.positive_envelope = sample
-			self.sustain_count = 0.0
+			self.sustain_samples = 0
 		elif sample < self.negative_envelope:
 			self.negative_envelope -= self.attack_rate
 			if self.negative_envelope < sample:
 				self.negative_envelope = sample
-			self.sustain_count = 0.0
-		if self.sustain_count >= self.sustain_time:
+			self.sustain_samples = 0
+		if self.sustain_samples >= self.hold_samples:
 			self.positive_envelope -= self.decay_rate
 			if self.positive_envelope < 0:
 				self.positive_envelope = 0
@@ -56,25 +93,264 @@ class AGC:
 				self.negative_envelope = 0
 		self.envelope = (self.positive_envelope - self.negative_envelope) / 2
 		self.zero = self.negative_envelope + self.envelope
-		self.sustain_count += self.sustain_increment
+		self.sustain_samples += 1
+
+	def follow(self, inputs, levels, attack, decay, hold_samples):
+		# Block version of the attack, sustain and decay steps of peak_detect.
+		# Each level follows its input array from below, and all levels share
+		# one sustain count. Returns the level after each sample, for each
+		# input.
+		# Between attacks a level is flat until the sustain time runs out and
+		# then falls by decay each sample, so it is predicted for a whole
+		# window with array operations and compared with the input to find the
+		# next attack. Attacks are followed one sample at a time.
+		count = len(inputs[0])
+		track_count = len(levels)
+		outputs = [empty(count) for level in levels]
+		levels = [float(level) for level in levels]
+		position = 0
+		window = MIN_WINDOW
+		quiet_run = SCALAR_RUN
+		after_run = False
+		while position < count:
+			end = min(count, position + window)
+			length = end - position
+			# first sample of the window that decays, if none attack
+			decay_start = min(max(hold_samples - self.sustain_samples, 0), length)
+			attack_index = length
+			for index in range(track_count):
+				# Each sample is compared with the level before it, which is
+				# flat up to and including sample decay_start.
+				window_input = inputs[index][position:end]
+				attacks = window_input[:decay_start + 1] > levels[index]
+				first = int(attacks.argmax())
+				if attacks[first]:
+					attack_index = min(attack_index, first)
+					continue
+				if decay_start + 1 >= min(length, attack_index):
+					continue
+				# level after each decaying sample, from sequential subtraction,
+				# which rounds exactly like the sample loop
+				decay_end = min(length, attack_index)
+				steps = full(decay_end - decay_start + 1, decay, dtype=float)
+				steps[0] = levels[index]
+				decayed = maximum(subtract.accumulate(steps)[1:], 0)
+				attacks = window_input[decay_start + 1:decay_end] > decayed[:-1]
+				first = int(attacks.argmax())
+				if attacks[first]:
+					attack_index = min(attack_index, decay_start + 1 + first)
+			# levels after each sample up to the attack, or to the end of the
+			# window
+			for index in range(track_count):
+				predicted = outputs[index][position:position + attack_index]
+				flat_end = min(decay_start, attack_index)
+				predicted[:flat_end] = levels[index]
+				if flat_end < attack_index:
+					steps = full(attack_index - flat_end + 1, decay, dtype=float)
+					steps[0] = levels[index]
+					maximum(subtract.accumulate(steps)[1:], 0, out=predicted[flat_end:])
+			if after_run:
+				if attack_index < quiet_run:
+					quiet_run = min(MAX_SCALAR_RUN, quiet_run * 2)
+				else:
+					quiet_run = SCALAR_RUN
+				after_run = False
+			if attack_index == length:
+				levels = [float(output[end - 1]) for output in outputs]
+				self.sustain_samples += length
+				position = end
+				window = min(MAX_WINDOW, window * 2)
+				continue
+			# levels before the attack
+			for index in range(track_count):
+				if attack_index > 0:
+					levels[index] = float(outputs[index][position + attack_index - 1])
+			self.sustain_samples += attack_index
+			position += attack_index
+			# Follow the attack one sample at a time, until quiet_run samples
+			# pass without another.
+			self.quiet_samples = 0
+			while position < count:
+				end = min(count, position + SCALAR_SPAN)
+				spans = [input[position:end].tolist() for input in inputs]
+				if track_count == 1:
+					span_levels = [self.follow_samples(spans[0], levels, attack, decay, hold_samples, quiet_run)]
+				else:
+					span_levels = self.follow_sample_tracks(spans, levels, attack, decay, hold_samples, quiet_run)
+				used = len(span_levels[0])
+				for index in range(track_count):
+					outputs[index][position:position + used] = span_levels[index]
+				position += used
+				if position < end:
+					# the run ended before the span
+					break
+			after_run = True
+			# the levels are flat, and cheap to compare, until the sustain
+			# time runs out
+			window = min(MAX_WINDOW, max(hold_samples - self.sustain_samples, 0) + MIN_WINDOW)
+		return outputs
+
+	def follow_samples(self, span, levels, attack, decay, hold_samples, quiet_run):
+		# The sample loop of follow for one level, with the level in levels[0].
+		# Stops after quiet_run samples without an attack.
+		level = levels[0]
+		sustain = self.sustain_samples
+		quiet = self.quiet_samples
+		span_levels = []
+		for sample in span:
+			if sample > level:
+				level += attack
+				if level > sample:
+					level = sample
+				sustain = 0
+				quiet = 0
+			else:
+				quiet += 1
+			if sustain >= hold_samples:
+				level -= decay
+				if level < 0:
+					level = 0
+			sustain += 1
+			span_levels.append(level)
+			if quiet >= quiet_run:
+				break
+		levels[0] = level
+		self.sustain_samples = sustain
+		self.quiet_samples = quiet
+		return span_levels
+
+	def follow_sample_tracks(self, spans, levels, attack, decay, hold_samples, quiet_run):
+		# The sample loop of follow for several levels sharing one sustain
+		# count.
+		track_count = len(levels)
+		span_levels = [[] for level in levels]
+		quiet = self.quiet_samples
+		for offset in range(len(spans[0])):
+			attacked = False
+			for index in range(track_count):
+				sample = spans[index][offset]
+				if sample > levels[index]:
+					levels[index] += attack
+					if levels[index] > sample:
+						levels[index] = sample
+					attacked = True
+			if attacked:
+				self.sustain_samples = 0
+				quiet = 0
+			else:
+				quiet += 1
+			if self.sustain_samples >= hold_samples:
+				for index in range(track_count):
+					levels[index] -= decay
+					if levels[index] < 0:
+						levels[index] = 0
+			self.sustain_samples += 1
+			for index in range(track_count):
+				span_levels[index].append(levels[index])
+			if quiet >= quiet_run:
+				break
+		self.quiet_samples = quiet
+		return span_levels
+
+	def follow_decimated(self, magnitude):
+		# Follow the peak of each group of decimation samples, with the rates
+		# and sustain time scaled to the group rate, and interpolate the
+		# envelope linearly between the last sample of each group.
+		count = len(magnitude)
+		group_count = ceil(count / self.decimation)
+		padded = concatenate((magnitude, full(group_count * self.decimation - count, magnitude[-1])))
+		peaks = padded[0::self.decimation].copy()
+		for offset in range(1, self.decimation):
+			maximum(peaks, padded[offset::self.decimation], out=peaks)
+		group_envelope = self.follow(
+			[peaks],
+			[self.envelope],
+			self.scaled_attack_rate * self.normal * self.decimation,
+			self.scaled_decay_rate * self.normal * self.decimation,
+			ceil(self.hold_samples / self.decimation)
+		)[0]
+		starts = concatenate(([self.envelope], group_envelope[:-1]))
+		steps = (group_envelope - starts) / self.decimation
+		fractions = arange(1, self.decimation + 1)
+		return (starts[:, None] + steps[:, None] * fractions[None, :]).ravel()[:count]
+
+	def simple_envelope(self, samples):
+		# Block version of simple_peak_detect. Returns the envelope after each
+		# sample.
+		samples = asarray(samples, dtype=float)
+		if len(samples) == 0:
+			return empty(0)
+		positive, negative = self.follow(
+			[samples, -samples],
+			[self.positive_envelope, -self.negative_envelope],
+			self.attack_rate,
+			self.decay_rate,
+			self.hold_samples
+		)
+		self.positive_envelope = positive[-1]
+		self.negative_envelope = -negative[-1]
+		self.envelope = (self.positive_envelope - self.negative_envelope) / 2
+		self.zero = self.negative_envelope + self.envelope
+		return (positive + negative) / 2
 
 	def apply(self, buffer):
 		# This routine applies a scaling factor to each sample in buffer.
 		# The scaling factor is determined by the detected envelope.
+		if len(buffer) == 0:
+			return
 
 		# For the agc attack and decay rates to makes sense, we need to have
 		# some pre-knowledge about the maximum possible value of the data stream.
-		self.normal = max(buffer)
-		self.envelope_buffer = []
-		i = 0
-		for sample in buffer:
-			# detect the Envelope
-			self.peak_detect(sample)
-			# scale the sample
-			# This will drive the signal stream to match the local oscillator amplitude
-			if self.envelope!= 0:
-				buffer[i] =  self.target_amplitude * sample / (self.envelope)
-			if self.record_envelope:
-				self.envelope_buffer.append(self.envelope / self.normal)
+		if self.running_peak:
+			# The reference is the largest value seen so far, taken sample by
+			# sample, so a new peak changes the rates from the sample where it
+			# occurs. The buffer is followed in runs of samples that share one
+			# reference.
+			peaks = maximum.accumulate(buffer)
+			maximum(peaks, self.input_peak, out=peaks)
+			bounds = concatenate(([0], flatnonzero(peaks[1:] != peaks[:-1]) + 1, [len(buffer)])).tolist()
+			normals = peaks[bounds[:-1]].tolist()
+		else:
+			# The reference is the largest value in the buffer.
+			peaks = None
+			bounds = [0, len(buffer)]
+			normals = [float(buffer.max())]
+		# detect the Envelope
+		magnitude = absolute(buffer)
+		envelopes = []
+		for start, end, normal in zip(bounds[:-1], bounds[1:], normals):
+			self.normal = normal
+			if self.decimation > 1:
+				envelopes.append(self.follow_decimated(magnitude[start:end]))
+			else:
+				envelopes.append(self.follow(
+					[magnitude[start:end]],
+					[self.envelope],
+					self.scaled_attack_rate * self.normal,
+					self.scaled_decay_rate * self.normal,
+					self.hold_samples
+				)[0])
+			self.envelope = envelopes[-1][-1]
+		envelope = envelopes[0] if len(envelopes) == 1 else concatenate(envelopes)
+		self.input_peak = self.normal
+		# scale the sample
+		# This will drive the signal stream to match the local oscillator amplitude
+		divide(self.target_amplitude * buffer, envelope, out=buffer, where=(envelope != 0))
+		if self.record_envelope:
+			if peaks is None:
+				peaks = self.normal
+			self.envelope_buffer = divide(envelope, peaks, out=zeros(len(envelope)), where=(peaks != 0))
 
-			i += 1
+def sustain_samples(sustain_time, sustain_increment):
+	# Samples after an attack before the envelope decays: the first count at
+	# which sustain_increment, added up one at a time like a running float,
+	# reaches sustain_time.
+	if sustain_time <= 0:
+		return 0
+	length = ceil(sustain_time / sustain_increment) + 2
+	while True:
+		totals = cumsum(full(length, sustain_increment))
+		index = searchsorted(totals, sustain_time)
+		if index < length:
+			return int(index) + 1
+		length *= 2
@@ -0,0 +1,79 @@
+# Python3
+# Functions for memory-mapped access to audio files
+# Nino Carrillo
+# 17 Oct 2026
+
+import os
+from numpy import memmap, dtype, zeros
+
+# Raw PCM sample formats, by the names arecord and sox use.
+RAW_FORMATS = {
+	's16le': '<i2',
+	's32le': '<i4',
+	'f32le': '<f4'
+}
+
+# Block size used with memory-mapped audio when none is given, in seconds.
+# Processing a mapped file in blocks keeps the float64 working copy small.
+DEFAULT_BLOCK_SECONDS = 1.0
+
+class MappedAudio:
+	def __init__(self, **kwargs):
+		# A reference to PCM samples stored in a file. Each process maps the
+		# file itself, so samples are paged in from the operating system's file
+		# cache as they are used and are never copied between processes.
+		self.filename = kwargs.get('filename')
+		self.offset = kwargs.get('offset', 0)
+		self.dtype = kwargs.get('dtype', '<i2')
+		self.channels = kwargs.get('channels', 1)
+		self.sample_rate = kwargs.get('sample_rate', 8000)
+		frame_size = dtype(self.dtype).itemsize * self.channels
+		self.sample_count = (os.path.getsize(self.filename) - self.offset) // frame_size
+		if 'sample_count' in kwargs:
+			self.sample_count = min(self.sample_count, kwargs['sample_count'])
+
+	def attach(self):
+		if self.sample_count == 0:
+			return zeros(0, dtype=self.dtype)
+		audio = memmap(
+			self.filename,
+			dtype = self.dtype,
+			mode = 'r',
+			offset = self.offset,
+			shape = (self.sample_count, self.channels)
+		)
+		# The first channel, as a strided view. Modems take mono audio.
+		return audio[:, 0]
+
+	def unlink(self):
+		# nothing to release, the file stays where it is
+		pass
+
+def open_mapped_wav(filename):
+	# scipy parses the header and maps the sample data; only the location and
+	# format of the data are kept. Raises ValueError for formats that can't be
+	# mapped, like 24 bit samples.
+	from scipy.io.wavfile import read as readwav
+	sample_rate, audio = readwav(filename, mmap=True)
+	if audio.ndim > 1:
+		channels = audio.shape[1]
+	else:
+		channels = 1
+	result = MappedAudio(
+		filename = filename,
+		offset = audio.offset,
+		dtype = audio.dtype.str,
+		channels = channels,
+		sample_rate = sample_rate,
+		sample_count = audio.shape[0]
+	)
+	del audio
+	return result
+
+def open_mapped_raw(filename, sample_rate, raw_format, channels=1):
+	return MappedAudio(
+		filename = filename,
+		dtype = RAW_FORMATS[raw_format],
+		channels = channels,
+		sample_rate = sample_rate
+	)
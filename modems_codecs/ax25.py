@@ -15,6 +15,10 @@ class AX25Codec:
 		self.max_packet_length = kwargs.get('max_packet_length', 1023)
 		self.identifier = kwargs.get('ident', 1)
 
+		self.reset()
+
+	def reset(self):
+		# Drop any partly received frame.
 		self.working_byte = 0
 		self.working_packet = PacketMeta()
 		self.byte_index = 0
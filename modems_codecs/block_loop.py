@@ -0,0 +1,98 @@
+# Python3
+# Functions for carrier loops updated once per block of samples
+# Nino Carrillo
+# 17 Oct 2026
+
+from math import cos, sin, pi
+from numpy import add, arange, asarray, concatenate, int64, repeat
+from modems_codecs.iir import IIR_1
+from modems_codecs.nco import PHASE_MASK, PHASE_MODULUS
+
+class BlockLoop:
+	# Drives an NCO the way a per-sample Costas loop does, but updates the
+	# loop filter, PI controller and NCO frequency once per block of samples.
+	# The modem mixes its signal with the reference phases of the NCO (the
+	# phases it would have with control held at 0), and passes one complex
+	# detector term per sample, raised to the power order, so that rotating a
+	# block sum by the NCO's offset from the reference gives the phase error
+	# of the whole block:
+	#	block error = detector_gain * imag(exp(j * order * offset) * sum) / block_size
+	# The offset is taken at the middle of the block, where the NCO frequency
+	# is constant.
+	def __init__(self, **kwargs):
+		self.NCO = kwargs.get('nco')
+		self.FeedbackController = kwargs.get('controller')
+		self.block_size = kwargs.get('block_size', 8)
+		# The per-sample loop filter, redesigned to run at the block rate. The
+		# cutoff is kept below the block rate Nyquist frequency.
+		sample_filter = kwargs.get('loop_filter')
+		block_rate = sample_filter.sample_rate / self.block_size
+		self.Loop_LPF = IIR_1(
+			sample_rate=block_rate,
+			filter_type=sample_filter.filter_type,
+			cutoff=min(sample_filter.cutoff_freq, 0.4 * block_rate),
+			gain=sample_filter.gain
+		)
+		self.order = kwargs.get('order', 2)
+		self.detector_gain = kwargs.get('detector_gain', 1.0)
+		# round the NCO control to whole Hz, like the MPSK loop
+		self.round_control = kwargs.get('round_control', False)
+		self.reference_step = int(self.NCO.phase_scaling_factor * self.NCO.set_frequency) & PHASE_MASK
+		self.reset()
+
+	def reset(self):
+		# Start a new block, with the reference at the NCO's phase, so reset
+		# the NCO first.
+		self.Loop_LPF.reset()
+		# samples of the current block already processed, their rotated
+		# detector sum, and the NCO phase step during the block
+		self.position = 0
+		self.pending = 0j
+		self.step = 0
+		# The reference is a free running oscillator at the NCO set
+		# frequency, so detector filters in the modem see one continuous
+		# reference across calls. offset is the NCO phase minus the reference
+		# phase, in the units of the NCO phase accumulator.
+		self.reference_accumulator = self.NCO.phase_accumulator
+		self.offset = 0
+
+	def reference_phases(self, count):
+		# reference phase after each of the next count samples, in radians
+		phases = (arange(1, count + 1, dtype=int64) * self.reference_step + self.reference_accumulator) & PHASE_MASK
+		return phases * (2.0 * pi / PHASE_MODULUS)
+
+	def run(self, terms):
+		# Run the loop over the detector terms of the next len(terms) samples.
+		# Returns the NCO control for each sample, for NCO.update_block. A
+		# block left incomplete is carried into the next call, so consecutive
+		# calls match one long call.
+		count = len(terms)
+		if count == 0:
+			return asarray([])
+		first = min(count, self.block_size - self.position)
+		starts = concatenate(([0], arange(first, count, self.block_size)))
+		lengths = concatenate((starts[1:], [count])) - starts
+		sums = add.reduceat(asarray(terms, dtype=complex), starts).tolist()
+		controls = []
+		offset = self.offset
+		for block_sum, length in zip(sums, lengths.tolist()):
+			if self.position == 0:
+				self.step = int(self.NCO.phase_scaling_factor * (self.NCO.set_frequency + self.NCO.control))
+			offset_step = self.step - self.reference_step
+			middle = offset + ((self.block_size + 1) / 2 - self.position) * offset_step
+			angle = self.order * 2.0 * pi * (middle % PHASE_MODULUS) / PHASE_MODULUS
+			self.pending += complex(cos(angle), sin(angle)) * block_sum
+			controls.append(self.NCO.control)
+			offset = (offset + length * offset_step) & PHASE_MASK
+			self.position += length
+			if self.position == self.block_size:
+				self.Loop_LPF.update(self.detector_gain * self.pending.imag / self.block_size)
+				control = self.FeedbackController.update_saturate(self.Loop_LPF.output, self.block_size)
+				if self.round_control:
+					control = round(control)
+				self.NCO.control = control
+				self.pending = 0j
+				self.position = 0
+		self.offset = offset
+		self.reference_accumulator = (self.reference_accumulator + count * self.reference_step) & PHASE_MASK
+		return repeat(controls, lengths)
@@ -3,67 +3,399 @@
 # Nino Carrillo
 # 9 Apr 2024
 
-import modems_codecs.psk
-import modems_codecs.afsk
-import modems_codecs.fsk
-import modems_codecs.lfsr
-import modems_codecs.slicer
-import modems_codecs.il2p
-import modems_codecs.ax25
-import modems_codecs.afsk_pll
 from modems_codecs.string_ops import check_boolean
+import importlib
+import hashlib
+import json
+import sys
 
+# Stage types by kind and config 'type' string. Each entry is the
+# 'module:class' of the stage, imported the first time a config uses it, so a
+# process only imports the modems, slicers and codecs it runs.
+STAGE_REGISTRY = {
+	'modem': {
+		'qpsk': 'modems_codecs.psk:QPSKModem',
+		'mpsk': 'modems_codecs.psk:MPSKModem',
+		'bpsk': 'modems_codecs.psk:BPSKModem',
+		'fsk': 'modems_codecs.fsk:FSKModem',
+		'afsk': 'modems_codecs.afsk:AFSKModem',
+		'afsk_pll': 'modems_codecs.afsk_pll:AFSKPLLModem',
+		'afsk_bank': 'modems_codecs.afsk_bank:AFSKBankModem'
+	},
+	'slicer': {
+		'quadrature': 'modems_codecs.slicer:QuadratureSlicer',
+		'binary': 'modems_codecs.slicer:BinarySlicer',
+		'4level': 'modems_codecs.slicer:FourLevelSlicer'
+	},
+	'stream': {
+		'lfsr': 'modems_codecs.lfsr:LFSR'
+	},
+	'codec': {
+		'il2p': 'modems_codecs.il2p:IL2PCodec',
+		'ax25': 'modems_codecs.ax25:AX25Codec'
+	}
+}
+
+# Installed packages can add stage types through these entry point groups.
+# The entry point name is the config 'type' string, and its value the
+# 'module:class' of the stage. Built-in types take precedence.
+ENTRY_POINT_GROUPS = {
+	'modem': 'pymodem.modems',
+	'slicer': 'pymodem.slicers',
+	'stream': 'pymodem.streams',
+	'codec': 'pymodem.codecs'
+}
+loaded_entry_points = set()
+# 'name version' of the package that provides each entry point stage type,
+# by (kind, type string)
+entry_point_packages = {}
+# hashes of stage module files, by file name
+source_hashes = {}
+
+def RegisterStage(kind, type_name, factory):
+	# factory is a class or callable, or its 'module:class' string. Modems
+	# and slicers are built as factory(sample_rate=, config=), streams as
+	# factory(), and codecs as factory(ident=chain name). Each is then passed
+	# the config 'options' through StringOptionsRetune, if it has one.
+	STAGE_REGISTRY[kind][type_name] = factory
+
+def load_entry_points(kind):
+	if kind in loaded_entry_points:
+		return
+	loaded_entry_points.add(kind)
+	try:
+		from importlib.metadata import entry_points
+		found = entry_points(group=ENTRY_POINT_GROUPS[kind])
+	except Exception:
+		# no package metadata to search
+		return
+	for entry_point in found:
+		if entry_point.name not in STAGE_REGISTRY[kind]:
+			STAGE_REGISTRY[kind][entry_point.name] = entry_point.value
+			package = getattr(entry_point, 'dist', None)
+			if package is not None:
+				entry_point_packages[(kind, entry_point.name)] = f"{package.name} {package.version}"
+
+def LookupStage(kind, type_name):
+	# The factory registered for type_name, imported if need be, or None.
+	if type_name not in STAGE_REGISTRY[kind]:
+		load_entry_points(kind)
+	factory = STAGE_REGISTRY[kind].get(type_name)
+	if isinstance(factory, str):
+		module_name, attribute = factory.split(':')
+		factory = getattr(importlib.import_module(module_name), attribute)
+		STAGE_REGISTRY[kind][type_name] = factory
+	return factory
+
+def StageSource(kind, type_name):
+	# Version of the code that builds a stage type, for plan cache keys: a
+	# hash of the file of the module defining its class, and the name and
+	# version of the package providing it through an entry point, since that
+	# module may use others of its package.
+	factory = LookupStage(kind, type_name)
+	if factory is None:
+		return ''
+	module = sys.modules.get(getattr(factory, '__module__', ''))
+	filename = getattr(module, '__file__', None)
+	if filename is not None and filename not in source_hashes:
+		try:
+			source_file = open(filename, 'rb')
+			source_hashes[filename] = hashlib.sha256(source_file.read()).hexdigest()
+			source_file.close()
+		except OSError:
+			source_hashes[filename] = ''
+	return f"{source_hashes.get(filename, '')} {entry_point_packages.get((kind, type_name), '')}"
+
+def retune(new_object, input_args):
+	if hasattr(new_object, 'StringOptionsRetune'):
+		new_object.StringOptionsRetune(input_args['options'])
 
 def ModemConfigurator(arg_sample_rate, input_args):
 	new_object = []
 	if input_args.get('type'):
-		if input_args['type'] == 'qpsk':
-			new_object = modems_codecs.psk.QPSKModem(sample_rate=arg_sample_rate, config=input_args['config'])
-			new_object.StringOptionsRetune(input_args['options'])
-		elif input_args['type'] == 'mpsk':
-			new_object = modems_codecs.psk.MPSKModem(sample_rate=arg_sample_rate, config=input_args['config'])
-			new_object.StringOptionsRetune(input_args['options'])
-		elif input_args['type'] == 'bpsk':
-			new_object = modems_codecs.psk.BPSKModem(sample_rate=arg_sample_rate, config=input_args['config'])
-			new_object.StringOptionsRetune(input_args['options'])
-		elif input_args['type'] == 'fsk':
-			new_object = modems_codecs.fsk.FSKModem(sample_rate=arg_sample_rate, config=input_args['config'])
-			new_object.StringOptionsRetune(input_args['options'])
-		elif input_args['type'] == 'afsk':
-			new_object = modems_codecs.afsk.AFSKModem(sample_rate=arg_sample_rate, config=input_args['config'])
-			new_object.StringOptionsRetune(input_args['options'])
-		elif input_args['type'] == 'afsk_pll':
-			new_object = modems_codecs.afsk_pll.AFSKPLLModem(sample_rate=arg_sample_rate, config=input_args['config'])
-			new_object.StringOptionsRetune(input_args['options'])
+		factory = LookupStage('modem', input_args['type'])
+		if factory is not None:
+			new_object = factory(sample_rate=arg_sample_rate, config=input_args['config'])
+			retune(new_object, input_args)
+	return new_object
+
+# With multirate processing, each modem runs at the input rate divided by the
+# largest whole factor that keeps the top of its input band below
+# BAND_EDGE_FRACTION of the processing rate, and at least MIN_SYMBOL_SAMPLES
+# samples per symbol. This leaves room for the decimation filter's transition
+# band, and for the timing resolution of the slicers.
+BAND_EDGE_FRACTION = 0.4
+MIN_SYMBOL_SAMPLES = 8
+MAX_DECIMATION = 16
+
+def ModemBand(modem):
+	# [low, high] edges of the input filter band of modem in Hz, or None if
+	# the modem has no known input filter.
+	if hasattr(modem, 'input_bpf_high_cutoff'):
+		return [float(modem.input_bpf_low_cutoff), float(modem.input_bpf_high_cutoff)]
+	if hasattr(modem, 'input_lpf_cutoff'):
+		return [0.0, float(modem.input_lpf_cutoff)]
+	return None
+
+def ModemSettings(arg_sample_rate, input_args):
+	# A modem object with the settings of input_args, but without its filters,
+	# oscillators and loops, for working out its band and symbol rate before
+	# building it. The modems design those in tune, so tune is skipped. Returns
+	# None if the type is unknown or the modem can't be set up this way.
+	if not input_args.get('type'):
+		return None
+	factory = LookupStage('modem', input_args['type'])
+	if not isinstance(factory, type):
+		return None
+	try:
+		new_object = factory.__new__(factory)
+		new_object.tune = lambda: None
+		new_object.__init__(sample_rate=arg_sample_rate, config=input_args['config'])
+		retune(new_object, input_args)
+	except Exception:
+		return None
+	return new_object
+
+def ModemDecimation(input_sample_rate, modem):
+	# Decimation factor of the input for modem, 1 if its band is unknown. modem
+	# may be a built modem or one from ModemSettings.
+	band = ModemBand(modem)
+	symbol_rate = getattr(modem, 'symbol_rate', None)
+	if band is None or symbol_rate is None:
+		return 1
+	lowest_rate = max(band[1] / BAND_EDGE_FRACTION, MIN_SYMBOL_SAMPLES * symbol_rate)
+	decimation = 1
+	for factor in range(2, MAX_DECIMATION + 1):
+		# whole processing rates only
+		if input_sample_rate % factor == 0 and input_sample_rate / factor >= lowest_rate:
+			decimation = factor
+	return decimation
+
+def DecimatedModemConfigurator(input_sample_rate, decimation, input_args):
+	# Build the modem to run on input decimated by decimation. Filters, AGC
+	# and NCO are designed from the sample rate, but PI controllers integrate
+	# once per sample, so their integral rate is scaled to keep the same loop
+	# response per second.
+	new_object = ModemConfigurator(input_sample_rate // decimation, input_args)
+	if hasattr(new_object, 'FeedbackController'):
+		new_object.FeedbackController.i_rate *= decimation
 	return new_object
 
 def SlicerConfigurator(arg_sample_rate, input_args):
 	new_object = []
 	if input_args.get('type'):
-		if input_args['type'] == 'quadrature':
-			new_object = modems_codecs.slicer.QuadratureSlicer(sample_rate=arg_sample_rate, config=input_args['config'])
-			new_object.StringOptionsRetune(input_args['options'])
-		elif input_args['type'] == 'binary':
-			new_object = modems_codecs.slicer.BinarySlicer(sample_rate=arg_sample_rate, config=input_args['config'])
-			new_object.StringOptionsRetune(input_args['options'])
-		elif input_args['type'] == '4level':
-			new_object = modems_codecs.slicer.FourLevelSlicer(sample_rate=arg_sample_rate, config=input_args['config'])
-			new_object.StringOptionsRetune(input_args['options'])
+		factory = LookupStage('slicer', input_args['type'])
+		if factory is not None:
+			new_object = factory(sample_rate=arg_sample_rate, config=input_args['config'])
+			retune(new_object, input_args)
 	return new_object
 
 def StreamConfigurator(input_args):
 	new_object = []
 	if input_args.get('type'):
-		if input_args['type'] == 'lfsr':
-			new_object = modems_codecs.lfsr.LFSR()
-			new_object.StringOptionsRetune(input_args['options'])
+		factory = LookupStage('stream', input_args['type'])
+		if factory is not None:
+			new_object = factory()
+			retune(new_object, input_args)
 	return new_object
 
 def CodecConfigurator(input_args, name):
 	new_object = []
-	if input_args['type'].lower() == 'il2p':
-		new_object = modems_codecs.il2p.IL2PCodec(ident=name)
-		new_object.StringOptionsRetune(input_args['options'])
-	elif input_args['type'].lower() == 'ax25':
-		new_object = modems_codecs.ax25.AX25Codec(ident=name)
+	factory = LookupStage('codec', input_args['type'].lower())
+	if factory is not None:
+		new_object = factory(ident=name)
+		retune(new_object, input_args)
 	return new_object
+
+def VariantError(modem, variant):
+	# A modem with a variants setting, like afsk_bank, returns one stream per
+	# variant from demod, and each chain must pick one with 'variant'. Other
+	# modems return one stream and take no 'variant'. Returns a description
+	# of the problem, or None if variant fits modem.
+	if not hasattr(modem, 'variants'):
+		if variant is not None:
+			return f"'variant' {variant} given for a modem with one output"
+		return None
+	if variant is None:
+		return "Missing 'variant' for a modem with several outputs"
+	stream_count = max(1, len(modem.variants))
+	try:
+		index = int(variant)
+	except (TypeError, ValueError):
+		return f"Invalid 'variant' {variant}"
+	if index < 0 or index >= stream_count:
+		return f"'variant' {variant} out of range for a modem with {stream_count} outputs"
+	return None
+
+def StageError(stage):
+	# A stage can check its options once they are all set, with a ConfigError
+	# method that returns a description of an invalid one, or None.
+	if hasattr(stage, 'ConfigError'):
+		return stage.ConfigError()
+	return None
+
+def StageKey(*stage_args):
+	# Stages built from identical configuration produce identical output from
+	# identical input. The key is the canonical json of everything used to
+	# build the stage, including the stages upstream of it.
+	return json.dumps(stage_args, sort_keys=True)
+
+class SlicerBranch:
+	def __init__(self, slicer, output=None):
+		# one slicer feeding the stream and codec of one or more chains.
+		# output is the index of the stream the slicer takes, for modems whose
+		# demod returns a list of streams, or None.
+		self.slicer = slicer
+		self.output = output
+		self.chains = []
+
+class DemodTree:
+	def __init__(self, modem, decimation=1):
+		# one modem feeding one or more slicer branches, run on the input
+		# audio decimated by decimation
+		self.modem = modem
+		self.decimation = decimation
+		self.branches = []
+
+	def stream(self):
+		# Prepare the tree to run on consecutive blocks of audio. The modem's
+		# AGC scales its rates by the running peak of the input instead of
+		# the peak of each block.
+		agc = getattr(self.modem, 'AGC', None)
+		if agc is not None:
+			agc.running_peak = True
+
+	def stages(self):
+		# the modem, and each distinct slicer, stream and codec below it
+		result = [self.modem]
+		for branch in self.branches:
+			result.append(branch.slicer)
+			for chain in branch.chains:
+				result.extend(stage for stage in chain[3:5] if not any(stage is known for known in result))
+		return result
+
+	def reset(self):
+		# Clear the decoding state of every stage, as before the first
+		# sample, keeping the filters and tables built with it. Returns False,
+		# and resets nothing, if a stage has no reset method.
+		stages = self.stages()
+		if not all(hasattr(stage, 'reset') for stage in stages):
+			return False
+		for stage in stages:
+			stage.reset()
+		return True
+
+	def chains(self):
+		result = []
+		for branch in self.branches:
+			result.extend(branch.chains)
+		return result
+
+	def names(self):
+		return [chain[0] for chain in self.chains()]
+
+def ChainTreeBuilder(demod_stack, input_sample_rate=None):
+	# Merge chains that share modem and slicer objects into trees, so each
+	# shared stage runs once and its output fans out to the stages below it.
+	# Chains share a stage object when they were built from the same StageKey.
+	# A modem built for a lower rate than input_sample_rate gets a tree that
+	# runs on decimated input. A chain's optional sixth element is the modem
+	# output stream its slicer takes.
+	trees = []
+	for chain in demod_stack:
+		if len(chain) < 5 or [] in chain[1:5]:
+			print(f"Incomplete chain {chain[0] if chain else ''}, skipping.")
+			continue
+		tree = None
+		for candidate in trees:
+			if candidate.modem is chain[1]:
+				tree = candidate
+				break
+		if tree is None:
+			decimation = 1
+			if input_sample_rate is not None:
+				decimation = max(1, round(input_sample_rate / chain[1].sample_rate))
+			tree = DemodTree(chain[1], decimation)
+			trees.append(tree)
+		branch = None
+		for candidate in tree.branches:
+			if candidate.slicer is chain[2]:
+				branch = candidate
+				break
+		if branch is None:
+			output = None
+			if len(chain) > 5 and chain[5] is not None:
+				output = int(chain[5])
+			branch = SlicerBranch(chain[2], output)
+			tree.branches.append(branch)
+		branch.chains.append(chain)
+	return trees
+
+# Rough per-sample costs in seconds, used to order jobs longest-first when no
+# measured timings are available for a tree.
+FIR_TAP_COST = 0.5e-9		# numpy convolution, per tap
+LOOP_COST = 6e-6			# per-sample Python loop (NCO, PLL or Costas loop)
+SLICER_COST = 0.4e-6		# per-sample Python slicer loop
+CHAIN_COST = 0.05e-6		# descrambler and codec, per input sample
+
+def TreeKey(tree):
+	return ' | '.join(tree.names())
+
+def EstimateTreeCost(tree, sample_count, timings):
+	# Estimated seconds to run tree over sample_count input samples. timings
+	# holds measured seconds per input sample by TreeKey from earlier runs,
+	# and takes precedence over the cost model.
+	key = TreeKey(tree)
+	if key in timings:
+		return timings[key] * sample_count
+	cost = 0.0
+	for stage in vars(tree.modem).values():
+		# filters and detectors may be held alone, or in lists
+		for item in (stage if isinstance(stage, list) else [stage]):
+			if hasattr(item, 'sample_cost'):
+				cost += item.sample_cost * FIR_TAP_COST
+	if hasattr(tree.modem, 'NCO'):
+		cost += LOOP_COST
+	cost += len(tree.branches) * SLICER_COST
+	cost += len(tree.chains()) * CHAIN_COST
+	# the tree's stages run once per decimated sample
+	return cost * sample_count / tree.decimation
+
+def LoadTimings(filename):
+	try:
+		timing_file = open(filename, 'r')
+		timings = json.load(timing_file)
+		timing_file.close()
+	except (OSError, ValueError):
+		timings = {}
+	return timings
+
+def SaveTimings(filename, timings):
+	timing_file = open(filename, 'w')
+	json.dump(timings, timing_file, indent=1, sort_keys=True)
+	timing_file.close()
+
+# Segments of one recording decoded in parallel overlap by enough audio for
+# the longest frame expected, plus time for the modem's filters and loops to
+# settle. Frames longer than SEGMENT_FRAME_SYMBOLS may be lost at a seam.
+SEGMENT_FRAME_SYMBOLS = 4096
+SEGMENT_SETTLE_SYMBOLS = 128
+
+def SegmentOverlap(tree):
+	# overlap between segments in input samples
+	modem = tree.modem
+	return round(modem.sample_rate * tree.decimation * (SEGMENT_FRAME_SYMBOLS + SEGMENT_SETTLE_SYMBOLS) / modem.symbol_rate)
+
+def PlanSegments(sample_count, segment_count, overlap):
+	# Split sample_count samples into segment_count owned ranges, each decoded
+	# with overlap samples of the preceding audio, as
+	# [audio start, owned start, owned end]. A frame that ends in an owned range
+	# and is shorter than the overlap lies wholly inside that segment's audio.
+	# Segments are never shorter than the overlap.
+	segment_count = max(1, min(segment_count, sample_count // max(overlap, 1)))
+	segments = []
+	for index in range(segment_count):
+		owned_start = sample_count * index // segment_count
+		owned_end = sample_count * (index + 1) // segment_count
+		segments.append([max(0, owned_start - overlap), owned_start, owned_end])
+	return segments
@@ -3,6 +3,9 @@
 # Nino Carrillo
 # 17 Apr 2024
 
+import copy
+from modems_codecs.stage_stats import NewTreeStats, ChainStatsDict
+
 def process_chain(chain, input_audio):
 	print(f"{chain[0]} process start")
 	try:
@@ -50,3 +53,99 @@ def multiprocess_chain(chain, input_audio, queue):
 		pass
 	queue.put(decoded_data)
 	return
+
+def audio_blocks(input_audio, block_size):
+	# Yield consecutive views of input_audio, block_size samples long. The
+	# final block may be shorter.
+	for start in range(0, len(input_audio), block_size):
+		yield input_audio[start:start + block_size]
+
+def run_tree(tree, input_audio, tree_stats=None):
+	# Run one block of audio (or the whole file) through a DemodTree. The modem
+	# and each slicer run once, and their output is shared by every chain below
+	# them. Returns the decoded packets of each chain, in tree.chains() order.
+	# Each stage's time and item counts are added to tree_stats, made by
+	# NewTreeStats.
+	if tree_stats is None:
+		tree_stats = NewTreeStats(tree)
+	result = []
+	demod_audio = tree_stats[0]['modem'].run(tree.modem.demod, input_audio)
+	index = 0
+	for branch in tree.branches:
+		branch_audio = demod_audio
+		if branch.output is not None:
+			# one of the streams of a multi-output modem
+			branch_audio = demod_audio[branch.output]
+		sliced_data = tree_stats[index]['slicer'].run(branch.slicer.slice, branch_audio)
+		for chain in branch.chains:
+			descrambled_data = tree_stats[index]['stream'].run(chain[3].stream_unscramble_8bit, sliced_data)
+			result.append(tree_stats[index]['codec'].run(chain[4].decode, descrambled_data))
+			index += 1
+	return result
+
+def multiprocess_tree(tree, audio_source, block_size, segment, regions, queue, job_id):
+	# Pool job: run a DemodTree over the input audio. Every frame is put on
+	# queue as ['frame', job_id, chain name, packet] as soon as its codec
+	# emits it, at the end of each block, and then one
+	# ['chain', job_id, chain name, frame count, stage stats] message per chain.
+	# audio_source is a SharedAudio or MappedAudio reference, attached here as
+	# a read-only view so no process holds its own copy of the recording.
+	# segment is None for the whole recording, or [audio start, owned start,
+	# owned end] from PlanSegments. A segment decodes audio from audio start to
+	# owned end, and keeps only the frames that end in its owned range, with
+	# stream addresses counted from the start of the recording.
+	# regions is None to decode everything, or the [start, end] sample ranges
+	# from Squelch.active_regions. Each region is decoded alone, with the
+	# tree's stages reset before it, and the audio between regions is skipped.
+	# With tree.decimation above 1, audio_source holds the input decimated by
+	# that factor, from resample.decimate_audio. segment and regions are in
+	# input samples, and are converted here to the decimated samples centered
+	# in them. Stream addresses are converted back, so they count modem output
+	# samples at the input sample rate whatever the decimation.
+	input_audio = audio_source.attach()
+	decimation = tree.decimation
+	if segment is None:
+		segment = [0, 0, len(input_audio) * decimation]
+	audio_start, owned_start, owned_end = [-(-position // decimation) for position in segment]
+	fresh_trees = regions is not None
+	if regions is None:
+		regions = [[audio_start, owned_end]]
+	else:
+		regions = [[max(-(-start // decimation), audio_start), min(-(-end // decimation), owned_end)] for start, end in regions]
+		regions = [[start, end] for start, end in regions if start < end]
+	if block_size > 0:
+		block_size = max(1, block_size // decimation)
+	# modem output samples per modem input sample
+	rate_ratio = getattr(tree.modem, 'output_sample_rate', tree.modem.sample_rate) / tree.modem.sample_rate
+	owned_start_address = round(segment[1] * rate_ratio)
+	owned_end_address = round(segment[2] * rate_ratio)
+	chains = tree.chains()
+	frame_counts = [0 for chain in chains]
+	tree_stats = NewTreeStats(tree)
+	for region_start, region_end in regions:
+		# No modem, slicer or codec state carries over from the last region.
+		# A tree with stages added through entry points that have no reset
+		# method starts each region from a copy instead.
+		region_tree = tree
+		if fresh_trees and not tree.reset():
+			region_tree = copy.deepcopy(tree)
+		if block_size > 0:
+			region_tree.stream()
+		region_audio = input_audio[region_start:region_end]
+		address_offset = round(region_start * rate_ratio)
+		if block_size > 0:
+			blocks = audio_blocks(region_audio, block_size)
+		else:
+			blocks = [region_audio]
+		for block in blocks:
+			for index, decoded_data in enumerate(run_tree(region_tree, block, tree_stats)):
+				for packet in decoded_data:
+					packet.streamaddress = (packet.streamaddress + address_offset) * decimation
+					if packet.streamaddress < owned_start_address or packet.streamaddress >= owned_end_address:
+						# the neighbouring segment that owns this frame decodes it too
+						continue
+					queue.put(['frame', job_id, chains[index][0], packet])
+					frame_counts[index] += 1
+	for index in range(len(chains)):
+		queue.put(['chain', job_id, chains[index][0], frame_counts[index], ChainStatsDict(tree_stats[index])])
+	return
@@ -15,3 +15,7 @@ class IQData:
 	def __init__(self):
 		self.i_data = []
 		self.q_data = []
+
+	def __len__(self):
+		# number of I/Q sample pairs
+		return len(self.i_data)
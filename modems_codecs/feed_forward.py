@@ -0,0 +1,100 @@
+# Python3
+# Functions for feed-forward carrier recovery
+# Nino Carrillo
+# 17 Oct 2026
+
+from math import pi
+from numpy import absolute, angle, clip, concatenate, cumsum, divide, exp, unwrap, zeros
+
+class FeedForwardCarrier:
+	# Viterbi-Viterbi carrier recovery for a complex baseband signal.
+	# Raising the signal to the power order removes the PSK modulation, so
+	# the carrier frequency and phase can be estimated from windows of
+	# samples on both sides of each sample, with array operations instead of
+	# a feedback loop.
+	# First the frequency offset is estimated from the phase change of the
+	# order power over frequency_lag samples, summed over frequency_window
+	# samples, and removed. Then the phase is estimated from the order power
+	# summed over phase_window samples, unwrapped, and removed. Constellation
+	# points end up at lock_angle plus multiples of 2 pi / order.
+	def __init__(self, **kwargs):
+		self.sample_rate = kwargs.get('sample_rate', 8000.0)
+		self.order = kwargs.get('order', 2)
+		self.lock_angle = kwargs.get('lock_angle', 0.0)
+		# window lengths in samples, made odd so each is centered on a sample
+		self.phase_window = kwargs.get('phase_window', 255) // 2 * 2 + 1
+		self.frequency_window = kwargs.get('frequency_window', 1023) // 2 * 2 + 1
+		self.frequency_lag = max(1, kwargs.get('frequency_lag', 1))
+		# largest frequency offset to remove, in Hz
+		self.max_freq_offset = kwargs.get('max_freq_offset', 100.0)
+
+		self.FrequencySum = SlidingWindow(length=self.frequency_window)
+		self.FrequencyDelay = SlidingWindow(length=self.frequency_window, center=True)
+		self.PhaseSum = SlidingWindow(length=self.phase_window)
+		self.PhaseDelay = SlidingWindow(length=self.phase_window, center=True)
+		self.reset()
+
+	def reset(self):
+		for window in [self.FrequencySum, self.FrequencyDelay, self.PhaseSum, self.PhaseDelay]:
+			window.reset()
+		# state carried between calls
+		self.lag_history = zeros(self.frequency_lag, dtype=complex)
+		self.frequency_phase = 0.0
+		self.last_phase = 0.0
+
+	def power(self, samples):
+		# order power of each sample, with the magnitude of the sample
+		magnitude = absolute(samples)
+		return divide(samples ** self.order, magnitude ** (self.order - 1), out=zeros(len(samples), dtype=complex), where=(magnitude > 0))
+
+	def update(self, baseband):
+		# Returns the baseband samples with the carrier offset removed. The
+		# first half window of the stream is held back, and each call
+		# returns as many samples as the windows complete.
+		powers = self.power(baseband)
+		lagged = concatenate((self.lag_history, powers))
+		self.lag_history = lagged[len(lagged) - self.frequency_lag:]
+		lag_products = powers * lagged[:len(powers)].conjugate()
+
+		# remove the frequency offset
+		frequency_sums = self.FrequencySum.update(lag_products)
+		baseband = self.FrequencyDelay.update(baseband)
+		limit = 2.0 * pi * self.max_freq_offset / self.sample_rate
+		steps = clip(angle(frequency_sums) / (self.order * self.frequency_lag), -limit, limit)
+		frequency_phases = self.frequency_phase + cumsum(steps)
+		if len(frequency_phases) > 0:
+			self.frequency_phase = frequency_phases[-1] % (2.0 * pi)
+		baseband = baseband * exp(-1j * frequency_phases)
+
+		# remove the phase offset
+		phase_sums = self.PhaseSum.update(self.power(baseband)) * exp(-1j * self.order * self.lock_angle)
+		baseband = self.PhaseDelay.update(baseband)
+		phases = unwrap(concatenate(([self.last_phase], angle(phase_sums))))[1:]
+		if len(phases) > 0:
+			self.last_phase = phases[-1]
+		return baseband * exp(-1j * phases / self.order)
+
+class SlidingWindow:
+	# Sum of, or center sample of, a window of length samples around each
+	# sample, block by block. Like FIR, consecutive blocks give the same
+	# output as one long block. The window starts half full of zeros, so the
+	# output lines up sample for sample with the input.
+	def __init__(self, **kwargs):
+		self.length = kwargs.get('length', 1)
+		self.center = kwargs.get('center', False)
+		self.reset()
+
+	def reset(self):
+		self.history = zeros(self.length // 2, dtype=complex)
+
+	def update(self, block):
+		working = concatenate((self.history, block))
+		if len(working) < self.length:
+			self.history = working
+			return zeros(0, dtype=complex)
+		self.history = working[len(working) - self.length + 1:]
+		count = len(working) - self.length + 1
+		if self.center:
+			return working[self.length // 2:self.length // 2 + count]
+		sums = concatenate(([0], cumsum(working)))
+		return sums[self.length:] - sums[:count]
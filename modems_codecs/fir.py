@@ -0,0 +1,70 @@
+# Python3
+# Functions for block-wise finite impulse response filtering
+# Nino Carrillo
+# 17 Oct 2026
+
+from math import ceil, log2
+from numpy import asarray, concatenate, convolve, iscomplexobj, zeros
+from numpy.fft import irfft, rfft
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Filters with at least this many taps use FFT overlap-save convolution, and
+# shorter ones direct convolution.
+FFT_TAP_THRESHOLD = 128
+# The FFT size is the power of two at or above this many times the tap count,
+# so most of each transform is new output.
+FFT_SIZE_FACTOR = 8
+
+class FIR:
+	def __init__(self, **kwargs):
+		self.taps = asarray(kwargs.get('taps', [1.0]), dtype=float)
+		self.tap_count = len(self.taps)
+		# 'direct', 'fft', or 'auto' to choose by tap count
+		self.method = kwargs.get('method', 'auto')
+		if self.method == 'auto':
+			self.method = 'fft' if self.tap_count >= FFT_TAP_THRESHOLD else 'direct'
+		if self.method == 'fft':
+			self.fft_size = 1 << ceil(log2(FFT_SIZE_FACTOR * self.tap_count))
+			# new outputs per transform
+			self.fft_step = self.fft_size - self.tap_count + 1
+			self.taps_spectrum = rfft(self.taps, self.fft_size)
+			# rough cost per output sample in direct convolution taps, for job
+			# ordering
+			self.sample_cost = 30 * log2(self.fft_size) * self.fft_size / self.fft_step
+		else:
+			self.sample_cost = self.tap_count
+		self.reset()
+
+	def reset(self):
+		# history holds the trailing input samples that the next block needs
+		# to complete its first output, so consecutive blocks filter exactly
+		# like one long 'valid' convolution.
+		self.history = zeros(0)
+
+	def update(self, block):
+		working = concatenate((self.history, block))
+		if len(working) < self.tap_count:
+			# not enough samples for one complete output yet
+			self.history = working
+			return zeros(0)
+		if self.tap_count > 1:
+			self.history = working[1 - self.tap_count:].copy()
+		else:
+			self.history = zeros(0)
+		if self.method == 'fft':
+			if iscomplexobj(working):
+				return self.overlap_save(working.real) + 1j * self.overlap_save(working.imag)
+			return self.overlap_save(working)
+		return convolve(working, self.taps, 'valid')
+
+	def overlap_save(self, working):
+		# 'valid' convolution of real samples, one FFT per fft_step outputs.
+		# Each segment of fft_size samples starts fft_step after the last, and
+		# the last fft_step samples of its circular convolution are valid.
+		output_count = len(working) - self.tap_count + 1
+		segment_count = ceil(output_count / self.fft_step)
+		padded = zeros((segment_count - 1) * self.fft_step + self.fft_size)
+		padded[:len(working)] = working
+		segments = sliding_window_view(padded, self.fft_size)[::self.fft_step]
+		products = irfft(rfft(segments, axis=1) * self.taps_spectrum, self.fft_size, axis=1)
+		return products[:, self.tap_count - 1:].ravel()[:output_count]
@@ -10,6 +10,7 @@ from numpy import arange, sin, cos, pi, convolve, sqrt
 from modems_codecs.rrc import RRC
 from modems_codecs.string_ops import check_boolean
 from modems_codecs.agc import AGC
+from modems_codecs.fir import FIR
 #from matplotlib import pyplot as plt
 
 class FSKModem:
@@ -146,9 +147,19 @@ class FSKModem:
 			record_envelope = True
 		)
 
+		# The filter object carries its overlap between calls to demod, so
+		# audio can be processed in consecutive blocks.
+		self.InputLPF = FIR(taps=self.input_lpf)
+
+	def reset(self):
+		# Clear the state carried between calls to demod, keeping the filter
+		# tune designed.
+		self.InputLPF.reset()
+		self.AGC.reset()
+
 	def demod(self, input_audio):
 		# Apply the input filter.
-		audio = convolve(input_audio, self.input_lpf, 'valid')
+		audio = self.InputLPF.update(input_audio)
 
 		if self.invert:
 			audio = -audio
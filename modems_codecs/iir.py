@@ -4,6 +4,8 @@
 # 26 Apr 2024
 
 from math import tan, pi
+from numpy import zeros
+from scipy.signal import lfilter
 
 class IIR_1:
 	def __init__(self, **kwargs):
@@ -28,13 +30,17 @@ class IIR_1:
 			self.b_coefs = [self.gain * b0, self.gain * b1]
 			self.a_coefs = [0.0, a1]
 
-		self.output = 0.0
-		self.X = [0.0, 0.0]
-		self.Y = [0.0, 0.0]
 		self.order = 1
+		self.reset()
 		#print(self.a_coefs)
 		#print(self.b_coefs)
 
+	def reset(self):
+		# clear the delay registers
+		self.output = 0.0
+		self.X = [0.0, 0.0]
+		self.Y = [0.0, 0.0]
+
 	def update(self, sample):
 		# Update the input delay registers
 		for index in range(self.order, 0, -1):
@@ -52,3 +58,15 @@ class IIR_1:
 			v += (self.Y[index] * self.a_coefs[index])
 		self.Y[0] = v
 		self.output = v
+
+	def update_block(self, samples):
+		# Block version of update for the first order filter, for real or
+		# complex samples. Returns the output after each sample.
+		if len(samples) == 0:
+			return zeros(0, dtype=samples.dtype)
+		state = [self.b_coefs[1] * self.X[0] + self.a_coefs[1] * self.Y[0]]
+		outputs, state = lfilter(self.b_coefs, [1.0, -self.a_coefs[1]], samples, zi=state)
+		self.X[0] = samples[-1]
+		self.Y[0] = outputs[-1]
+		self.output = outputs[-1]
+		return outputs
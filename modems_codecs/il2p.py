@@ -115,15 +115,6 @@ class IL2PCodec:
 		self.disable_rs = kwargs.get('disable_rs', False)
 		self.sync_tolerance = kwargs.get('sync_tol', 0)
 
-		self.state = 'sync_search'
-		self.working_word = int(0xFFFFFF)
-		self.buffer = []
-		for i in range(255):
-			self.buffer.append(0)
-		self.working_packet = PacketMeta()
-		self.bit_index = 0
-		self.byte_index_a = 0
-		self.block_index = 0
 		self.num_roots = 16
 		# IL2P Scrambling Polynomial x^9 + x^4 + 1
 		self.lfsr = LFSRnoaddr(poly=0x211, invert=False)
@@ -134,6 +125,21 @@ class IL2PCodec:
 		rs_gf_poly = 0x11D
 		self.header_rs = rs_functions.initialize(rs_firstroot, rs_header_numroots, rs_gf_power, rs_gf_poly)
 		self.block_rs = rs_functions.initialize(rs_firstroot, rs_block_numroots, rs_gf_power, rs_gf_poly)
+		self.reset()
+
+	def reset(self):
+		# Drop any partly received packet and search for sync again. The Reed
+		# Solomon tables are kept.
+		self.state = 'sync_search'
+		self.working_word = int(0xFFFFFF)
+		self.buffer = []
+		for i in range(255):
+			self.buffer.append(0)
+		self.working_packet = PacketMeta()
+		self.bit_index = 0
+		self.byte_index_a = 0
+		self.block_index = 0
+		self.lfsr.reset()
 		self.bytes_corrected = 0
 		self.block_fail = False
 
@@ -0,0 +1,140 @@
+# Python3
+# Functions for serving decoded packets to KISS TCP clients
+# Nino Carrillo
+# 17 Oct 2026
+
+import asyncio
+import threading
+
+# KISS special characters
+FEND = 0xC0
+FESC = 0xDB
+TFEND = 0xDC
+TFESC = 0xDD
+
+# Servers started so far, by (host, port). Report objects built for different
+# sample rates share one server per address.
+servers = {}
+
+def kiss_encode(data, port=0):
+	# Wrap packet bytes (without CRC) in a KISS data frame for the given TNC port.
+	# escape FESC first, so the escapes added for FEND aren't escaped again
+	payload = bytes([int(byte) for byte in data])
+	payload = payload.replace(bytes([FESC]), bytes([FESC, TFESC]))
+	payload = payload.replace(bytes([FEND]), bytes([FESC, TFEND]))
+	return bytes([FEND, (port & 0xF) << 4]) + payload + bytes([FEND])
+
+def get_server(host, port):
+	if (host, port) not in servers:
+		servers[(host, port)] = KissServer(host=host, port=port)
+	return servers[(host, port)]
+
+def close_servers():
+	for address in list(servers):
+		servers[address].close()
+		del servers[address]
+
+class KissServer:
+	def __init__(self, **kwargs):
+		# An asyncio TCP server on its own thread, so the decoder never waits on
+		# the network. Every client has a bounded queue of frames. A client that
+		# reads too slowly loses frames instead of holding up the decoder or the
+		# other clients.
+		self.host = kwargs.get('host', '127.0.0.1')
+		self.port = kwargs.get('port', 8001)
+		self.client_queue_frames = kwargs.get('client_queue_frames', 256)
+		self.clients = {}		# client address: [asyncio.Queue of frames, writer, handler task]
+		self.queued_count = 0
+		self.dropped_count = 0
+		self.error = None
+		self.loop = asyncio.new_event_loop()
+		self.ready = threading.Event()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+		self.ready.wait()
+		if self.error is not None:
+			raise self.error
+		print(f"KISS server listening on {self.host}:{self.port}")
+
+	def run(self):
+		asyncio.set_event_loop(self.loop)
+		try:
+			self.server = self.loop.run_until_complete(
+				asyncio.start_server(self.handle_client, self.host, self.port)
+			)
+		except OSError as error:
+			self.error = error
+			self.ready.set()
+			return
+		# port 0 asks for any free port, report the one we got
+		self.port = self.server.sockets[0].getsockname()[1]
+		self.ready.set()
+		self.loop.run_forever()
+
+	async def handle_client(self, reader, writer):
+		address = writer.get_extra_info('peername')
+		queue = asyncio.Queue(maxsize=self.client_queue_frames)
+		self.clients[address] = [queue, writer, asyncio.current_task()]
+		sender = asyncio.ensure_future(self.send_frames(queue, writer))
+		try:
+			# Frames from the client would be for transmission, which this TNC
+			# can't do. Read and discard them until the client disconnects.
+			while await reader.read(1024):
+				pass
+		except ConnectionError:
+			pass
+		del self.clients[address]
+		sender.cancel()
+		writer.close()
+		try:
+			await sender
+		except asyncio.CancelledError:
+			pass
+
+	async def send_frames(self, queue, writer):
+		try:
+			while True:
+				frame = await queue.get()
+				writer.write(frame)
+				await writer.drain()
+				queue.task_done()
+		except ConnectionError:
+			pass
+
+	def broadcast(self, frame):
+		# runs on the server thread
+		for address in self.clients:
+			try:
+				self.clients[address][0].put_nowait(frame)
+				self.queued_count += 1
+			except asyncio.QueueFull:
+				self.dropped_count += 1
+
+	def send(self, data, port=0):
+		# Queue packet bytes for every connected client. Safe to call from any
+		# thread, and never blocks.
+		self.loop.call_soon_threadsafe(self.broadcast, kiss_encode(data, port))
+
+	async def drain_and_stop(self, timeout):
+		# give clients up to timeout seconds to receive queued frames
+		try:
+			await asyncio.wait_for(
+				asyncio.gather(*[client[0].join() for client in self.clients.values()]),
+				timeout
+			)
+		except asyncio.TimeoutError:
+			pass
+		self.server.close()
+		# Disconnecting each client ends its handler. Anything a client hasn't
+		# read by now is discarded.
+		handlers = []
+		for client in self.clients.values():
+			client[1].transport.abort()
+			handlers.append(client[2])
+		await asyncio.gather(*handlers, return_exceptions=True)
+
+	def close(self, timeout=5.0):
+		future = asyncio.run_coroutine_threadsafe(self.drain_and_stop(timeout), self.loop)
+		future.result()
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join()
@@ -13,6 +13,9 @@ class LFSR:
 		self.polynomial = kwargs.get('poly', 0x1)
 		self.invert = kwargs.get('invert', False)
 
+		self.reset()
+
+	def reset(self):
 		self.shift_register = 0
 
 	def StringOptionsRetune(self, options):
@@ -57,6 +60,9 @@ class LFSRnoaddr:
 		self.polynomial = kwargs.get('poly', 0x3)
 		self.invert = kwargs.get('invert', True)
 
+		self.reset()
+
+	def reset(self):
 		self.shift_register = 0
 
 	def stream_unscramble_8bit(self, data):
@@ -0,0 +1,122 @@
+# Python3
+# Functions for decoding a live stream of raw PCM audio
+# Nino Carrillo
+# 17 Oct 2026
+
+import traceback
+import threading
+from multiprocessing import Process, Queue
+from queue import Full
+from numpy import frombuffer, dtype
+from modems_codecs.chain_execute import run_tree
+from modems_codecs.stage_stats import NewTreeStats, ChainStatsDict
+
+# Latency budget split: one block fills while the previous one is processed,
+# and up to QUEUE_BLOCKS more can wait for a chain that briefly falls behind.
+QUEUE_BLOCKS = 2
+BLOCKS_PER_LATENCY = 2 + QUEUE_BLOCKS
+
+def read_raw_blocks(stream, sample_dtype, channels, block_size):
+	# Yield the first channel of stream in blocks of block_size samples.
+	# stream is a binary file object, like sys.stdin.buffer or an opened FIFO.
+	# Reads block until a whole block has arrived, so a live source sets the
+	# pace. The final block may be shorter.
+	frame_size = dtype(sample_dtype).itemsize * channels
+	block_bytes = block_size * frame_size
+	while True:
+		data = b''
+		while len(data) < block_bytes:
+			chunk = stream.read(block_bytes - len(data))
+			if not chunk:
+				break
+			data += chunk
+		# drop a trailing partial sample frame
+		data = data[:len(data) - (len(data) % frame_size)]
+		if len(data) == 0:
+			return
+		yield frombuffer(data, dtype=sample_dtype).reshape(-1, channels)[:, 0]
+		if len(data) < block_bytes:
+			return
+
+def live_tree_worker(tree, block_queue, result_queue, tree_index):
+	# Long-lived worker: run every block from block_queue through one
+	# DemodTree until a None block arrives. Each decoded packet is sent at once
+	# as ['frame', tree_index, chain name, packet], and each finished block as
+	# ['block', tree_index, input samples processed so far, stream address].
+	# The stream address is the lowest address any slicer of the tree has
+	# reached, so every frame the tree decodes later ends beyond it. The stage
+	# stats of each chain follow the last block as ['stats', tree_index, list].
+	tree.stream()
+	chains = tree.chains()
+	tree_stats = NewTreeStats(tree)
+	sample_count = 0
+	try:
+		while True:
+			block = block_queue.get()
+			if block is None:
+				break
+			for index, decoded_data in enumerate(run_tree(tree, block, tree_stats)):
+				for packet in decoded_data:
+					result_queue.put(['frame', tree_index, chains[index][0], packet])
+			sample_count += len(block)
+			stream_address = min(branch.slicer.streamaddress for branch in tree.branches)
+			result_queue.put(['block', tree_index, sample_count, stream_address])
+	except Exception:
+		result_queue.put(['error', tree_index, traceback.format_exc()])
+	result_queue.put(['stats', tree_index, [ChainStatsDict(chain_stats) for chain_stats in tree_stats]])
+	result_queue.put(['done', tree_index])
+
+class BlockDistributor:
+	def __init__(self, **kwargs):
+		# Runs one long-lived worker process per DemodTree and hands every block
+		# of the live stream to all of them. Each worker queue holds at most
+		# QUEUE_BLOCKS blocks, so a chain slower than real time holds up the
+		# source instead of building an unbounded backlog.
+		self.trees = kwargs.get('trees', [])
+		# how long a dead worker can hold up the source
+		self.crash_check_interval = kwargs.get('crash_check_interval', 1.0)
+		self.result_queue = Queue()
+		self.workers = {}		# tree_index: [Process, block Queue]
+		self.stalled = set()	# tree indices that held up the source
+		for tree_index in range(len(self.trees)):
+			block_queue = Queue(maxsize=QUEUE_BLOCKS)
+			process = Process(
+				target = live_tree_worker,
+				args = ([self.trees[tree_index], block_queue, self.result_queue, tree_index])
+			)
+			process.daemon = True
+			process.start()
+			self.workers[tree_index] = [process, block_queue]
+
+	def distribute(self, blocks):
+		# Thread target: feed every block to every worker, then end the stream.
+		for block in blocks:
+			for tree_index in self.workers:
+				self.put(tree_index, block)
+		for tree_index in self.workers:
+			self.put(tree_index, None)
+
+	def put(self, tree_index, block):
+		process, block_queue = self.workers[tree_index]
+		while process.exitcode is None:
+			try:
+				block_queue.put(block, timeout=self.crash_check_interval)
+				return
+			except Full:
+				if tree_index not in self.stalled:
+					self.stalled.add(tree_index)
+					print(f"{self.trees[tree_index].names()} is slower than real time, latency will exceed the limit")
+		# a worker that has stopped takes no more blocks
+
+	def start(self, blocks):
+		self.thread = threading.Thread(target=self.distribute, args=(blocks,), daemon=True)
+		self.thread.start()
+
+	def dead_workers(self):
+		return [tree_index for tree_index in self.workers if self.workers[tree_index][0].exitcode is not None]
+
+	def close(self):
+		for tree_index in self.workers:
+			self.workers[tree_index][0].join(timeout=self.crash_check_interval)
+			if self.workers[tree_index][0].exitcode is None:
+				self.workers[tree_index][0].terminate()
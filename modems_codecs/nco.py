@@ -3,51 +3,107 @@
 # Nino Carrillo
 # 26 Apr 2024
 
-from math import sin, pi
+from math import pi
+from numpy import arange, asarray, cumsum, full, int64, sin as array_sin, trunc
 from modems_codecs.complexmath import ComplexNumber
 
+# The phase accumulator is an unsigned fixed-point fraction of one cycle.
+PHASE_BITS = 32
+PHASE_MODULUS = 1 << PHASE_BITS
+PHASE_MASK = PHASE_MODULUS - 1
+QUARTER_CYCLE = PHASE_MODULUS >> 2
+
 class NCO:
 	def __init__(self, **kwargs):
 		self.sample_rate = kwargs.get('sample_rate', 8000.0)
 		self.amplitude = kwargs.get('amplitude', 10000.0)
 		self.set_frequency = kwargs.get('set_frequency', 1500.0)
 		self.wavetable_size = kwargs.get('wavetable_size', 256)
+		# interpolate linearly between wavetable entries, rather than using the
+		# entry at or below the phase
+		self.interpolate = kwargs.get('interpolate', False)
 
-		# control is the frequency adjustment input
-		self.control = 0.0
-
-		# instantaneous phase of the oscillator in degrees
-		self.phase_accumulator = 0.0
-
-		self.wavetable=[]
-		for i in range(self.wavetable_size):
-			self.wavetable.append(self.amplitude * sin(i * 2.0 * pi / self.wavetable_size))
-
-		# Calculate the phase accumulator to wavetable index scaling factor
-		self.index_scaling_factor = self.wavetable_size / (2.0 * pi)
+		# one extra entry, a copy of the first, so interpolation never wraps
+		self.wavetable = self.amplitude * array_sin(arange(self.wavetable_size + 1) * 2.0 * pi / self.wavetable_size)
+		self.wavetable[self.wavetable_size] = self.wavetable[0]
+		self.wavetable_list = self.wavetable.tolist()
 
 		# During each update of the NCO (once per sample), it will be advanced according to
 		# set_frequency + control. Calculate the scaling factor for phase advance.
-		self.phase_scaling_factor = 2.0 * pi / self.sample_rate
+		self.phase_scaling_factor = PHASE_MODULUS / self.sample_rate
+		self.reset()
+
+	def reset(self):
+		# control is the frequency adjustment input
+		self.control = 0.0
+
+		# instantaneous phase of the oscillator, in 1/PHASE_MODULUS cycles
+		self.phase_accumulator = 0
+		self.sine_output = 0.0
+		self.cosine_output = self.amplitude
 		self.ComplexOutput = ComplexNumber(1,0)
 
+	def lookup(self, phase):
+		# wavetable value at one phase
+		scaled = phase * self.wavetable_size
+		index = scaled >> PHASE_BITS
+		if self.interpolate:
+			fraction = (scaled & PHASE_MASK) / PHASE_MODULUS
+			return self.wavetable_list[index] + fraction * (self.wavetable_list[index + 1] - self.wavetable_list[index])
+		return self.wavetable_list[index]
+
 	def update(self):
-		self.phase_accumulator += (self.phase_scaling_factor * (self.set_frequency + self.control))
-		while self.phase_accumulator >= 2.0 * pi:
-			self.phase_accumulator = self.phase_accumulator - (2.0 * pi)
-		while self.phase_accumulator < 0:
-			self.phase_accumulator = self.phase_accumulator + (2.0 * pi)
-		sine_phase_index = int(self.phase_accumulator * self.index_scaling_factor)
-		try:
-			self.sine_output = self.wavetable[sine_phase_index]
-		except:
-			#pass
-			print(sine_phase_index, self.index_scaling_factor, self.phase_accumulator)
-		cosine_phase_index = int(sine_phase_index + (self.wavetable_size / 4.0))
-		while cosine_phase_index >= self.wavetable_size :
-			cosine_phase_index -= self.wavetable_size
-		while cosine_phase_index < 0:
-			cosine_phase_index += self.wavetable_size
-		self.cosine_output = self.wavetable[cosine_phase_index]
+		# Advance one sample, for closed loops that set control every sample.
+		phase = (self.phase_accumulator + int(self.phase_scaling_factor * (self.set_frequency + self.control))) & PHASE_MASK
+		self.phase_accumulator = phase
+		if self.interpolate:
+			self.sine_output = self.lookup(phase)
+			self.cosine_output = self.lookup((phase + QUARTER_CYCLE) & PHASE_MASK)
+		else:
+			self.sine_output = self.wavetable_list[(phase * self.wavetable_size) >> PHASE_BITS]
+			self.cosine_output = self.wavetable_list[(((phase + QUARTER_CYCLE) & PHASE_MASK) * self.wavetable_size) >> PHASE_BITS]
 		self.ComplexOutput.real = (self.cosine_output)
 		self.ComplexOutput.imag = -(self.sine_output)
+
+	def phases(self, control=None, count=None):
+		# Advance count samples at once, or one sample per element of the
+		# control array, and return the phase after each. Matches calling
+		# update with the same control values.
+		if control is None:
+			steps = full(count, int(self.phase_scaling_factor * (self.set_frequency + self.control)), dtype=int64)
+		else:
+			steps = trunc(self.phase_scaling_factor * (self.set_frequency + asarray(control, dtype=float))).astype(int64)
+		if len(steps) == 0:
+			return steps
+		# wrap each step into one cycle first, so the running sum can't overflow
+		phases = (cumsum(steps & PHASE_MASK) + self.phase_accumulator) & PHASE_MASK
+		self.phase_accumulator = int(phases[-1])
+		return phases
+
+	def lookup_block(self, phases):
+		scaled = phases * self.wavetable_size
+		indices = scaled >> PHASE_BITS
+		values = self.wavetable[indices]
+		if self.interpolate:
+			fractions = (scaled & PHASE_MASK) / PHASE_MODULUS
+			values = values + fractions * (self.wavetable[indices + 1] - values)
+		return values
+
+	def update_block(self, control=None, count=None):
+		# Block version of update. Returns the sine and cosine output arrays,
+		# and leaves the outputs of the last sample in sine_output,
+		# cosine_output and ComplexOutput.
+		phases = self.phases(control, count)
+		sine = self.lookup_block(phases)
+		cosine = self.lookup_block((phases + QUARTER_CYCLE) & PHASE_MASK)
+		if len(phases) > 0:
+			self.sine_output = float(sine[-1])
+			self.cosine_output = float(cosine[-1])
+			self.ComplexOutput.real = (self.cosine_output)
+			self.ComplexOutput.imag = -(self.sine_output)
+		return sine, cosine
+
+	def complex_block(self, control=None, count=None):
+		# Block output as complex numbers, cosine - j sine like ComplexOutput.
+		sine, cosine = self.update_block(control, count)
+		return cosine - 1j * sine
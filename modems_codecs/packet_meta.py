@@ -169,11 +169,29 @@ def print_ax25_header_to_string(frame, delimiter):
 	return [index, string_output]
 
 
+def print_decoded_packet_to_string(packet, count):
+	string_output = ''
+	string_output += print_to_string("\n\nPacket number: ", count, " CRC: ", hex(packet.CalculatedCRC), "stream address: ", packet.streamaddress)
+	string_output += print_to_string("Source decoders: ", packet.CorrelatedDecoders)
+	string_output += print_to_string("Packet byte count: ", len(packet.data))
+	string_output += print_to_string("Bytes corrected: ", packet.BytesCorrected)
+	header_info = print_ax25_header_to_string(packet.data, ', ')
+	string_output += header_info[1]
+	for i in range(header_info[0], len(packet.data)-2):
+		byte = packet.data[i]
+		if (byte < 0x7F) and (byte > 0x1F):
+			string_output +=print_to_string(chr(int(byte)), end='')
+		else:
+			string_output +=print_to_string(f'<{hex(int(byte))}>', end='')
+	return string_output
 
 class ReportStyle:
 	def __init__(self, options):
 		self.destination = options.get('destination', 'std_out')
 		self.style = options.get('style', 'raw')
+		# for destination 'kiss_tcp', the address the KISS server listens on
+		self.host = options.get('host', '127.0.0.1')
+		self.port = options.get('port', 8001)
 
 class PacketMeta:
 
@@ -209,13 +227,32 @@ class PacketMeta:
 
 class PacketMetaArray:
 
-	def __init__(self):
+	def __init__(self, **kwargs):
 		self.raw_packet_arrays = []
 		self.unique_packet_array =[]
+		self.address_distance = kwargs.get('address_distance', 1000)
+		# raw packet array of each decoder, for packets added one at a time
+		self.decoder_arrays = {}
+		# unique packets by CalculatedCRC, the only ones a packet can match
+		self.unique_by_crc = {}
+		self.DecoderUniqueHistogram = Counter()
+		self.DecoderHistogram = Counter()
 
 	def add(self, array):
 		self.raw_packet_arrays.append(array)
 
+	def AddPacket(self, packet):
+		# Add one packet as soon as a chain decodes it, and correlate it with
+		# the packets added before it. Returns True if it is valid and not a
+		# duplicate. Call Tally before reporting.
+		if packet.SourceDecoder not in self.decoder_arrays:
+			self.decoder_arrays[packet.SourceDecoder] = []
+			self.raw_packet_arrays.append(self.decoder_arrays[packet.SourceDecoder])
+		self.decoder_arrays[packet.SourceDecoder].append(packet)
+		packet.CalcCRC()
+		packet.Validate()
+		return self.CorrelatePacket(packet)
+
 	def CalcCRCs(self):
 		for array in self.raw_packet_arrays:
 			for packet in array:
@@ -227,36 +264,35 @@ class PacketMetaArray:
 			for packet in array:
 				packet.ValidateHeader()
 
+	def CorrelatePacket(self, raw_packet):
+		# only check validated packets
+		if not (raw_packet.ValidCRC and raw_packet.ValidHeader):
+			return False
+		# compare this packet with the existing unique packets, not unique if matched
+		for unique_packet in self.unique_by_crc.get(raw_packet.CalculatedCRC, []):
+			# don't check packets from the same decoder
+			if (
+				(unique_packet.SourceDecoder != raw_packet.SourceDecoder)
+				and
+				(abs(raw_packet.streamaddress - unique_packet.streamaddress) < self.address_distance)
+			):
+				unique_packet.CorrelatedDecoders.append(raw_packet.SourceDecoder)
+				return False
+		raw_packet.CorrelatedDecoders.append(raw_packet.SourceDecoder)
+		# this packet is unique, add it to the list.
+		self.unique_packet_array.append(raw_packet)
+		self.unique_by_crc.setdefault(raw_packet.CalculatedCRC, []).append(raw_packet)
+		return True
+
 	def Correlate(self, **kwargs):
-		self.address_distance = kwargs.get('address_distance', 1000)
+		self.address_distance = kwargs.get('address_distance', self.address_distance)
 		# Identify unique and duplicate packets based on stream address and CalculatedCRC
-		first_array = True
 		for raw_packet_array in self.raw_packet_arrays:
 			for raw_packet in raw_packet_array:
-				# only check validated packets
-				if raw_packet.ValidCRC and raw_packet.ValidHeader:
-					# assume this packet is unique
-					is_unique = True
-					# everything in the first array is unique
-					if first_array == False:
-						# compare this packet with the existing unique packets, flag false if matched
-						for unique_packet in self.unique_packet_array:
-							# don't check packets from the same decoder
-							if (unique_packet.SourceDecoder != raw_packet.SourceDecoder):
-								if (
-									(abs(raw_packet.streamaddress - unique_packet.streamaddress) < self.address_distance)
-									and
-									(raw_packet.CalculatedCRC == unique_packet.CalculatedCRC)
-								):
-									is_unique = False
-									# print(f"Not unique. Distance: {abs(raw_packet.streamaddress - unique_packet.streamaddress)}, {raw_packet.CalculatedCRC}, {unique_packet.CalculatedCRC}")
-									unique_packet.CorrelatedDecoders.append(raw_packet.SourceDecoder)
-									break
-					if is_unique:
-						raw_packet.CorrelatedDecoders.append(raw_packet.SourceDecoder)
-						# this packet is unique, add it to the list.
-						self.unique_packet_array.append(raw_packet)
-			first_array = False
+				self.CorrelatePacket(raw_packet)
+		self.Tally()
+
+	def Tally(self):
 		# now sort the unique list:
 		self.unique_packet_array = sorted(self.unique_packet_array, key=lambda packet: packet.streamaddress)
 		# now count unique contributions of each decoder
@@ -346,18 +382,7 @@ class PacketMetaArray:
 			for packet in self.unique_packet_array:
 				if packet.ValidCRC and packet.ValidHeader:
 					count += 1
-					string_output += print_to_string("\n\nPacket number: ", count, " CRC: ", hex(packet.CalculatedCRC), "stream address: ", packet.streamaddress)
-					string_output += print_to_string("Source decoders: ", packet.CorrelatedDecoders)
-					string_output += print_to_string("Packet byte count: ", len(packet.data))
-					string_output += print_to_string("Bytes corrected: ", packet.BytesCorrected)
-					header_info = print_ax25_header_to_string(packet.data, ', ')
-					string_output += header_info[1]
-					for i in range(header_info[0], len(packet.data)-2):
-						byte = packet.data[i]
-						if (byte < 0x7F) and (byte > 0x1F):
-							string_output +=print_to_string(chr(int(byte)), end='')
-						else:
-							string_output +=print_to_string(f'<{hex(int(byte))}>', end='')
+					string_output += print_decoded_packet_to_string(packet, count)
 
 			string_output += print_to_string("\n\nUnique, valid packets: ", self.CountGood())
 			string_output += print_to_string("Packets rejected from all decoders for CRC failure: ", self.CountBad())
@@ -368,3 +393,71 @@ class PacketMetaArray:
 			for decoder, count in self.DecoderUniqueHistogram.most_common():
 				string_output += print_to_string(decoder, count)
 		return string_output
+
+class LiveCorrelator:
+
+	def __init__(self, **kwargs):
+		# Correlates packets one at a time as chains report them, for live
+		# decoding where there is no complete set of results to correlate.
+		self.address_distance = kwargs.get('address_distance', 1000)
+		# unique packets that a chain could still report a duplicate of
+		self.recent_packets = []
+		self.good_count = 0
+		self.bad_count = 0
+		self.DecoderHistogram = Counter()
+		self.DecoderUniqueHistogram = Counter()
+
+	def add(self, packet):
+		# Returns True if packet is valid and not a duplicate of a packet
+		# already seen from another decoder.
+		packet.CalcCRC()
+		packet.Validate()
+		if not (packet.ValidCRC and packet.ValidHeader):
+			self.bad_count += 1
+			return False
+		self.DecoderHistogram[packet.SourceDecoder] += 1
+		for unique_packet in self.recent_packets:
+			if (
+				(unique_packet.SourceDecoder != packet.SourceDecoder)
+				and
+				(abs(packet.streamaddress - unique_packet.streamaddress) < self.address_distance)
+				and
+				(packet.CalculatedCRC == unique_packet.CalculatedCRC)
+			):
+				unique_packet.CorrelatedDecoders.append(packet.SourceDecoder)
+				return False
+		packet.CorrelatedDecoders.append(packet.SourceDecoder)
+		self.recent_packets.append(packet)
+		self.good_count += 1
+		return True
+
+	def expire(self, stream_address):
+		# Every chain has reported its frames up to stream_address, and any
+		# frame it reports later ends beyond it, so packets further back than
+		# address_distance can no longer be matched.
+		still_recent = []
+		for packet in self.recent_packets:
+			if packet.streamaddress > stream_address - self.address_distance:
+				still_recent.append(packet)
+			else:
+				self.retire(packet)
+		self.recent_packets = still_recent
+
+	def retire(self, packet):
+		if len(packet.CorrelatedDecoders) == 1:
+			self.DecoderUniqueHistogram[packet.SourceDecoder] += 1
+
+	def Summary(self):
+		for packet in self.recent_packets:
+			self.retire(packet)
+		self.recent_packets = []
+		string_output = ''
+		string_output += print_to_string("\n\nUnique, valid packets: ", self.good_count)
+		string_output += print_to_string("Packets rejected from all decoders for CRC failure: ", self.bad_count)
+		string_output += print_to_string("Total packets by decoder:")
+		for decoder, count in self.DecoderHistogram.most_common():
+			string_output += print_to_string(decoder, count)
+		string_output += print_to_string("Unique packets by decoder:")
+		for decoder, count in self.DecoderUniqueHistogram.most_common():
+			string_output += print_to_string(decoder, count)
+		return string_output
@@ -9,6 +9,9 @@ class PI_control:
 		self.i_rate = kwargs.get('i', 0.1)
 		self.i_limit = kwargs.get('i_limit', 100.0)
 		self.gain = kwargs.get('gain', 1000.0)
+		self.reset()
+
+	def reset(self):
 		self.integral = 0.0
 		self.proportional = 0.0
 
@@ -22,9 +25,11 @@ class PI_control:
 		self.output = self.proportional + self.integral
 		return self.output
 
-	def update_saturate(self, sample):
+	def update_saturate(self, sample, count=1):
+		# count is the number of samples the input stands for, when the loop
+		# is updated once per block of samples
 		self.proportional = self.gain * self.p_rate * sample
-		self.integral += self.gain * (self.i_rate * sample)
+		self.integral += self.gain * (self.i_rate * sample) * count
 		if self.integral > self.i_limit:
 			self.integral = self.i_limit
 		if self.integral < -self.i_limit:
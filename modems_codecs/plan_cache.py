@@ -0,0 +1,94 @@
+# Python3
+# Functions for caching built processing stages on disk
+# Nino Carrillo
+# 17 Oct 2026
+
+import os
+import glob
+import pickle
+import hashlib
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pymodem')
+# Size the cache is kept under. Stages of a few configs at a few sample rates
+# take a few megabytes.
+DEFAULT_CACHE_MEGABYTES = 100
+
+def code_version():
+	# Hash of the stage source code. A cached stage built by different code
+	# is never loaded.
+	version = hashlib.sha256()
+	for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.py'))):
+		source_file = open(filename, 'rb')
+		version.update(os.path.basename(filename).encode())
+		version.update(source_file.read())
+		source_file.close()
+	return version.hexdigest()
+
+class PlanCache:
+	def __init__(self, **kwargs):
+		# Tuned stage objects (designed filter taps, lookup tables, GF tables
+		# and constants) pickled by a hash of everything used to build them.
+		self.directory = kwargs.get('directory', DEFAULT_CACHE_DIR)
+		# total bytes of stored stages kept after each store, least recently
+		# used removed first
+		self.max_bytes = kwargs.get('max_bytes', DEFAULT_CACHE_MEGABYTES * 1000000)
+		self.version = code_version()
+		self.hits = 0
+		self.misses = 0
+
+	def filename(self, key):
+		digest = hashlib.sha256((self.version + key).encode()).hexdigest()
+		return os.path.join(self.directory, digest + '.pickle')
+
+	def get(self, key, build):
+		# Load the stage stored under key, or call build() and store the
+		# result. key must describe the stage completely, like a StageKey.
+		filename = self.filename(key)
+		try:
+			cache_file = open(filename, 'rb')
+			stage = pickle.load(cache_file)
+			cache_file.close()
+			self.hits += 1
+			# mark it recently used
+			os.utime(filename)
+			return stage
+		except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+			pass
+		self.misses += 1
+		stage = build()
+		if stage == []:
+			# not a valid stage, nothing to keep
+			return stage
+		try:
+			os.makedirs(self.directory, exist_ok=True)
+			# write to a temporary name first, so a concurrent run never loads
+			# a partly written file
+			temporary_filename = f"{filename}.{os.getpid()}"
+			cache_file = open(temporary_filename, 'wb')
+			pickle.dump(stage, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+			cache_file.close()
+			os.replace(temporary_filename, filename)
+			self.evict()
+		except OSError:
+			print(f"Unable to write plan cache {self.directory}")
+		return stage
+
+	def evict(self):
+		# Remove the least recently used stages until the cache fits in
+		# max_bytes. Another run may remove the same files first.
+		entries = []
+		for filename in glob.glob(os.path.join(self.directory, '*.pickle')):
+			try:
+				status = os.stat(filename)
+			except OSError:
+				continue
+			entries.append([status.st_mtime, status.st_size, filename])
+		total = sum(entry[1] for entry in entries)
+		for modified, size, filename in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(filename)
+			except OSError:
+				pass
+			total -= size
@@ -0,0 +1,117 @@
+# Python3
+# Functions for profiling pool jobs and merging the results
+# Nino Carrillo
+# 17 Oct 2026
+
+import io
+import os
+import copy
+import cProfile
+import pstats
+
+# functions listed for each group in the text report
+REPORT_LINES = 25
+# collapsed stack lines smaller than this many microseconds are left out
+COLLAPSED_MIN_MICROSECONDS = 1
+
+class ProfileData:
+	def __init__(self, stats):
+		# Raw cProfile stats received from a worker. pstats.Stats loads any
+		# object with a create_stats method and a stats attribute.
+		self.stats = stats
+
+	def create_stats(self):
+		pass
+
+def profiled_job(target, args, queue, job_id):
+	# Pool job wrapper: run target(*args, queue, job_id) under cProfile, then
+	# send the raw stats to the parent as ['profile', job_id, stats] before the
+	# job's 'done' message.
+	profile = cProfile.Profile()
+	try:
+		profile.runcall(target, *args, queue, job_id)
+	finally:
+		profile.create_stats()
+		queue.put(['profile', job_id, profile.stats])
+
+def MergeProfiles(stats_list):
+	# pstats merges into the first stats it loaded, so start from a copy and
+	# leave the raw stats untouched for the next merge
+	merged = pstats.Stats(ProfileData(copy.deepcopy(stats_list[0])))
+	for stats in stats_list[1:]:
+		merged.add(ProfileData(stats))
+	return merged
+
+def ProfileReport(profiles):
+	# profiles maps a group name to the raw stats of every job in the group.
+	# Returns the text report of the merged stats of each group, followed by
+	# everything merged, sorted by time spent in each function itself.
+	string_output = ''
+	groups = list(profiles)
+	if len(groups) > 1:
+		groups.append(None)
+	for group in groups:
+		if group is None:
+			stats_list = [stats for name in profiles for stats in profiles[name]]
+			string_output += "Profile of all chains\n"
+		else:
+			stats_list = profiles[group]
+			string_output += f"Profile of {group}\n"
+		output = io.StringIO()
+		merged = MergeProfiles(stats_list)
+		merged.stream = output
+		merged.sort_stats('tottime').print_stats(REPORT_LINES)
+		string_output += output.getvalue()
+	return string_output
+
+def frame_name(function):
+	filename, line_number, function_name = function
+	if filename == '~':
+		# built-in functions have no source file
+		return function_name
+	return f"{function_name} ({os.path.basename(filename)}:{line_number})"
+
+def collapsed_stacks(group, stats):
+	# cProfile records caller -> callee edges, not whole stacks. Rebuild
+	# approximate stacks by walking down from the functions nobody called, and
+	# splitting each function's time among its callers in proportion to the
+	# time spent on each call edge.
+	callees = {}
+	for function, (cc, nc, tt, ct, callers) in stats.items():
+		for caller, edge in callers.items():
+			callees.setdefault(caller, []).append([function, edge[3]])
+	roots = [function for function in stats if len(stats[function][4]) == 0]
+	lines = {}
+
+	def walk(function, stack, scale):
+		stack = stack + [frame_name(function)]
+		self_time = stats[function][2] * scale
+		if self_time * 1e6 >= COLLAPSED_MIN_MICROSECONDS:
+			key = ';'.join(stack)
+			lines[key] = lines.get(key, 0) + self_time
+		for callee, edge_time in callees.get(function, []):
+			callee_time = stats[callee][3]
+			if callee_time <= 0 or frame_name(callee) in stack:
+				# no time to split, or recursion
+				continue
+			child_scale = scale * edge_time / callee_time
+			if edge_time * scale * 1e6 >= COLLAPSED_MIN_MICROSECONDS:
+				walk(callee, stack, child_scale)
+
+	for root in roots:
+		walk(root, [group], 1.0)
+	return [f"{key} {round(lines[key] * 1e6)}" for key in sorted(lines)]
+
+def WriteProfiles(prefix, profiles):
+	# Write everything merged to <prefix>.pstats, for pstats and profile
+	# viewers, and collapsed stacks grouped by chain to <prefix>.collapsed,
+	# for flame graph tools. Returns the filenames written.
+	all_stats = [stats for name in profiles for stats in profiles[name]]
+	MergeProfiles(all_stats).dump_stats(prefix + '.pstats')
+	collapsed_file = open(prefix + '.collapsed', 'w')
+	for group in profiles:
+		merged = MergeProfiles(profiles[group])
+		for line in collapsed_stacks(group.replace(';', ','), merged.stats):
+			collapsed_file.write(line + '\n')
+	collapsed_file.close()
+	return [prefix + '.pstats', prefix + '.collapsed']
@@ -6,16 +6,28 @@
 from scipy.signal import firwin
 from scipy.signal import remez
 from math import ceil, sin, pi, atan2
-from numpy import convolve, zeros, log
+from numpy import absolute, convolve, divide, exp, log, sqrt, zeros
 from modems_codecs.agc import AGC
 from modems_codecs.rrc import RRC
 from modems_codecs.data_classes import IQData
 from modems_codecs.pi_control import PI_control
 from modems_codecs.iir import IIR_1
-from modems_codecs.nco import NCO
+from modems_codecs.nco import NCO, PHASE_MODULUS
+from modems_codecs.block_loop import BlockLoop
+from modems_codecs.feed_forward import FeedForwardCarrier
 from modems_codecs.hilbert import Hilbert
 from modems_codecs.complexmath import ComplexNumber
 from modems_codecs.phase_detector import PhaseDetector
+from modems_codecs.fir import FIR
+
+# values of the 'carrier_recovery' option
+CARRIER_RECOVERY = ['loop', 'feedforward']
+
+def carrier_recovery_error(carrier_recovery):
+	# Returns a description of an invalid 'carrier_recovery' value, or None.
+	if carrier_recovery not in CARRIER_RECOVERY:
+		return f"Invalid 'carrier_recovery' {carrier_recovery} (expected 'loop' or 'feedforward')"
+	return None
 
 class BPSKModem:
 
@@ -85,6 +97,11 @@ class BPSKModem:
 			)
 
 		self.oscillator_amplitude = 1.0
+		self.agc_decimation = 1			# AGC envelope samples per update
+		self.loop_block = 1				# samples per carrier loop update
+		self.carrier_recovery = 'loop'	# 'loop' or 'feedforward'
+		self.ff_phase_span = 6			# symbols spanned by the feedforward phase estimate
+		self.ff_frequency_span = 64		# symbols spanned by the feedforward frequency estimate
 
 
 
@@ -106,8 +123,17 @@ class BPSKModem:
 		self.input_bpf_span = float(options.get('input_bpf_span', self.input_bpf_span))
 		self.sample_rate = float(options.get('sample_rate', self.sample_rate))
 		self.carrier_freq = float(options.get('carrier_freq', self.carrier_freq))
+		self.agc_decimation = int(options.get('agc_decimation', self.agc_decimation))
+		self.loop_block = int(options.get('loop_block', self.loop_block))
+		self.carrier_recovery = options.get('carrier_recovery', self.carrier_recovery)
+		self.ff_phase_span = float(options.get('ff_phase_span', self.ff_phase_span))
+		self.ff_frequency_span = float(options.get('ff_frequency_span', self.ff_frequency_span))
 		self.tune()
 
+	def ConfigError(self):
+		# Returns a description of an invalid option, or None.
+		return carrier_recovery_error(self.carrier_recovery)
+
 	def tune(self):
 		self.input_bpf_tap_count = round(
 			self.sample_rate * self.input_bpf_span / self.symbol_rate
@@ -142,7 +168,8 @@ class BPSKModem:
 			sustain_time = self.agc_sustain_time,
 			decay_rate = self.agc_decay_rate,
 			target_amplitude = self.oscillator_amplitude,
-			record_envelope = False
+			record_envelope = False,
+			decimation = self.agc_decimation
 		)
 
 		self.NCO = NCO(
@@ -151,6 +178,26 @@ class BPSKModem:
 			set_frequency = self.carrier_freq,
 			wavetable_size = 256
 		)
+		if self.loop_block > 1:
+			# The loop error i_mixer * q_mixer is -(sample^2) sin(2 * phase) / 2.
+			self.BlockLoop = BlockLoop(
+				nco = self.NCO,
+				controller = self.FeedbackController,
+				loop_filter = self.Loop_LPF,
+				block_size = self.loop_block,
+				order = 2,
+				detector_gain = -0.5
+			)
+		if self.carrier_recovery == 'feedforward':
+			self.FeedForward = FeedForwardCarrier(
+				sample_rate = self.sample_rate,
+				order = 2,
+				lock_angle = 0.0,
+				phase_window = round(self.sample_rate * self.ff_phase_span / self.symbol_rate),
+				frequency_window = round(self.sample_rate * self.ff_frequency_span / self.symbol_rate),
+				frequency_lag = round(self.sample_rate / self.symbol_rate / 2),
+				max_freq_offset = self.max_freq_offset
+			)
 		self.rrc = RRC(
 			sample_rate = self.sample_rate,
 			symbol_rate = self.symbol_rate,
@@ -159,13 +206,33 @@ class BPSKModem:
 		)
 		self.output_sample_rate = self.sample_rate
 
+		# Filter objects carry their overlap between calls to demod, so audio
+		# can be processed in consecutive blocks.
+		self.InputBPF = FIR(taps=self.input_bpf)
+		self.OutputRRC = FIR(taps=self.rrc.taps)
+
+	def reset(self):
+		# Clear the state carried between calls to demod, keeping the filters
+		# tune designed. The block loop takes its reference from the NCO, so
+		# it is reset after it.
+		for stage in [self.InputBPF, self.AGC, self.NCO, self.Loop_LPF, self.FeedbackController, self.OutputRRC]:
+			stage.reset()
+		if self.loop_block > 1:
+			self.BlockLoop.reset()
+		if self.carrier_recovery == 'feedforward':
+			self.FeedForward.reset()
+
 	def demod(self, input_audio):
 
 		# Apply the input filter.
-		audio = convolve(input_audio, self.input_bpf, 'valid')
+		audio = self.InputBPF.update(input_audio)
 
 		# perform AGC on the audio samples, saving over the original samples
 		self.AGC.apply(audio)
+		if self.carrier_recovery == 'feedforward':
+			return self.demod_feedforward(audio)
+		if self.loop_block > 1:
+			return self.demod_blocks(audio)
 
 		self.loop_output = []
 		demod_audio = []
@@ -190,10 +257,26 @@ class BPSKModem:
 
 		# Apply the output filter:
 		#demod_audio = convolve(demod_audio, self.output_lpf, 'valid')
-		demod_audio = convolve(demod_audio, self.rrc.taps, 'valid')
+		demod_audio = self.OutputRRC.update(demod_audio)
 
 		return demod_audio
 
+	def demod_feedforward(self, audio):
+		# Mix to baseband at the carrier frequency, apply the matched filter,
+		# and remove the carrier offset with the feedforward estimator.
+		reference = self.NCO.phases(count=len(audio)) * (2.0 * pi / PHASE_MODULUS)
+		baseband = self.OutputRRC.update(audio * exp(-1j * reference))
+		return self.FeedForward.update(baseband).real
+
+	def demod_blocks(self, audio):
+		# Costas loop updated once per loop_block samples. The mixing, phase
+		# detection and output are array operations over the whole buffer.
+		reference = self.BlockLoop.reference_phases(len(audio))
+		control = self.BlockLoop.run(audio * audio * exp(2j * reference))
+		sine, cosine = self.NCO.update_block(control)
+		self.loop_output = control
+		return self.OutputRRC.update(audio * cosine)
+
 class QPSKModem:
 
 	def __init__(self, **kwargs):
@@ -338,6 +421,11 @@ class QPSKModem:
 			)
 
 		self.oscillator_amplitude = 1.0
+		self.agc_decimation = 1			# AGC envelope samples per update
+		self.loop_block = 1				# samples per carrier loop update
+		self.carrier_recovery = 'loop'	# 'loop' or 'feedforward'
+		self.ff_phase_span = 6			# symbols spanned by the feedforward phase estimate
+		self.ff_frequency_span = 64		# symbols spanned by the feedforward frequency estimate
 
 
 
@@ -363,8 +451,17 @@ class QPSKModem:
 		self.output_lpf_span = float(options.get('output_lpf_span', self.output_lpf_span))
 		self.sample_rate = float(options.get('sample_rate', self.sample_rate))
 		self.carrier_freq = float(options.get('carrier_freq', self.carrier_freq))
+		self.agc_decimation = int(options.get('agc_decimation', self.agc_decimation))
+		self.loop_block = int(options.get('loop_block', self.loop_block))
+		self.carrier_recovery = options.get('carrier_recovery', self.carrier_recovery)
+		self.ff_phase_span = float(options.get('ff_phase_span', self.ff_phase_span))
+		self.ff_frequency_span = float(options.get('ff_frequency_span', self.ff_frequency_span))
 		self.tune()
 
+	def ConfigError(self):
+		# Returns a description of an invalid option, or None.
+		return carrier_recovery_error(self.carrier_recovery)
+
 	def tune(self):
 		self.input_bpf_tap_count = round(
 			self.sample_rate * self.input_bpf_span / self.symbol_rate
@@ -405,7 +502,8 @@ class QPSKModem:
 			sustain_time = self.agc_sustain_time,
 			decay_rate = self.agc_decay_rate,
 			target_amplitude = self.oscillator_amplitude,
-			record_envelope = False
+			record_envelope = False,
+			decimation = self.agc_decimation
 		)
 
 		self.NCO = NCO(
@@ -414,6 +512,34 @@ class QPSKModem:
 			set_frequency = self.carrier_freq,
 			wavetable_size = 256
 		)
+		if self.loop_block > 1:
+			# The block loop measures the phase of the fourth power of the
+			# branch filtered baseband, scaled to match the slope of the sign
+			# based phase detector near lock.
+			self.Detector_LPF = IIR_1(
+				sample_rate=self.sample_rate,
+				filter_type='lpf',
+				cutoff=self.Cosine_LPF.cutoff_freq,
+				gain=self.Cosine_LPF.gain
+			)
+			self.BlockLoop = BlockLoop(
+				nco = self.NCO,
+				controller = self.FeedbackController,
+				loop_filter = self.Loop_LPF,
+				block_size = self.loop_block,
+				order = 4,
+				detector_gain = sqrt(2) / 4
+			)
+		if self.carrier_recovery == 'feedforward':
+			self.FeedForward = FeedForwardCarrier(
+				sample_rate = self.sample_rate,
+				order = 4,
+				lock_angle = pi / 4,
+				phase_window = round(self.sample_rate * self.ff_phase_span / self.symbol_rate),
+				frequency_window = round(self.sample_rate * self.ff_frequency_span / self.symbol_rate),
+				frequency_lag = round(self.sample_rate / self.symbol_rate / 2),
+				max_freq_offset = self.max_freq_offset
+			)
 		self.rrc = RRC(
 			sample_rate = self.sample_rate,
 			symbol_rate = self.symbol_rate,
@@ -422,12 +548,34 @@ class QPSKModem:
 		)
 		self.output_sample_rate = self.sample_rate
 
+		# Filter objects carry their overlap between calls to demod, so audio
+		# can be processed in consecutive blocks.
+		self.InputBPF = FIR(taps=self.input_bpf)
+		self.OutputRRC_I = FIR(taps=self.rrc.taps)
+		self.OutputRRC_Q = FIR(taps=self.rrc.taps)
+
+	def reset(self):
+		# Clear the state carried between calls to demod, keeping the filters
+		# tune designed. The block loop takes its reference from the NCO, so
+		# it is reset after it.
+		for stage in [self.InputBPF, self.AGC, self.NCO, self.Cosine_LPF, self.Sine_LPF, self.Loop_LPF, self.FeedbackController, self.OutputRRC_I, self.OutputRRC_Q]:
+			stage.reset()
+		if self.loop_block > 1:
+			self.Detector_LPF.reset()
+			self.BlockLoop.reset()
+		if self.carrier_recovery == 'feedforward':
+			self.FeedForward.reset()
+
 	def demod(self, input_audio):
 		# Apply the input filter.
-		audio = convolve(input_audio, self.input_bpf, 'valid')
+		audio = self.InputBPF.update(input_audio)
 
 		# perform AGC on the audio samples, saving over the original samples
 		self.AGC.apply(audio)
+		if self.carrier_recovery == 'feedforward':
+			return self.demod_feedforward(audio)
+		if self.loop_block > 1:
+			return self.demod_blocks(audio)
 
 		self.loop_output = zeros(len(audio))
 		self.pi_i = zeros(len(audio))
@@ -467,14 +615,42 @@ class QPSKModem:
 			index += 1
 
 		# Apply the output filter:
-		demod_audio.i_data = convolve(demod_audio.i_data, self.rrc.taps, 'valid')
-		demod_audio.q_data = convolve(demod_audio.q_data, self.rrc.taps, 'valid')
+		demod_audio.i_data = self.OutputRRC_I.update(demod_audio.i_data)
+		demod_audio.q_data = self.OutputRRC_Q.update(demod_audio.q_data)
 		#plot.figure()
 		#plot.plot(self.loop_output)
 		#plot.plot(self.pi_i)
 		#plot.show()
 		return demod_audio
 
+	def demod_feedforward(self, audio):
+		# Mix to baseband at the carrier frequency, apply the matched filter,
+		# and remove the carrier offset with the feedforward estimator. The
+		# real part matches the cosine branch of the loop and the imaginary
+		# part the sine branch.
+		reference = self.NCO.phases(count=len(audio)) * (2.0 * pi / PHASE_MODULUS)
+		baseband = self.FeedForward.update(self.OutputRRC_I.update(audio * exp(1j * reference)))
+		demod_audio = IQData()
+		demod_audio.i_data = baseband.imag
+		demod_audio.q_data = baseband.real
+		return demod_audio
+
+	def demod_blocks(self, audio):
+		# Costas loop updated once per loop_block samples. The mixing, branch
+		# filters, phase detection and output are array operations over the
+		# whole buffer.
+		reference = self.BlockLoop.reference_phases(len(audio))
+		baseband = self.Detector_LPF.update_block(audio * exp(1j * reference))
+		magnitude = absolute(baseband)
+		terms = divide(baseband ** 4, magnitude ** 3, out=zeros(len(baseband), dtype=complex), where=(magnitude > 0))
+		control = self.BlockLoop.run(terms)
+		sine, cosine = self.NCO.update_block(control)
+		self.loop_output = control
+		demod_audio = IQData()
+		demod_audio.i_data = self.OutputRRC_I.update(self.Sine_LPF.update_block(audio * sine))
+		demod_audio.q_data = self.OutputRRC_Q.update(self.Cosine_LPF.update_block(audio * cosine))
+		return demod_audio
+
 
 class MPSKModem:
 
@@ -628,6 +804,11 @@ class MPSKModem:
 			)
 
 		self.oscillator_amplitude = 1.0
+		self.agc_decimation = 1			# AGC envelope samples per update
+		self.loop_block = 1				# samples per carrier loop update
+		self.carrier_recovery = 'loop'	# 'loop' or 'feedforward'
+		self.ff_phase_span = 6			# symbols spanned by the feedforward phase estimate
+		self.ff_frequency_span = 64		# symbols spanned by the feedforward frequency estimate
 		self.pd_gain = 32
 		self.tune()
 
@@ -635,8 +816,17 @@ class MPSKModem:
 		self.symbol_rate = float(options.get('symbol_rate', self.symbol_rate))
 		self.sample_rate = float(options.get('sample_rate', self.sample_rate))
 		self.carrier_freq = float(options.get('carrier_freq', self.carrier_freq))
+		self.agc_decimation = int(options.get('agc_decimation', self.agc_decimation))
+		self.loop_block = int(options.get('loop_block', self.loop_block))
+		self.carrier_recovery = options.get('carrier_recovery', self.carrier_recovery)
+		self.ff_phase_span = float(options.get('ff_phase_span', self.ff_phase_span))
+		self.ff_frequency_span = float(options.get('ff_frequency_span', self.ff_frequency_span))
 		self.tune()
 
+	def ConfigError(self):
+		# Returns a description of an invalid option, or None.
+		return carrier_recovery_error(self.carrier_recovery)
+
 	def tune(self):
 		self.input_bpf_tap_count = round(
 			self.sample_rate * self.input_bpf_span / 1000
@@ -682,7 +872,8 @@ class MPSKModem:
 			sustain_time = self.agc_sustain_time,
 			decay_rate = self.agc_decay_rate,
 			target_amplitude = self.oscillator_amplitude,
-			record_envelope = False
+			record_envelope = False,
+			decimation = self.agc_decimation
 		)
 
 		self.NCO = NCO(
@@ -691,6 +882,28 @@ class MPSKModem:
 			set_frequency = self.carrier_freq,
 			wavetable_size = 256
 		)
+		if self.loop_block > 1:
+			# The block loop measures the phase of the fourth power of the
+			# mixed samples, scaled to match the angle error table near lock.
+			self.BlockLoop = BlockLoop(
+				nco = self.NCO,
+				controller = self.FeedbackController,
+				loop_filter = self.Loop_LPF,
+				block_size = self.loop_block,
+				order = 4,
+				detector_gain = 45 * self.pd_gain / pi,
+				round_control = True
+			)
+		if self.carrier_recovery == 'feedforward':
+			self.FeedForward = FeedForwardCarrier(
+				sample_rate = self.sample_rate,
+				order = 4,
+				lock_angle = pi / 4,
+				phase_window = round(self.sample_rate * self.ff_phase_span / self.symbol_rate),
+				frequency_window = round(self.sample_rate * self.ff_frequency_span / self.symbol_rate),
+				frequency_lag = round(self.sample_rate / self.symbol_rate / 2),
+				max_freq_offset = self.max_freq_offset
+			)
 		self.rrc = RRC(
 			sample_rate = self.sample_rate,
 			symbol_rate = self.symbol_rate,
@@ -702,18 +915,47 @@ class MPSKModem:
 		# force costas loop to start at maximum frequency offset
 		self.FeedbackController.integral = -self.max_freq_offset
 
+		self.PhaseDetector = PhaseDetector(self.constellation_id,64,self.pd_gain)
+
+		# Filter objects carry their overlap between calls to demod, so audio
+		# can be processed in consecutive blocks. The real branch is a pure
+		# delay matched to the center tap of the Hilbert transformer.
+		self.InputBPF = FIR(taps=self.input_bpf)
+		self.HilbertImag = FIR(taps=self.Hilbert.taps)
+		hilbert_delay_taps = zeros(self.Hilbert.tap_count)
+		hilbert_delay_taps[self.Hilbert.delay] = 1.0
+		self.HilbertReal = FIR(taps=hilbert_delay_taps)
+		self.OutputRRC_I = FIR(taps=self.rrc.taps)
+		self.OutputRRC_Q = FIR(taps=self.rrc.taps)
+
+	def reset(self):
+		# Clear the state carried between calls to demod, keeping the filters
+		# tune designed. The block loop takes its reference from the NCO, so
+		# it is reset after it.
+		for stage in [self.InputBPF, self.AGC, self.HilbertImag, self.HilbertReal, self.NCO, self.Loop_LPF, self.FeedbackController, self.OutputRRC_I, self.OutputRRC_Q]:
+			stage.reset()
+		# force costas loop to start at maximum frequency offset
+		self.FeedbackController.integral = -self.max_freq_offset
+		if self.loop_block > 1:
+			self.BlockLoop.reset()
+		if self.carrier_recovery == 'feedforward':
+			self.FeedForward.reset()
+
 	def demod(self, input_audio):
 
-		pd = PhaseDetector(self.constellation_id,64,self.pd_gain)
+		pd = self.PhaseDetector
 
 		# Apply the input filter.
-		audio = convolve(input_audio, self.input_bpf, 'valid')
+		audio = self.InputBPF.update(input_audio)
 
 		# perform AGC on the audio samples, saving over the original samples
 		self.AGC.apply(audio)
-		imag_audio = convolve(audio, self.Hilbert.taps, 'valid')
-		real_audio = convolve(audio, self.Hilbert.delay_taps, 'valid')
-		real_audio = real_audio[:-self.Hilbert.delay]
+		imag_audio = self.HilbertImag.update(audio)
+		real_audio = self.HilbertReal.update(audio)
+		if self.carrier_recovery == 'feedforward':
+			return self.demod_feedforward(real_audio + 1j * imag_audio)
+		if self.loop_block > 1:
+			return self.demod_blocks(real_audio, imag_audio)
 		#plot.figure()
 		#plot.scatter(real_audio, imag_audio, s=1)
 		#plot.show()
@@ -747,8 +989,8 @@ class MPSKModem:
 			integral.append(self.FeedbackController.integral)
 
 		# Apply the output filter:
-		demod_audio.i_data = convolve(demod_audio.i_data, self.rrc.taps, 'valid')
-		demod_audio.q_data = convolve(demod_audio.q_data, self.rrc.taps, 'valid')
+		demod_audio.i_data = self.OutputRRC_I.update(demod_audio.i_data)
+		demod_audio.q_data = self.OutputRRC_Q.update(demod_audio.q_data)
 
 
 		# plot.figure()
@@ -771,3 +1013,32 @@ class MPSKModem:
 		# plot.legend(["I", "Q"])
 		# plot.show()
 		return demod_audio
+
+	def demod_feedforward(self, analytic):
+		# Mix to baseband at the carrier frequency, apply the matched filter,
+		# and remove the carrier offset with the feedforward estimator.
+		reference = self.NCO.phases(count=len(analytic)) * (2.0 * pi / PHASE_MODULUS)
+		baseband = self.FeedForward.update(self.OutputRRC_I.update(analytic * exp(-1j * reference)))
+		demod_audio = IQData()
+		demod_audio.i_data = baseband.real
+		demod_audio.q_data = baseband.imag
+		return demod_audio
+
+	def demod_blocks(self, real_audio, imag_audio):
+		# Costas loop updated once per loop_block samples. The mixing, phase
+		# detection and output are array operations over the whole buffer.
+		pd = self.PhaseDetector
+		analytic = real_audio + 1j * imag_audio
+		reference = self.BlockLoop.reference_phases(len(analytic))
+		baseband = analytic * exp(-1j * reference)
+		magnitude = absolute(baseband)
+		# the angle error table is zero outside this magnitude range
+		scale = pd.granularity * 0.5
+		gate = (magnitude >= pd.min_mag / scale) & (magnitude <= pd.max_mag / scale)
+		terms = divide(baseband.conjugate() ** 4, magnitude ** 4, out=zeros(len(baseband), dtype=complex), where=gate)
+		control = self.BlockLoop.run(terms)
+		mixed = analytic * self.NCO.complex_block(control)
+		demod_audio = IQData()
+		demod_audio.i_data = self.OutputRRC_I.update(mixed.real)
+		demod_audio.q_data = self.OutputRRC_Q.update(mixed.imag)
+		return demod_audio
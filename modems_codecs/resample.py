@@ -0,0 +1,71 @@
+# Python3
+# Functions for decimating input audio to a lower processing rate
+# Nino Carrillo
+# 17 Oct 2026
+
+from math import ceil
+from numpy import asarray, concatenate, float32, zeros
+from scipy.signal import firwin, kaiserord, upfirdn
+from modems_codecs.shared_audio import SharedAudio
+
+# Input samples decimated per call when resampling a whole recording.
+DECIMATION_BLOCK = 1 << 20
+
+class Decimator:
+	# Polyphase low pass decimation by a whole factor, block by block. Like
+	# FIR, consecutive blocks give the same output as one long block. Output
+	# sample k is centered on input sample k * factor, so sample addresses
+	# convert between the two rates by multiplying or dividing by factor.
+	def __init__(self, **kwargs):
+		self.factor = kwargs.get('factor', 2)
+		# Flat response up to passband times the output rate. Everything that
+		# would alias into the passband is attenuated by attenuation dB.
+		self.passband = kwargs.get('passband', 0.4)
+		self.attenuation = kwargs.get('attenuation', 60.0)
+		# transition band, normalized to the input Nyquist frequency
+		width = 2.0 * (1.0 - 2.0 * self.passband) / self.factor
+		tap_count, beta = kaiserord(self.attenuation, width)
+		# The tap count is 2 * m * factor + 1, so the filter delay is a whole
+		# number of output samples.
+		half_span = ceil((tap_count - 1) / (2 * self.factor)) * self.factor
+		self.tap_count = 2 * half_span + 1
+		self.taps = firwin(self.tap_count, 1.0 / self.factor, window=('kaiser', beta))
+		# The history starts with half a filter of zeros, to center the
+		# first output on the first input sample.
+		self.history = zeros(half_span)
+
+	def update(self, block):
+		working = concatenate((self.history, block))
+		if len(working) < self.tap_count:
+			self.history = working
+			return zeros(0)
+		count = (len(working) - self.tap_count) // self.factor + 1
+		used = working[:(count - 1) * self.factor + self.tap_count]
+		self.history = working[count * self.factor:]
+		# upfirdn gives the full convolution, whose first complete output is
+		# at (tap_count - 1) / factor.
+		first = (self.tap_count - 1) // self.factor
+		return upfirdn(self.taps, used, 1, self.factor)[first:first + count]
+
+def decimate_audio(audio_source, factor, block_size=DECIMATION_BLOCK):
+	# Decimate a SharedAudio or MappedAudio recording by factor, a block at a
+	# time, into a new SharedAudio of float32 samples. Sample k of the result
+	# is centered on input sample k * factor.
+	audio = audio_source.attach()
+	if audio.ndim > 1:
+		audio = audio[:, 0]
+	decimator = Decimator(factor=factor)
+	# decimate straight into the shared block, so no process holds another
+	# copy of the result
+	output_source = SharedAudio(shape=(-(-len(audio) // factor),), dtype=float32)
+	output = output_source.writable()
+	position = 0
+	for start in range(0, len(audio), block_size):
+		decimated = decimator.update(asarray(audio[start:start + block_size], dtype=float))
+		output[position:position + len(decimated)] = decimated
+		position += len(decimated)
+	# half a filter of zeros completes the outputs for the last input samples
+	decimated = decimator.update(zeros(decimator.tap_count // 2))
+	output[position:position + len(decimated)] = decimated
+	del output
+	return output_source
@@ -0,0 +1,77 @@
+# Python3
+# Functions for sharing input audio between processes without copying
+# Nino Carrillo
+# 17 Oct 2026
+
+from multiprocessing import shared_memory
+from numpy import dtype as numpy_dtype, ndarray, prod
+
+# Shared memory blocks this process has attached to, by name.
+attached_memory = {}
+
+def release_attached():
+	# Close every attached block that no view refers to any more. Long-lived
+	# workers call this between jobs so finished recordings can be freed.
+	for name in list(attached_memory):
+		try:
+			attached_memory[name].close()
+			del attached_memory[name]
+		except BufferError:
+			# still in use
+			pass
+
+class SharedAudio:
+	def __init__(self, audio=None, shape=None, dtype=None):
+		# Copy the audio into a shared memory block once. Only the block name,
+		# shape and dtype travel to the worker processes, which attach to the
+		# block as a read-only NumPy view instead of receiving a copy.
+		# With no audio, the block holds zeros of the given shape and dtype,
+		# and the creating process fills it through writable().
+		if audio is not None:
+			shape = audio.shape
+			dtype = audio.dtype
+		self.shape = tuple(shape)
+		self.dtype = numpy_dtype(dtype).str
+		self.sample_count = self.shape[0]
+		size = int(prod(self.shape)) * numpy_dtype(dtype).itemsize
+		self.memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+		self.name = self.memory.name
+		self.owner = True
+		if audio is not None:
+			view = self.writable()
+			view[:] = audio
+			del view
+
+	def writable(self):
+		# A writable view of the block, for the process that created it.
+		return ndarray(self.shape, dtype=self.dtype, buffer=self.memory.buf)
+
+	def __getstate__(self):
+		# Pickle the block reference, never the samples.
+		return {'name': self.name, 'shape': self.shape, 'dtype': self.dtype, 'sample_count': self.sample_count}
+
+	def __setstate__(self, state):
+		self.name = state['name']
+		self.shape = state['shape']
+		self.dtype = state['dtype']
+		self.sample_count = state['sample_count']
+		self.memory = None
+		self.owner = False
+
+	def attach(self):
+		if self.memory is None:
+			if self.name not in attached_memory:
+				attached_memory[self.name] = shared_memory.SharedMemory(name=self.name)
+			memory = attached_memory[self.name]
+		else:
+			memory = self.memory
+		view = ndarray(self.shape, dtype=self.dtype, buffer=memory.buf)
+		view.flags.writeable = False
+		return view
+
+	def unlink(self):
+		# Release the block. Only the process that created it removes it.
+		if self.owner and self.memory is not None:
+			self.memory.close()
+			self.memory.unlink()
+			self.memory = None
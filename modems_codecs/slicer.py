@@ -47,15 +47,18 @@ class BinarySlicer:
 		self.tune()
 
 	def tune(self):
-		self.phase_clock = 0.0
 		self.samples_per_symbol = self.sample_rate / self.symbol_rate
 		self.rollover_threshold = (self.samples_per_symbol / 2.0) - 0.5
+		self.reset()
+
+	def reset(self):
+		# Clear the state carried between calls to slice.
+		self.phase_clock = 0.0
 		self.working_byte = 0
 		self.working_bit_count = 0
 		self.last_sample = 0.0
 		self.streamaddress = 0
 
-
 	def slice(self, samples):
 		# This method will attempt to resynchronize a 2-level symbol stream,
 		# make binary bit decisions at resynchronized symbol centers, and store the
@@ -180,9 +183,13 @@ class QuadratureSlicer:
 		self.tune()
 
 	def tune(self):
-		self.phase_clock = 0.0
 		self.samples_per_symbol = self.sample_rate / self.symbol_rate
 		self.rollover_threshold = (self.samples_per_symbol / 2.0) - 0.5
+		self.reset()
+
+	def reset(self):
+		# Clear the state carried between calls to slice.
+		self.phase_clock = 0.0
 		self.working_byte = 0
 		self.working_bit_count = 0
 		self.last_i_sample = 0.0
@@ -284,15 +291,9 @@ class FourLevelSlicer:
 		self.tune()
 
 	def tune(self):
-		self.sync_register = 0
-		self.phase_clock = 0.0
+		self.threshold_depth = 8
 		self.samples_per_symbol = self.sample_rate / self.symbol_rate
 		self.rollover_threshold = (self.samples_per_symbol / 2.0) - 0.5
-		self.working_byte = 0
-		self.working_bit_count = 0
-		self.last_sample = 0.0
-		self.streamaddress = 0
-		self.state_register = 0
 		# create the symbol demap
 		self.demap = [0,0,0,0]
 		for index in range(4):
@@ -325,6 +326,27 @@ class FourLevelSlicer:
 			target_amplitude = 32768,
 			record_envelope = True
 		)
+		self.reset()
+
+	def reset(self):
+		# Clear the state carried between calls to slice.
+		self.sync_register = 0
+		self.phase_clock = 0.0
+		# the symbol decision clock, and the recent symbol magnitudes its
+		# threshold is set from, carry over between calls to slice
+		self.phase_clock_2 = 0.0
+		self.threshold = 0
+		self.threshold_samples = []
+		for i in range(self.threshold_depth):
+			self.threshold_samples.append(0)
+		self.threshold_index = 0
+		self.working_byte = 0
+		self.working_bit_count = 0
+		self.last_sample = 0.0
+		self.streamaddress = 0
+		self.state_register = 0
+		self.FastEnvelope.reset()
+		self.SlowEnvelope.reset()
 
 	def slice(self, samples):
 		# This method will attempt to resynchronize a 4-level symbol stream,
@@ -339,33 +361,22 @@ class FourLevelSlicer:
 		# it is synchronized. When zero-crossing is detected in sample stream,
 		# multiply phase_clock by lock_rate (positive number less than 1.0)
 		# this causes phase_clock to converge to synchronization
-		threshold_depth = 8
-		threshold_samples = []
-		for i in range(threshold_depth):
-			threshold_samples.append(0)
-		threshold_index = 0
 		result = []
 		result_index = 0
 		sample_stream = []
 		value_stream = []
 		symbol_stream = []
 		threshold_stream = []
-		fast_envelope = []
-		slow_envelope = []
+		# detect the fast and slow envelopes of the whole block at once:
+		fast_envelope = self.FastEnvelope.simple_envelope(samples)
+		slow_envelope = self.SlowEnvelope.simple_envelope(samples)
 		self.phase_clock_step = 1.0
 		freq_stream = []
 		phase_error_stream = []
 		phase_clock_error = 0
-		self.phase_clock_2 = 0.0
 		for sample in samples:
 			self.streamaddress += 1
 
-			# detect the fast and slow envelopes:
-			self.FastEnvelope.simple_peak_detect(sample)
-			self.SlowEnvelope.simple_peak_detect(sample)
-			fast_envelope.append(self.FastEnvelope.envelope)
-			slow_envelope.append(self.SlowEnvelope.envelope)
-
 			# increment phase clocks
 			self.phase_clock += self.phase_clock_step
 			# check for symbol center
@@ -373,15 +384,15 @@ class FourLevelSlicer:
 				# at or past symbol center, reset phase_clock
 				self.phase_clock -= self.samples_per_symbol
 
-				threshold_index += 1
-				if threshold_index >= threshold_depth:
-					threshold_index = 0
-				threshold_samples[threshold_index] = (abs(sample) * 2.0 / 3.0) * 1.0
+				self.threshold_index += 1
+				if self.threshold_index >= self.threshold_depth:
+					self.threshold_index = 0
+				self.threshold_samples[self.threshold_index] = (abs(sample) * 2.0 / 3.0) * 1.0
 				self.sync_register = (self.sync_register << 1) & 0xFFFF
 				if sample > 0:
 					self.sync_register += 1
 				if (self.sync_register == 0x5555) or (self.sync_register == 0xCCCC):
-					self.threshold = sum(threshold_samples) / threshold_depth
+					self.threshold = sum(self.threshold_samples) / self.threshold_depth
 					self.phase_clock_2 = self.phase_clock
 
 			self.phase_clock_2 += self.phase_clock_step
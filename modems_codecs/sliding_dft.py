@@ -0,0 +1,74 @@
+# Python3
+# Functions for detecting tones with a sliding DFT
+# Nino Carrillo
+# 17 Oct 2026
+
+from math import ceil, pi
+from numpy import absolute, arange, concatenate, cumsum, exp, int64, zeros
+from modems_codecs.nco import PHASE_MASK, PHASE_MODULUS
+
+# Mixer phasors are computed once for this many samples, and rotated for
+# each block of that many samples.
+PHASOR_BLOCK = 4096
+
+class SlidingDFT:
+	# Tone magnitude over sliding windows of several lengths, at one
+	# frequency. The audio is mixed down by the tone once, and each window
+	# sum is the difference of two running sums of the mixed signal, so the
+	# cost per sample does not depend on the window lengths. For each length
+	# the output matches the magnitude of a quadrature correlator of that many
+	# taps, as in AFSKModem, because
+	#	|sum(x[n - k] * exp(j w k))| = |sum(x[n - k] * exp(-j w (n - k)))|
+	# Like FIR, each length gives one output per complete window, and
+	# consecutive blocks give the same output as one long block.
+	def __init__(self, **kwargs):
+		self.sample_rate = kwargs.get('sample_rate', 8000.0)
+		self.frequency = kwargs.get('frequency', 1200.0)
+		self.lengths = kwargs.get('lengths', [8])
+		# The mixer phase is kept in an integer accumulator, like the NCO, so
+		# it never drifts.
+		self.phase_step = int(PHASE_MODULUS / self.sample_rate * self.frequency) & PHASE_MASK
+		# exp(-j * phase) for the phase after each of PHASOR_BLOCK samples from 0
+		steps = ((arange(1, PHASOR_BLOCK + 1, dtype=int64) * self.phase_step) & PHASE_MASK)
+		self.phasors = exp(-1j * (2.0 * pi / PHASE_MODULUS) * steps)
+		# rough cost per output sample in direct convolution taps, for job
+		# ordering
+		self.sample_cost = 20 + 4 * len(self.lengths)
+		self.reset()
+
+	def reset(self):
+		self.phase_accumulator = 0
+		# the mixed samples the longest window still needs
+		self.history = zeros(0, dtype=complex)
+		# input samples mixed so far
+		self.sample_count = 0
+
+	def update(self, audio):
+		# Returns the magnitude arrays, one per window length, in order.
+		working = concatenate((self.history, audio * self.mixer(len(audio))))
+		# working[i] is input sample start + i
+		start = self.sample_count - len(self.history)
+		self.sample_count += len(audio)
+		sums = concatenate(([0j], cumsum(working)))
+		magnitudes = []
+		for length in self.lengths:
+			# windows ending on this block's samples, from the first complete
+			# one, as indices into sums
+			first = max(self.sample_count - len(audio), length - 1) - start + 1
+			last = self.sample_count - start + 1
+			if first >= last:
+				magnitudes.append(zeros(0))
+				continue
+			magnitudes.append(absolute(sums[first:last] - sums[first - length:last - length]))
+		keep = min(len(working), max(self.lengths) - 1)
+		self.history = working[len(working) - keep:]
+		return magnitudes
+
+	def mixer(self, count):
+		# exp(-j * phase) after each of the next count samples
+		block_count = ceil(count / PHASOR_BLOCK)
+		starts = (arange(block_count, dtype=int64) * ((PHASOR_BLOCK * self.phase_step) & PHASE_MASK) + self.phase_accumulator) & PHASE_MASK
+		self.phase_accumulator = (self.phase_accumulator + count * self.phase_step) & PHASE_MASK
+		rotations = exp(-1j * (2.0 * pi / PHASE_MODULUS) * starts)
+		width = min(count, PHASOR_BLOCK)
+		return (rotations[:, None] * self.phasors[None, :width]).ravel()[:count]
@@ -0,0 +1,94 @@
+# Python3
+# Functions for finding the parts of a recording that hold signals
+# Nino Carrillo
+# 17 Oct 2026
+
+from numpy import asarray, cumsum, flatnonzero, diff, concatenate, zeros
+from numpy.fft import rfft, rfftfreq
+
+# Windows are analysed this many at a time, so a long memory-mapped file is
+# never converted to float64 all at once.
+WINDOWS_PER_CHUNK = 4096
+
+class Squelch:
+	def __init__(self, **kwargs):
+		self.sample_rate = kwargs.get('sample_rate', 8000)
+		# length of each energy measurement, in seconds
+		self.window_seconds = kwargs.get('window_seconds', 0.01)
+		# [low, high] bands to measure, in Hz, usually the input bands of the
+		# modems that will decode the audio. Upper edges are clipped to
+		# Nyquist, and DC is never measured.
+		self.bands = kwargs.get('bands', [[100.0, 20000.0]])
+		# a window is active when its band energy is this far above the noise
+		# floor, in dB
+		self.threshold_db = kwargs.get('threshold_db', 6.0)
+		# The noise floor is the lowest mean window energy over any stretch of
+		# this many seconds, so it holds on a busy channel as long as the
+		# recording has one quiet stretch this long.
+		self.floor_seconds = kwargs.get('floor_seconds', 0.2)
+		# audio kept before and after each active stretch, in seconds, so
+		# modems settle before a frame and flush after it
+		self.padding_seconds = kwargs.get('padding_seconds', 0.5)
+		# Quiet stretches shorter than this many seconds, after padding, are
+		# decoded anyway, at the ends of the recording too. Skipping them
+		# saves little, and every region restarts the modems.
+		self.min_gap_seconds = kwargs.get('min_gap_seconds', 1.0)
+		self.tune()
+
+	def tune(self):
+		self.window = max(1, round(self.window_seconds * self.sample_rate))
+		frequencies = rfftfreq(self.window, 1.0 / self.sample_rate)
+		self.band = zeros(len(frequencies), dtype=bool)
+		for low_freq, high_freq in self.bands:
+			self.band |= (frequencies >= low_freq) & (frequencies <= min(high_freq, self.sample_rate / 2))
+		self.band &= frequencies > 0
+		self.padding = round(self.padding_seconds * self.sample_rate)
+		self.floor_windows = max(1, round(self.floor_seconds / self.window_seconds))
+		self.min_gap = round(self.min_gap_seconds * self.sample_rate)
+
+	def window_energy(self, audio):
+		# band energy of each whole window of audio
+		window_count = len(audio) // self.window
+		energy = zeros(window_count)
+		for first in range(0, window_count, WINDOWS_PER_CHUNK):
+			last = min(window_count, first + WINDOWS_PER_CHUNK)
+			chunk = asarray(audio[first * self.window:last * self.window], dtype=float)
+			spectrum = rfft(chunk.reshape(last - first, self.window), axis=1)[:, self.band]
+			energy[first:last] = (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=1)
+		return energy
+
+	def noise_floor(self, energy):
+		# lowest moving average of floor_windows window energies
+		span = min(self.floor_windows, len(energy))
+		sums = concatenate(([0.0], cumsum(energy)))
+		return (sums[span:] - sums[:-span]).min() / span
+
+	def active_regions(self, audio):
+		# [start, end) sample ranges holding signal, padded and merged. The
+		# partial window at the end of the audio counts as active.
+		sample_count = len(audio)
+		energy = self.window_energy(audio)
+		if len(energy) == 0:
+			return [[0, sample_count]] if sample_count > 0 else []
+		threshold = self.noise_floor(energy) * 10 ** (self.threshold_db / 10)
+		if not (energy > threshold).any():
+			# No window stands out from the floor: the recording is all noise,
+			# or a signal that never stops. Either way there is no quiet to
+			# skip, so the whole recording is decoded.
+			return [[0, sample_count]]
+		active = concatenate(([False], energy > threshold, [len(energy) * self.window < sample_count], [False]))
+		# edges of each run of active windows
+		edges = flatnonzero(diff(active.astype(int)))
+		regions = []
+		for run_start, run_end in zip(edges[0::2], edges[1::2]):
+			start = run_start * self.window - self.padding
+			if start < self.min_gap:
+				start = 0
+			end = run_end * self.window + self.padding
+			if end > sample_count - self.min_gap:
+				end = sample_count
+			if len(regions) > 0 and start < regions[-1][1] + self.min_gap:
+				regions[-1][1] = max(regions[-1][1], end)
+			else:
+				regions.append([int(start), int(end)])
+		return regions
@@ -0,0 +1,112 @@
+# Python3
+# Functions for timing and counting the work done by each stage of a chain
+# Nino Carrillo
+# 17 Oct 2026
+
+import time
+from numpy import ndarray
+
+STAGE_NAMES = ['modem', 'slicer', 'stream', 'codec']
+
+class StageStats:
+	def __init__(self):
+		# totals over every call of one stage
+		self.calls = 0
+		self.wall_time = 0.0
+		self.cpu_time = 0.0
+		self.items_in = 0		# samples, or bytes for the stream and codec
+		self.items_out = 0		# samples, bytes, or packets from the codec
+
+	def run(self, stage, data):
+		# Call stage(data), and add its time and item counts to the totals.
+		start_cpu_time = time.process_time()
+		start_wall_time = time.perf_counter()
+		result = stage(data)
+		self.cpu_time += time.process_time() - start_cpu_time
+		self.wall_time += time.perf_counter() - start_wall_time
+		self.calls += 1
+		self.items_in += ItemCount(data)
+		self.items_out += ItemCount(result)
+		return result
+
+	def add(self, other):
+		self.calls += other.calls
+		self.wall_time += other.wall_time
+		self.cpu_time += other.cpu_time
+		self.items_in += other.items_in
+		self.items_out += other.items_out
+
+	def throughput(self):
+		# input items per CPU second
+		if self.cpu_time > 0:
+			return self.items_in / self.cpu_time
+		return 0.0
+
+	def as_dict(self):
+		return {
+			'calls': self.calls,
+			'wall_time': self.wall_time,
+			'cpu_time': self.cpu_time,
+			'items_in': self.items_in,
+			'items_out': self.items_out,
+			'throughput': self.throughput()
+		}
+
+def ItemCount(items):
+	# A multi-output modem like afsk_bank returns a list of streams of equal
+	# length, counted as the samples of one stream.
+	if isinstance(items, list) and len(items) > 0 and isinstance(items[0], ndarray):
+		return len(items[0])
+	return len(items)
+
+def NewChainStats():
+	# one StageStats per stage of a chain
+	return {stage_name: StageStats() for stage_name in STAGE_NAMES}
+
+def NewTreeStats(tree):
+	# Chain stats for each chain of a DemodTree, in tree.chains() order. A
+	# shared modem or slicer runs once, so the chains below it share one
+	# StageStats object for it.
+	result = []
+	modem_stats = StageStats()
+	for branch in tree.branches:
+		slicer_stats = StageStats()
+		for chain in branch.chains:
+			chain_stats = NewChainStats()
+			chain_stats['modem'] = modem_stats
+			chain_stats['slicer'] = slicer_stats
+			result.append(chain_stats)
+	return result
+
+def ChainStatsDict(chain_stats):
+	return {stage_name: chain_stats[stage_name].as_dict() for stage_name in STAGE_NAMES}
+
+def AddStatsDict(total, chain_stats):
+	# Add one ChainStatsDict to another, as for segments of the same chain.
+	for stage_name in STAGE_NAMES:
+		for key in ['calls', 'wall_time', 'cpu_time', 'items_in', 'items_out']:
+			total[stage_name][key] += chain_stats[stage_name][key]
+		if total[stage_name]['cpu_time'] > 0:
+			total[stage_name]['throughput'] = total[stage_name]['items_in'] / total[stage_name]['cpu_time']
+
+def StageTimingReport(stats_by_chain, audio_seconds):
+	# Text table of the stats of each stage of each chain, from ChainStatsDict
+	# results by chain name. A modem or slicer shared by several chains shows
+	# its full cost under each of them.
+	string_output = ''
+	for chain_name in stats_by_chain:
+		chain_stats = stats_by_chain[chain_name]
+		chain_cpu_time = sum(chain_stats[stage_name]['cpu_time'] for stage_name in STAGE_NAMES)
+		string_output += f"{chain_name}: {round(chain_cpu_time, 3)} CPU seconds"
+		if chain_cpu_time > 0:
+			string_output += f", {round(audio_seconds / chain_cpu_time, 2)}x real time"
+		string_output += "\n"
+		for stage_name in STAGE_NAMES:
+			stage = chain_stats[stage_name]
+			string_output += f"  {stage_name:7}"
+			string_output += f"{round(stage['wall_time'], 3):>10} s wall"
+			string_output += f"{round(stage['cpu_time'], 3):>10} s CPU"
+			string_output += f"{stage['items_in']:>12} in"
+			string_output += f"{stage['items_out']:>12} out"
+			string_output += f"{round(stage['throughput']):>14} in/s\n"
+	return string_output
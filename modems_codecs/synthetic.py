@@ -0,0 +1,268 @@
+# Python3
+# Functions for generating synthetic test signals
+# Nino Carrillo
+# 17 Oct 2026
+
+import random
+from math import ceil
+from numpy import arange, array, concatenate, cumsum, exp, mean, pi, sin, sqrt, zeros
+from numpy import random as numpy_random
+from scipy.signal import firwin, lfilter
+from modems_codecs.crc_functions import AppendCRC
+from modems_codecs.il2p import hamming_decode
+from modems_codecs.rrc import RRC
+import modems_codecs.rs_functions as rs_functions
+import modems_codecs.gf_functions as gf_functions
+
+# Every frame is a UI frame between these stations, with PID 0xF0. Callsigns
+# fit in an IL2P header: six characters, four bit SSIDs.
+SOURCE_CALLSIGN = ['BENCH', 1]
+DEST_CALLSIGN = ['PYMODM', 2]
+
+# Bytes of preamble before each frame, so the modem locks, the AGC settles and
+# the slicer clock syncs before the frame starts.
+PREAMBLE_BYTES = 24
+# Audio between frames, in seconds
+FRAME_GAP = 0.1
+# Tone shift of the AFSK PLL modems, which only know their center frequency,
+# in fractions of the symbol rate
+PLL_SHIFT = 2.0 / 3.0
+
+def callsign_bytes(callsign, ssid_bits):
+	return [ord(character) << 1 for character in callsign[0].ljust(6)] + [ssid_bits | (callsign[1] << 1)]
+
+def ax25_frame(text):
+	# AX.25 UI command frame with FCS, laid out exactly as the IL2P decoder
+	# rebuilds it, so both codecs decode the same bytes.
+	frame = callsign_bytes(DEST_CALLSIGN, 0xE0) + callsign_bytes(SOURCE_CALLSIGN, 0x61) + [0x03, 0xF0]
+	frame += [ord(character) for character in text]
+	AppendCRC(frame)
+	return frame
+
+def frame_texts(count, seed):
+	# deterministic printable payloads of varying length
+	generator = random.Random(seed)
+	texts = []
+	for index in range(count):
+		length = generator.randrange(20, 80)
+		texts.append(f'frame {index:04d} ' + ''.join(generator.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789') for i in range(length)))
+	return texts
+
+def byte_bits(data):
+	# bits of each byte, most significant first
+	bits = []
+	for byte in data:
+		for bit_index in range(7, -1, -1):
+			bits.append((byte >> bit_index) & 1)
+	return bits
+
+def hdlc_bits(frame):
+	# AX.25 bit order: flags, then each byte least significant bit first with
+	# a zero stuffed after five ones, then closing flags.
+	flag = [0, 1, 1, 1, 1, 1, 1, 0]
+	bits = flag * PREAMBLE_BYTES
+	ones = 0
+	for byte in frame:
+		for bit_index in range(8):
+			bit = (byte >> bit_index) & 1
+			bits.append(bit)
+			ones = ones + 1 if bit else 0
+			if ones == 5:
+				bits.append(0)
+				ones = 0
+	return bits + flag * 4
+
+def scramble(data, polynomial, shift_register, invert):
+	# Inverse of the lfsr descramblers: the bit sequence they turn back into
+	# data. Returns the bits and the final shift register.
+	bits = []
+	for bit in data:
+		bit = (bit ^ invert) ^ (shift_register & 1)
+		if bit:
+			shift_register ^= polynomial
+		shift_register >>= 1
+		bits.append(bit)
+	return bits, shift_register
+
+def il2p_scramble(data):
+	# IL2P scrambles each header and block from the same starting state
+	bits, shift_register = scramble(byte_bits(data), 0x211, 0x1F0, 0)
+	return [int(''.join(str(bit) for bit in bits[index:index + 8]), 2) for index in range(0, len(bits), 8)]
+
+def rs_parity(rs, data):
+	# Systematic Reed Solomon parity bytes for data, highest order first, as
+	# rs_functions.decode expects them after the data.
+	root_count = rs['num_roots']
+	parity = [0] * root_count
+	for byte in data:
+		feedback = byte ^ parity[0]
+		parity = parity[1:] + [0]
+		if feedback:
+			for index in range(root_count):
+				parity[index] ^= gf_functions.mul(rs['gf'], feedback, rs['genpoly'][root_count - 1 - index])
+	return parity
+
+def hamming_encode(nibble):
+	# The Hamming(7,4) codeword of nibble: the word that decodes to nibble
+	# with every single bit error.
+	for word in range(128):
+		if all(hamming_decode(word ^ (1 << bit)) == nibble for bit in range(7)) and hamming_decode(word) == nibble:
+			return word
+	return 0
+
+def il2p_bits(frame, trailing_crc):
+	# Type 1 IL2P frame carrying the AX.25 UI frame: preamble, sync word,
+	# header, RS blocks of the information field, and the Hamming coded CRC.
+	info = frame[16:-2]
+	header = [0] * 13
+	for index in range(6):
+		header[index] = (ord(DEST_CALLSIGN[0].ljust(6)[index]) - 0x20) & 0x3F
+		header[index + 6] = (ord(SOURCE_CALLSIGN[0].ljust(6)[index]) - 0x20) & 0x3F
+	header[12] = (DEST_CALLSIGN[1] << 4) | SOURCE_CALLSIGN[1]
+	# UI frame, header type 1
+	header[0] |= 0x40
+	header[1] |= 0x80
+	# PID 0xF0 is IL2P PID 0xF
+	for index in range(4):
+		header[index + 1] |= 0x40
+	# UI opcode, command
+	control = (5 << 3) | 0x4
+	for index in range(7):
+		if control & (0x40 >> index):
+			header[index + 5] |= 0x40
+	for index in range(10):
+		if len(info) & (0x200 >> index):
+			header[index + 2] |= 0x80
+	header_rs = rs_functions.initialize(0, 2, 8, 0x11D)
+	block_rs = rs_functions.initialize(0, 16, 8, 0x11D)
+	data = [0x55] * PREAMBLE_BYTES + [0xF1, 0x5E, 0x48]
+	scrambled = il2p_scramble(header)
+	data += scrambled + rs_parity(header_rs, scrambled)
+	if len(info) > 0:
+		# big blocks, one byte longer, come first
+		block_count = ceil(len(info) / 239)
+		block_size = len(info) // block_count
+		big_blocks = len(info) - block_count * block_size
+		position = 0
+		for block_index in range(block_count):
+			size = block_size + (1 if block_index < big_blocks else 0)
+			scrambled = il2p_scramble(info[position:position + size])
+			data += scrambled + rs_parity(block_rs, scrambled)
+			position += size
+	if trailing_crc:
+		crc = frame[-2] | (frame[-1] << 8)
+		data += [hamming_encode((crc >> shift) & 0xF) for shift in [12, 8, 4, 0]]
+	return byte_bits(data + [0x55] * 4)
+
+def symbol_levels(bits, bits_per_symbol, levels):
+	# group bits into symbols, most significant first, and map each symbol
+	# value to its level
+	return [levels[int(''.join(str(bit) for bit in bits[index:index + bits_per_symbol]).ljust(bits_per_symbol, '0'), 2)] for index in range(0, len(bits), bits_per_symbol)]
+
+def sample_symbols(symbols, sample_rate, symbol_rate):
+	# hold each symbol for its share of samples
+	sample_count = round(len(symbols) * sample_rate / symbol_rate)
+	indices = (arange(sample_count) * symbol_rate / sample_rate).astype(int)
+	return array(symbols)[indices]
+
+def afsk_signal(levels, sample_rate, symbol_rate, mark_freq, space_freq):
+	# continuous phase AFSK, mark for positive levels
+	frequencies = sample_symbols([mark_freq if level > 0 else space_freq for level in levels], sample_rate, symbol_rate)
+	return sin(cumsum(2.0 * pi * frequencies / sample_rate))
+
+def psk_signal(symbols, sample_rate, symbol_rate, carrier_freq, rolloff_rate):
+	# root raised cosine shaped symbols on a carrier
+	samples_per_symbol = sample_rate / symbol_rate
+	impulses = zeros(ceil(len(symbols) * samples_per_symbol) + 1, dtype=complex)
+	impulses[(arange(len(symbols)) * samples_per_symbol).astype(int)] = symbols
+	taps = RRC(sample_rate=sample_rate, symbol_rate=symbol_rate, symbol_span=6, rolloff_rate=rolloff_rate).taps
+	baseband = lfilter(taps, 1.0, impulses)
+	return (baseband * exp(2j * pi * carrier_freq * arange(len(baseband)) / sample_rate)).real
+
+def baseband_signal(levels, sample_rate, symbol_rate):
+	# NRZ levels through a low pass filter at the symbol rate
+	taps = firwin(round(4 * sample_rate / symbol_rate) | 1, 0.6 * symbol_rate, fs=sample_rate)
+	return lfilter(taps, 1.0, sample_symbols(levels, sample_rate, symbol_rate))
+
+def qpsk_symbols(bits):
+	# differential QPSK for QuadratureSlicer: each pair of bits advances the
+	# phase by the quarter turns that the slicer's demap turns back into them
+	turns = {3: 0, 2: 1, 0: 2, 1: 3}
+	phase = 0
+	symbols = []
+	for value in symbol_levels(bits, 2, [0, 1, 2, 3]):
+		phase = (phase + turns[value]) % 4
+		symbols.append(exp(1j * (pi / 4 + phase * pi / 2)))
+	return symbols
+
+def chain_signal(chain, variant, sample_rate, texts):
+	# Modulated frames that chain decodes, or None if its modem, slicer or
+	# codec is not one this module can generate.
+	modem, slicer, stream, codec = chain[1:5]
+	modem_name = type(modem).__name__
+	slicer_name = type(slicer).__name__
+	codec_name = type(codec).__name__
+	bits = []
+	for text in texts:
+		frame = ax25_frame(text)
+		if codec_name == 'AX25Codec':
+			bits += hdlc_bits(frame)
+		elif codec_name == 'IL2PCodec':
+			bits += il2p_bits(frame, codec.collect_trailing_crc)
+		else:
+			return None
+	if type(stream).__name__ != 'LFSR':
+		return None
+	bits, shift_register = scramble(bits, stream.polynomial, 0, 1 if stream.invert else 0)
+	symbol_rate = float(modem.symbol_rate)
+	if slicer_name == 'QuadratureSlicer' and slicer.bits_per_symbol == 2:
+		symbols = qpsk_symbols(bits)
+	elif slicer_name in ['BinarySlicer', 'QuadratureSlicer']:
+		symbols = symbol_levels(bits, 1, [-1, 1])
+	else:
+		return None
+	if modem_name in ['AFSKModem', 'AFSKBankModem']:
+		# tones where the correlators listen
+		tones = {'mark_freq': modem.mark_freq, 'space_freq': modem.space_freq, 'correlator_offset': modem.correlator_offset}
+		if variant is not None and variant < len(getattr(modem, 'variants', [])):
+			tones = {name: float(modem.variants[variant].get(name, tones[name])) for name in tones}
+		offset = tones['correlator_offset']
+		return afsk_signal(symbols, sample_rate, symbol_rate, tones['mark_freq'] + offset, tones['space_freq'] + offset)
+	if modem_name == 'AFSKPLLModem':
+		shift = PLL_SHIFT * symbol_rate / 2.0
+		return afsk_signal(symbols, sample_rate, symbol_rate, modem.carrier_freq + shift, modem.carrier_freq - shift)
+	if modem_name in ['BPSKModem', 'QPSKModem', 'MPSKModem']:
+		return psk_signal(symbols, sample_rate, symbol_rate, modem.carrier_freq, modem.rrc_rolloff_rate)
+	if modem_name == 'FSKModem':
+		return baseband_signal([-level if modem.invert else level for level in symbols], sample_rate, symbol_rate)
+	return None
+
+def synthetic_frames(demod_trees, sample_rate, seconds, seed, snr_db=20.0):
+	# About seconds of audio holding frames for each chain in turn, so every
+	# configured modem, stream and codec decodes some. Chains that would be
+	# sent identical signals share their frames. The same trees, rate and seed
+	# always give the same samples.
+	chains = []
+	signatures = []
+	for tree in demod_trees:
+		for branch in tree.branches:
+			for chain in branch.chains:
+				signal = chain_signal(chain, branch.output, sample_rate, frame_texts(1, seed))
+				if signal is None:
+					continue
+				signature = signal.tobytes()
+				if signature not in signatures:
+					signatures.append(signature)
+					chains.append([chain, branch.output, len(signal) / sample_rate])
+	gap = zeros(round(FRAME_GAP * sample_rate))
+	pieces = [gap]
+	for index, [chain, variant, frame_seconds] in enumerate(chains):
+		# as many frames as fit this chain's share, and at least one
+		count = max(1, int(seconds / len(chains) / (frame_seconds + FRAME_GAP)))
+		for text in frame_texts(count, seed + index):
+			signal = chain_signal(chain, variant, sample_rate, [text])
+			pieces += [signal / sqrt(mean(signal ** 2)), gap]
+	audio = concatenate(pieces)
+	audio = concatenate((audio, zeros(max(0, round(seconds * sample_rate) - len(audio)))))
+	generator = numpy_random.default_rng(seed)
+	return audio + generator.normal(0.0, 10 ** (-snr_db / 20), len(audio))
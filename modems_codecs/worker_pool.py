@@ -0,0 +1,149 @@
+# Python3
+# Functions for running demod jobs on a fixed pool of worker processes
+# Nino Carrillo
+# 17 Oct 2026
+
+import os
+import time
+import traceback
+from multiprocessing import Process, Queue
+from queue import Empty
+from modems_codecs.shared_audio import release_attached
+
+
+def available_cpus():
+	# CPUs this process is allowed to run on
+	if hasattr(os, 'sched_getaffinity'):
+		return sorted(os.sched_getaffinity(0))
+	return list(range(os.cpu_count() or 1))
+
+def pool_worker(worker_id, job_queue, result_queue, cpu):
+	# Run jobs from job_queue until a None job arrives. Each job is
+	# [job_id, target, args] and is run as target(*args, result_queue, job_id).
+	# The worker reports every job back with a 'done' message, whatever
+	# happened.
+	if cpu is not None:
+		os.sched_setaffinity(0, {cpu})
+	while True:
+		job = job_queue.get()
+		if job is None:
+			break
+		job_id, target, args = job
+		start_cpu_time = time.process_time()
+		start_wall_time = time.time()
+		try:
+			target(*args, result_queue, job_id)
+		except Exception:
+			result_queue.put(['error', job_id, traceback.format_exc()])
+		cpu_time = time.process_time() - start_cpu_time
+		wall_time = time.time() - start_wall_time
+		# the job's views of shared audio are gone, let go of the mappings
+		release_attached()
+		result_queue.put(['done', worker_id, job_id, cpu_time, wall_time])
+
+class WorkerPool:
+	def __init__(self, **kwargs):
+		self.cpus = available_cpus()
+		self.worker_count = kwargs.get('worker_count', 0)
+		if self.worker_count < 1:
+			self.worker_count = len(self.cpus)
+		# pin each worker to one CPU so it keeps its caches warm
+		self.pin_cpus = kwargs.get('pin_cpus', False)
+		# how long a dead worker can go unnoticed while waiting on results
+		self.crash_check_interval = kwargs.get('crash_check_interval', 1.0)
+
+		self.result_queue = Queue()
+		self.workers = {}		# worker_id: [Process, job Queue]
+		self.assigned = {}		# worker_id: job_id of the job it is running
+		self.pending = []		# [job_id, target, args] not yet dispatched
+		self.job_times = {}		# job_id: [cpu seconds, wall seconds]
+		self.job_count = 0
+		self.next_worker_id = 0
+		for i in range(self.worker_count):
+			self.start_worker()
+
+	def start_worker(self):
+		worker_id = self.next_worker_id
+		self.next_worker_id += 1
+		cpu = None
+		if self.pin_cpus:
+			cpu = self.cpus[worker_id % len(self.cpus)]
+		job_queue = Queue()
+		process = Process(
+			target = pool_worker,
+			args = ([worker_id, job_queue, self.result_queue, cpu])
+		)
+		process.start()
+		self.workers[worker_id] = [process, job_queue]
+
+	def submit(self, target, args):
+		# Jobs are dispatched in submission order, so submit the most
+		# expensive ones first.
+		job_id = self.job_count
+		self.job_count += 1
+		self.pending.append([job_id, target, args])
+		return job_id
+
+	def dispatch(self):
+		# Hand pending jobs to idle workers. Each worker has its own job queue,
+		# so the pool always knows which job a worker holds if it dies.
+		for worker_id in self.workers:
+			if len(self.pending) == 0:
+				break
+			if worker_id not in self.assigned:
+				job = self.pending.pop(0)
+				self.assigned[worker_id] = job[0]
+				self.workers[worker_id][1].put(job)
+
+	def run(self, on_message):
+		# Block until every submitted job is done. Messages sent by the jobs
+		# themselves, and each job's 'done' message, are passed to on_message
+		# as they arrive. on_message may submit more jobs.
+		self.dispatch()
+		while len(self.assigned) > 0 or len(self.pending) > 0:
+			try:
+				message = self.result_queue.get(timeout=self.crash_check_interval)
+			except Empty:
+				self.check_workers(on_message)
+				continue
+			self.handle_message(message, on_message)
+
+	def handle_message(self, message, on_message):
+		if message[0] == 'done':
+			worker_id, job_id, cpu_time, wall_time = message[1:]
+			self.job_times[job_id] = [cpu_time, wall_time]
+			self.assigned.pop(worker_id, None)
+			on_message(message)
+			self.dispatch()
+		else:
+			on_message(message)
+
+	def check_workers(self, on_message):
+		dead = [worker_id for worker_id in self.workers if self.workers[worker_id][0].exitcode is not None]
+		if len(dead) == 0:
+			return
+		# Anything a dead worker sent is already in the pipe, so handle it
+		# before deciding which jobs were lost.
+		while True:
+			try:
+				message = self.result_queue.get_nowait()
+			except Empty:
+				break
+			self.handle_message(message, on_message)
+		for worker_id in dead:
+			exitcode = self.workers[worker_id][0].exitcode
+			job_id = self.assigned.pop(worker_id, None)
+			if job_id is not None:
+				on_message(['error', job_id, f"worker {worker_id} exited with code {exitcode}"])
+				on_message(['done', worker_id, job_id, 0.0, 0.0])
+			del self.workers[worker_id]
+			# replace the worker so the remaining jobs still run
+			self.start_worker()
+		self.dispatch()
+
+	def close(self):
+		for worker_id in self.workers:
+			self.workers[worker_id][1].put(None)
+		for worker_id in self.workers:
+			self.workers[worker_id][0].join()
+		self.workers = {}
@@ -6,54 +6,55 @@
 # 1 Wrong Python version
 # 2 Wrong argument count
 # 3 Unable to open config file
-# 4 Unable to open audio file
+# 4 Unable to open audio file or stream, or no audio files given
 
 import sys
-from scipy.io.wavfile import read as readwav
-from scipy.io.wavfile import write as writewav
+import os
+import glob
+import argparse
 import subprocess
-from multiprocessing import Process, Queue
 import time
 
-from modems_codecs.packet_meta import PacketMeta, PacketMetaArray
+from modems_codecs.packet_meta import PacketMeta, PacketMetaArray, LiveCorrelator, print_decoded_packet_to_string
 import modems_codecs.chain_builder
 import modems_codecs.chain_execute
+from modems_codecs.shared_audio import SharedAudio
+from modems_codecs.audio_source import open_mapped_wav, open_mapped_raw, RAW_FORMATS, DEFAULT_BLOCK_SECONDS
+from modems_codecs.worker_pool import WorkerPool, available_cpus
+from modems_codecs.live_stream import BlockDistributor, read_raw_blocks, BLOCKS_PER_LATENCY
+from modems_codecs.stage_stats import StageTimingReport, AddStatsDict
+from modems_codecs.plan_cache import PlanCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MEGABYTES
+from modems_codecs.profiling import profiled_job, ProfileReport, WriteProfiles
+from modems_codecs.squelch import Squelch
+from queue import Empty
 import json
 
 from modems_codecs.hilbert import Hilbert
 
-def main():
-	# check correct version of Python
-	if sys.version_info < (3, 0):
-		print("Python version should be 3.x, exiting")
-		sys.exit(1)
-	# check correct number of parameters were passed to command line
-	if len(sys.argv) != 3:
-		print("Not enough arguments. Usage: python3 pymodem.py <config json> <sound file>")
-		sys.exit(2)
-	# try to open configuration json
-	try:
-		configfile = open(sys.argv[1], 'r')
-		stack_plan = []
-		for line in configfile:
-			stack_plan.append(json.loads(line))
-		configfile.close()
-	except:
-		print('Unable to open config json file.')
-		sys.exit(3)
-	# try to open audio file
-	try:
-		input_sample_rate, input_audio = readwav(sys.argv[2])
-	except:
-		print('Unable to open audio file.')
-		sys.exit(4)
-
+def build_stacks(stack_plan, input_sample_rate, config_name, plan_cache=None, multirate=False):
 	print("Building processing stacks from config json")
 
+	def build_stage(stage_type, stage_args, stage_key, build):
+		# Call build(), or load the stage it would build from the plan cache.
+		# The key includes the code of the stage's module, which may come from
+		# another package.
+		if plan_cache is None:
+			return build()
+		source = modems_codecs.chain_builder.StageSource(stage_type, stage_args.get('type'))
+		return plan_cache.get(stage_type + stage_key + source, build)
+
 	demod_stack = []
+	# modem and slicer objects built so far, by StageKey. Chains with identical
+	# modem (and slicer) configuration share one object.
+	shared_stages = {}
 	report_stack = []
 	demod_stack_index = 0
 	report_stack_index = 0
+	# 'modem' lines define a modem once, by object_name, for chains to share.
+	named_modems = {}
+	for line in stack_plan:
+		if isinstance(line, dict) and line.get('object_type') == 'modem' and 'object_name' in line and 'modem' in line:
+			named_modems[line['object_name']] = line['modem']
 	line_number = 0
 	for line in stack_plan:
 		line_number += 1
@@ -61,7 +62,7 @@ def main():
 			object_type = line.get('object_type')
 			print(f"Found object_type: {object_type}")
 		except:
-			print(f"Missing 'object_type' in {sys.argv[1]} line {line_number}, skipping this chain.")
+			print(f"Missing 'object_type' in {config_name} line {line_number}, skipping this chain.")
 			continue
 
 		if object_type == 'demod_chain':
@@ -70,56 +71,114 @@ def main():
 				demod_stack[demod_stack_index].append(line['object_name'])
 				print(f"Line {line_number}: {demod_stack[demod_stack_index][0]}")
 			except:
-				print(f"Missing 'object_name' in {sys.argv[1]} line {line_number}, skipping this chain.")
+				print(f"Missing 'object_name' in {config_name} line {line_number}, skipping this chain.")
 				demod_stack_index += 1
 				# go to the next iteration of the for loop
 				continue
 			# append the modem object to this chain
 			#try:
-			modem = modems_codecs.chain_builder.ModemConfigurator(
-				input_sample_rate,
-				line['modem'],
-			)
+			# 'variant' picks one output stream of a multi-output modem. It is
+			# not part of the modem's configuration, so chains taking different
+			# streams share the modem.
+			modem_args = dict(line['modem'])
+			variant = modem_args.pop('variant', None)
+			# "name" takes the modem from a 'modem' line instead, so every chain
+			# naming it gets the same modem.
+			modem_name = modem_args.pop('name', None)
+			if modem_name is not None:
+				if len(modem_args) > 0:
+					print(f"'modem' in {line['object_name']} names {modem_name}, ignoring its other settings.")
+				if modem_name not in named_modems:
+					print(f"Unknown modem name {modem_name} in {line['object_name']}.")
+				modem_args = dict(named_modems.get(modem_name, {}))
+			decimation = 1
+			if multirate:
+				# build the modem for the lowest processing rate its band and
+				# symbol rate allow, worked out from its settings alone
+				settings = modems_codecs.chain_builder.ModemSettings(input_sample_rate, modem_args)
+				if settings is not None:
+					decimation = modems_codecs.chain_builder.ModemDecimation(input_sample_rate, settings)
+			if decimation > 1:
+				modem_key = modems_codecs.chain_builder.StageKey(input_sample_rate, decimation, modem_args)
+				if modem_key in shared_stages:
+					modem = shared_stages[modem_key]
+				else:
+					modem = build_stage('modem', modem_args, modem_key, lambda: modems_codecs.chain_builder.DecimatedModemConfigurator(
+						input_sample_rate,
+						decimation,
+						modem_args,
+					))
+					shared_stages[modem_key] = modem
+			else:
+				modem_key = modems_codecs.chain_builder.StageKey(input_sample_rate, modem_args)
+				if modem_key in shared_stages:
+					modem = shared_stages[modem_key]
+				else:
+					modem = build_stage('modem', modem_args, modem_key, lambda: modems_codecs.chain_builder.ModemConfigurator(
+						input_sample_rate,
+						modem_args,
+					))
+					shared_stages[modem_key] = modem
 			#except:
 			#	print(f"Invalid or missing 'modem' in {line['object_name']}.")
 			#	modem = []
+			if modem != []:
+				variant_error = modems_codecs.chain_builder.VariantError(modem, variant)
+				if variant_error is not None:
+					print(f"{variant_error} in {line['object_name']}.")
+					modem = []
+			if modem != []:
+				modem_error = modems_codecs.chain_builder.StageError(modem)
+				if modem_error is not None:
+					print(f"{modem_error} in {line['object_name']}.")
+					modem = []
 			demod_stack[demod_stack_index].append(modem)
 			try:
 				slicer_sample_rate = demod_stack[demod_stack_index][1].output_sample_rate
 			except:
 				slicer_sample_rate = input_sample_rate
 			try:
-				slicer = modems_codecs.chain_builder.SlicerConfigurator(
-					slicer_sample_rate,
-					line['slicer']
-				)
+				slicer_key = modems_codecs.chain_builder.StageKey(modem_key, slicer_sample_rate, line['slicer'], variant)
+				if slicer_key in shared_stages:
+					slicer = shared_stages[slicer_key]
+				else:
+					slicer = build_stage('slicer', line['slicer'], slicer_key, lambda: modems_codecs.chain_builder.SlicerConfigurator(
+						slicer_sample_rate,
+						line['slicer']
+					))
+					shared_stages[slicer_key] = slicer
 			except:
 				print(f"Invalid or missing 'slicer' in {line['object_name']}.")
 				slicer = []
 			demod_stack[demod_stack_index].append(slicer)
 			try:
-				stream = modems_codecs.chain_builder.StreamConfigurator(line['stream'])
+				stream_key = modems_codecs.chain_builder.StageKey(line['stream'])
+				stream = build_stage('stream', line['stream'], stream_key, lambda: modems_codecs.chain_builder.StreamConfigurator(line['stream']))
 			except:
 				print(f"Invalid or missing 'stream' in {line['object_name']}.")
 				stream = []
 			demod_stack[demod_stack_index].append(stream)
 			try:
-				codec = modems_codecs.chain_builder.CodecConfigurator(
+				codec_key = modems_codecs.chain_builder.StageKey(line['codec'], line['object_name'])
+				codec = build_stage('codec', line['codec'], codec_key, lambda: modems_codecs.chain_builder.CodecConfigurator(
 					line['codec'],
 					line['object_name']
-				)
+				))
 			except:
 				print(f"Invalid or missing 'codec' in {line['object_name']}.")
 				codec = []
 			demod_stack[demod_stack_index].append(codec)
+			demod_stack[demod_stack_index].append(variant)
 			demod_stack_index += 1
+		elif object_type == 'modem':
+			print(f"Line {line_number}: {line.get('object_name')}")
 		elif object_type == 'report':
 			report_stack.append([])
 			try:
 				report_stack[report_stack_index].append(line['object_name'])
 				print(f"Line {line_number}: {report_stack[report_stack_index][0]}")
 			except:
-				print(f"Missing 'object_name' in {sys.argv[1]} line {line_number}, skipping this reporter.")
+				print(f"Missing 'object_name' in {config_name} line {line_number}, skipping this reporter.")
 				report_stack_index += 1
 				# go to the next iteration of the for loop
 				continue
@@ -129,55 +188,569 @@ def main():
 			except:
 				print(f"Invalid or missing 'style' in {line['object_name']}.")
 				report = []
+			if report != [] and report.destination == 'kiss_tcp':
+				# listen from the start, so clients can connect before decoding
+				try:
+					from modems_codecs.kiss_server import get_server
+					get_server(report.host, report.port)
+				except OSError as error:
+					print(f"Unable to start KISS server for {line['object_name']}: {error}, skipping this reporter.")
+					report_stack.pop()
+					continue
 			report_stack[report_stack_index].append(report)
+			report_stack_index += 1
 
-	print("Executing demod stack plan.")
+	if plan_cache is not None:
+		print(f"Plan cache: {plan_cache.hits} stages loaded, {plan_cache.misses} built")
+	# Merge chains with shared modem and slicer stages into trees.
+	demod_trees = modems_codecs.chain_builder.ChainTreeBuilder(demod_stack, input_sample_rate)
+	return demod_trees, report_stack
 
-	start_time = time.time()
-	# Start the processed processes.
-	# Each signal chain exists in its own process.
-
-	decoded_data_queue = Queue()
-
-	chain_process_list = []
-	process_count = 0
-	for chain in demod_stack:
-		chain_process_list.append(
-			Process(
-				target = modems_codecs.chain_execute.multiprocess_chain,
-				args = ([chain, input_audio, decoded_data_queue])
+def expand_audio_files(audio_args, manifest_filename):
+	# Audio files may be named directly, by glob pattern (quoted, so the shell
+	# leaves it alone), or one per line in a manifest file.
+	audio_filenames = []
+	for audio_arg in audio_args:
+		if glob.has_magic(audio_arg):
+			audio_filenames.extend(sorted(glob.glob(audio_arg)))
+		else:
+			audio_filenames.append(audio_arg)
+	if manifest_filename:
+		manifest = open(manifest_filename, 'r')
+		for line in manifest:
+			line = line.strip()
+			if line and not line.startswith('#'):
+				audio_filenames.append(line)
+		manifest.close()
+	return audio_filenames
+
+def send_kiss(packets, report_order):
+	# Queue each valid packet, without its CRC, for the report's KISS clients.
+	from modems_codecs.kiss_server import get_server
+	server = get_server(report_order[1].host, report_order[1].port)
+	count = 0
+	for packet in packets:
+		if packet.ValidCRC and packet.ValidHeader:
+			server.send(packet.data[:-2])
+			count += 1
+	return f"{report_order[0]}: sent {count} frames to KISS clients on {server.host}:{server.port}\n"
+
+def write_stage_stats(filename, stage_stats):
+	stats_file = open(filename, 'w')
+	json.dump(stage_stats, stats_file, indent=1)
+	stats_file.close()
+	print(f"Wrote {filename}")
+
+def close_kiss_servers():
+	# The KISS server module (and asyncio) is only imported by configs with a
+	# kiss_tcp report.
+	kiss_server = sys.modules.get('modems_codecs.kiss_server')
+	if kiss_server is not None:
+		kiss_server.close_servers()
+
+def correlate_and_report(results, report_stack, stage_stats, audio_seconds):
+	# results is a PacketMetaArray holding every frame of one file, already
+	# correlated frame by frame as the chains reported them.
+	results.Tally()
+
+	string_output = ''
+	for report_order in report_stack:
+		if report_order[1] != [] and report_order[1].destination == 'kiss_tcp':
+			# each frame was sent as soon as it was found to be unique
+			string_output += f"{report_order[0]}: sent {results.CountGood()} frames to KISS clients on {report_order[1].host}:{report_order[1].port}\n"
+			continue
+		if report_order[1] != [] and report_order[1].style == 'stage_timing':
+			string_output += f"Generating {report_order[0]}\n"
+			string_output += StageTimingReport(stage_stats, audio_seconds) + "\n"
+			continue
+		string_output += f"Generating {report_order[0]}\n"
+		string_output += results.PrintRawBad() + "\n"
+		string_output += results.Report(report_order[1]) + "\n"
+	return string_output
+
+def run_live(args, stack_plan, plan_cache):
+	# Decode raw PCM from stdin or a named pipe as it arrives. Every demod tree
+	# runs in its own long-lived worker, and frames are printed as soon as one
+	# chain decodes them and correlation shows they are not duplicates.
+	raw_format = args.raw_format or 's16le'
+	input_sample_rate = args.raw_rate
+	if len(args.audio) == 0 or args.audio == ['-']:
+		stream = sys.stdin.buffer
+	else:
+		try:
+			stream = open(args.audio[0], 'rb')
+		except OSError:
+			print(f'Unable to open audio stream {args.audio[0]}.')
+			sys.exit(4)
+	demod_trees, report_stack = build_stacks(stack_plan, input_sample_rate, args.config, plan_cache)
+	block_size = args.block_size
+	if block_size < 1:
+		block_size = max(1, round(args.max_latency * input_sample_rate / BLOCKS_PER_LATENCY))
+	correlator = LiveCorrelator(address_distance=input_sample_rate/40)
+	distributor = BlockDistributor(trees=demod_trees)
+	distributor.start(read_raw_blocks(stream, RAW_FORMATS[raw_format], 1, block_size))
+	print(f"Decoding {raw_format} at {input_sample_rate} samples per second in blocks of {block_size} samples.", flush=True)
+	# chain name: stage stats, sent by each worker when the stream ends
+	stage_stats = {}
+	stream_sample_count = 0
+	# input samples each running tree has processed
+	progress = {tree_index: 0 for tree_index in range(len(demod_trees))}
+	# stream address each running tree's slicers have reached
+	reached = {tree_index: 0 for tree_index in range(len(demod_trees))}
+	try:
+		while len(progress) > 0:
+			try:
+				message = distributor.result_queue.get(timeout=distributor.crash_check_interval)
+			except Empty:
+				# nothing is left in the queue, so a dead worker didn't finish
+				for tree_index in distributor.dead_workers():
+					if tree_index in progress:
+						print(f"{demod_trees[tree_index].names()} worker exited with code {distributor.workers[tree_index][0].exitcode}")
+						del progress[tree_index]
+						reached.pop(tree_index, None)
+				continue
+			if message[0] == 'frame':
+				if correlator.add(message[3]):
+					print(print_decoded_packet_to_string(message[3], correlator.good_count), end='', flush=True)
+					for report_order in report_stack:
+						if report_order[1] != [] and report_order[1].destination == 'kiss_tcp':
+							send_kiss([message[3]], report_order)
+			elif message[0] == 'block':
+				progress[message[1]] = message[2]
+				reached[message[1]] = message[3]
+				stream_sample_count = max(stream_sample_count, message[2])
+				correlator.expire(min(reached.values()))
+			elif message[0] == 'error':
+				print(f"{demod_trees[message[1]].names()} failed:\n{message[2]}")
+			elif message[0] == 'stats':
+				for chain, chain_stats in zip(demod_trees[message[1]].chains(), message[2]):
+					stage_stats[chain[0]] = chain_stats
+			elif message[0] == 'done':
+				progress.pop(message[1], None)
+				# a finished tree reports no more frames
+				reached.pop(message[1], None)
+	except KeyboardInterrupt:
+		print("\nInterrupted.")
+	distributor.close()
+	close_kiss_servers()
+	print(correlator.Summary(), end='')
+	for report_order in report_stack:
+		if report_order[1] != [] and report_order[1].style == 'stage_timing':
+			print(f"Generating {report_order[0]}")
+			print(StageTimingReport(stage_stats, stream_sample_count / input_sample_rate))
+	if args.stage_stats:
+		write_stage_stats(args.stage_stats, {'live': stage_stats})
+
+def main():
+	# check correct version of Python
+	if sys.version_info < (3, 0):
+		print("Python version should be 3.x, exiting")
+		sys.exit(1)
+	# check correct parameters were passed to command line
+	# argparse exits with code 2 on a usage error
+	parser = argparse.ArgumentParser(
+		description="Demodulate, slice, and decode packets from audio files."
+	)
+	parser.add_argument('config', help="config json file")
+	parser.add_argument('audio', nargs='*', help="sound files or quoted glob patterns")
+	parser.add_argument(
+		'--manifest',
+		help="text file listing sound files to process, one per line"
+	)
+	parser.add_argument(
+		'--output-dir',
+		help="write the report for each sound file to <output-dir>/<sound file name>.txt"
+	)
+	parser.add_argument(
+		'--block-size',
+		type=int,
+		default=0,
+		help="stream the audio through each chain in blocks of this many samples (0 processes the whole file at once)"
+	)
+	parser.add_argument(
+		'--mmap',
+		action='store_true',
+		help="memory-map the sound files instead of loading them, and process them in blocks"
+	)
+	parser.add_argument(
+		'--raw-format',
+		choices=sorted(RAW_FORMATS),
+		help="the sound files are headerless PCM in this format, memory-mapped"
+	)
+	parser.add_argument(
+		'--raw-rate',
+		type=int,
+		default=48000,
+		help="sample rate of raw PCM sound files (default 48000)"
+	)
+	parser.add_argument(
+		'--live',
+		action='store_true',
+		help="decode raw PCM (--raw-format, default s16le) from stdin, or the named pipe given as the sound file, as it arrives"
+	)
+	parser.add_argument(
+		'--max-latency',
+		type=float,
+		default=1.0,
+		help="with --live, the longest time in seconds from a frame's end to its output, while chains keep up (default 1.0)"
+	)
+	parser.add_argument(
+		'--segments',
+		type=int,
+		default=1,
+		help="split each file into this many overlapping segments, decoded in parallel by every chain"
+	)
+	parser.add_argument(
+		'--squelch',
+		action='store_true',
+		help="decode only the stretches of each file whose energy stands above the noise floor, the quietest 0.2 s of the file (not with --live). On a file with no 0.2 s of quiet the floor is measured on signal, and weaker signals may be skipped"
+	)
+	parser.add_argument(
+		'--squelch-threshold',
+		type=float,
+		default=6.0,
+		help="with --squelch, dB above the noise floor that counts as a signal (default 6)"
+	)
+	parser.add_argument(
+		'--squelch-padding',
+		type=float,
+		default=0.5,
+		help="with --squelch, seconds of audio also decoded before and after each signal (default 0.5)"
+	)
+	parser.add_argument(
+		'--multirate',
+		action='store_true',
+		help="run each modem at the lowest whole fraction of the input sample rate that holds its band, on input decimated once per file and rate (not with --live)"
+	)
+	parser.add_argument(
+		'--plan-cache',
+		nargs='?',
+		const=DEFAULT_CACHE_DIR,
+		default=None,
+		help=f"cache built processing stages in a directory, and load them in later runs (default {DEFAULT_CACHE_DIR})"
+	)
+	parser.add_argument(
+		'--plan-cache-size',
+		type=float,
+		default=DEFAULT_CACHE_MEGABYTES,
+		help=f"with --plan-cache, megabytes kept in the cache, least recently used stages are removed first (default {DEFAULT_CACHE_MEGABYTES})"
+	)
+	parser.add_argument(
+		'--workers',
+		type=int,
+		default=0,
+		help="number of worker processes (default: one per available CPU)"
+	)
+	parser.add_argument(
+		'--pin-cpus',
+		action='store_true',
+		help="pin each worker process to its own CPU"
+	)
+	parser.add_argument(
+		'--stage-stats',
+		help="write the time and item counts of each stage of each chain to this JSON file"
+	)
+	parser.add_argument(
+		'--profile',
+		nargs='?',
+		const='pymodem_profile',
+		metavar='PREFIX',
+		help="profile every chain in its worker, print the merged profile, and write PREFIX.pstats and PREFIX.collapsed (default prefix pymodem_profile; not with --live)"
+	)
+	parser.add_argument(
+		'--timings',
+		action='store_true',
+		help="order chains by, and record, measured per-chain timings stored in <config>.timings"
+	)
+	args = parser.parse_args()
+	# try to open configuration json
+	try:
+		configfile = open(args.config, 'r')
+		stack_plan = []
+		for line in configfile:
+			stack_plan.append(json.loads(line))
+		configfile.close()
+	except:
+		print('Unable to open config json file.')
+		sys.exit(3)
+	# With --plan-cache, built stages are cached on disk, so later runs skip
+	# filter design and table generation.
+	plan_cache = None
+	if args.plan_cache is not None:
+		plan_cache = PlanCache(directory=args.plan_cache, max_bytes=round(args.plan_cache_size * 1e6))
+	if args.live:
+		run_live(args, stack_plan, plan_cache)
+		return
+	try:
+		audio_filenames = expand_audio_files(args.audio, args.manifest)
+	except OSError:
+		print('Unable to open manifest file.')
+		sys.exit(4)
+	if len(audio_filenames) == 0:
+		print('No audio files to process.')
+		sys.exit(4)
+	batch = len(audio_filenames) > 1
+
+	timings_filename = args.config + '.timings'
+	timings = {}
+	if args.timings:
+		timings = modems_codecs.chain_builder.LoadTimings(timings_filename)
+
+	# Stacks are built once per input sample rate and reused for every file
+	# at that rate. Each job receives its own copy of the tuned stage objects.
+	plans = {}
+	# State of the files currently being processed, by file index
+	open_files = {}
+	# job_id: [file index, DemodTree, input samples the job decodes]
+	job_files = {}
+	# audio filename: stage stats of each chain, by chain name
+	all_stage_stats = {}
+	# TreeKey: raw cProfile stats of each job that ran the tree
+	profiles = {}
+	# audio_filenames index of the next file to start
+	next_file = [0]
+
+	def load_next_file():
+		# Read the next readable audio file and build its stacks if needed.
+		# Returns the file state, or None when no files are left.
+		while next_file[0] < len(audio_filenames):
+			file_index = next_file[0]
+			next_file[0] += 1
+			filename = audio_filenames[file_index]
+			block_size = args.block_size
+			# try to open audio file
+			try:
+				audio_source = None
+				if args.raw_format:
+					audio_source = open_mapped_raw(filename, args.raw_rate, args.raw_format)
+				elif args.mmap:
+					try:
+						audio_source = open_mapped_wav(filename)
+					except ValueError:
+						print(f'{filename} can not be memory-mapped, loading it.')
+				if audio_source is None:
+					# scipy.io is slow to import, and not needed by live or raw runs
+					from scipy.io.wavfile import read as readwav
+					input_sample_rate, input_audio = readwav(filename)
+					# Place the audio in shared memory once. Each process attaches
+					# to it rather than receiving its own pickled copy.
+					audio_source = SharedAudio(input_audio)
+					del input_audio
+				else:
+					# Mapped files are worked through in blocks, so no process
+					# ever holds a float64 copy of the whole recording.
+					input_sample_rate = audio_source.sample_rate
+					if block_size < 1:
+						block_size = round(DEFAULT_BLOCK_SECONDS * input_sample_rate)
+			except:
+				print(f'Unable to open audio file {filename}.')
+				if not batch:
+					sys.exit(4)
+				continue
+			if input_sample_rate not in plans:
+				plans[input_sample_rate] = build_stacks(stack_plan, input_sample_rate, args.config, plan_cache, args.multirate)
+			demod_trees, report_stack = plans[input_sample_rate]
+			sample_count = audio_source.sample_count
+			regions = None
+			active_sample_count = sample_count
+			if args.squelch:
+				regions = find_active_regions(audio_source, input_sample_rate, demod_trees)
+				active_sample_count = sum(end - start for start, end in regions)
+				print(f"Squelch: {len(regions)} active regions, {round(100 * active_sample_count / max(sample_count, 1), 1)}% of {filename}")
+			# Each decimated version of the audio is made once and shared by
+			# every tree that runs at that rate.
+			audio_sources = {1: audio_source}
+			for tree in demod_trees:
+				if tree.decimation not in audio_sources:
+					from modems_codecs.resample import decimate_audio
+					audio_sources[tree.decimation] = decimate_audio(audio_source, tree.decimation)
+					print(f"Decimated {filename} to {input_sample_rate // tree.decimation} Hz")
+			# Order the trees longest-first so the slowest one doesn't start last.
+			demod_trees = sorted(
+				demod_trees,
+				key = lambda tree: modems_codecs.chain_builder.EstimateTreeCost(tree, active_sample_count, timings),
+				reverse = True
 			)
+			return {
+				'index': file_index,
+				'filename': filename,
+				'sample_rate': input_sample_rate,
+				'sample_count': sample_count,
+				'regions': regions,
+				'audio_sources': audio_sources,
+				'block_size': block_size,
+				'demod_trees': demod_trees,
+				'report_stack': report_stack,
+				'jobs_running': 0,
+				'results': PacketMetaArray(address_distance=input_sample_rate/40),
+				'stage_stats': {},
+				'start_time': time.time()
+			}
+		return None
+
+	def find_active_regions(audio_source, input_sample_rate, demod_trees):
+		# One vectorized pass over the recording. Every chain then skips the
+		# silence between the regions found. Energy is measured in the input
+		# bands of the modems, or over the whole spectrum if any modem's band
+		# is unknown.
+		bands = [modems_codecs.chain_builder.ModemBand(tree.modem) for tree in demod_trees]
+		if None in bands:
+			bands = [[100.0, 20000.0]]
+		squelch = Squelch(
+			sample_rate = input_sample_rate,
+			bands = bands,
+			threshold_db = args.squelch_threshold,
+			padding_seconds = args.squelch_padding
+		)
+		audio = audio_source.attach()
+		if audio.ndim > 1:
+			audio = audio[:, 0]
+		return squelch.active_regions(audio)
+
+	def submit_file(audio_file):
+		# Each demod tree is one job on the worker pool, or one job per segment
+		# with --segments, and reports one result per chain.
+		open_files[audio_file['index']] = audio_file
+		print(f"Executing demod stack plan for {audio_file['filename']}.")
+		for tree in audio_file['demod_trees']:
+			if args.segments > 1:
+				segments = modems_codecs.chain_builder.PlanSegments(
+					audio_file['sample_count'],
+					args.segments,
+					modems_codecs.chain_builder.SegmentOverlap(tree)
+				)
+			else:
+				segments = [None]
+			for segment in segments:
+				target = modems_codecs.chain_execute.multiprocess_tree
+				audio_source = audio_file['audio_sources'][tree.decimation]
+				job_args = [tree, audio_source, audio_file['block_size'], segment, audio_file['regions']]
+				if args.profile:
+					# run the job under cProfile, which sends its stats back first
+					job_id = pool.submit(profiled_job, [target, job_args])
+				else:
+					job_id = pool.submit(target, job_args)
+				if segment is None:
+					job_sample_count = audio_file['sample_count']
+					print(f"queued job {job_id}: {tree.names()}")
+				else:
+					job_sample_count = segment[2] - segment[0]
+					print(f"queued job {job_id}: {tree.names()} samples {segment[0]} to {segment[2]}")
+				job_files[job_id] = [audio_file['index'], tree, job_sample_count]
+				audio_file['jobs_running'] += 1
+		if audio_file['jobs_running'] == 0:
+			finish_file(audio_file)
+
+	def finish_file(audio_file):
+		for audio_source in audio_file['audio_sources'].values():
+			audio_source.unlink()
+		del open_files[audio_file['index']]
+		print(f"Correlating results for {audio_file['filename']}.")
+		string_output = correlate_and_report(
+			audio_file['results'],
+			audio_file['report_stack'],
+			audio_file['stage_stats'],
+			audio_file['sample_count'] / audio_file['sample_rate']
 		)
-		chain_process_list[process_count].start()
-		print(f"started process {process_count}")
-		process_count += 1
+		all_stage_stats[audio_file['filename']] = audio_file['stage_stats']
+		string_output += f"Elapsed time: {round(time.time()-audio_file['start_time'], 2)} seconds.\n"
+		if args.output_dir:
+			report_filename = os.path.join(
+				args.output_dir,
+				os.path.basename(audio_file['filename']) + '.txt'
+			)
+			report_file = open(report_filename, 'w')
+			report_file.write(string_output)
+			report_file.close()
+			print(f"Wrote {report_filename}")
+		else:
+			if batch:
+				print(f"Results for {audio_file['filename']}")
+			print(string_output, end='')
+		# keep the pool fed, with a bounded number of files in memory
+		while len(open_files) < files_in_flight:
+			audio_file = load_next_file()
+			if audio_file is None:
+				break
+			submit_file(audio_file)
 
-	print(f"{process_count} processes running")
+	def on_message(message):
+		if message[0] == 'frame':
+			# correlate each frame as it arrives, so KISS clients get it now
+			# rather than when the slowest chain finishes
+			audio_file = open_files[job_files[message[1]][0]]
+			packet = message[3]
+			is_unique = audio_file['results'].AddPacket(packet)
+			if is_unique:
+				for report_order in audio_file['report_stack']:
+					if report_order[1] != [] and report_order[1].destination == 'kiss_tcp':
+						send_kiss([packet], report_order)
+		elif message[0] == 'chain':
+			audio_file = open_files[job_files[message[1]][0]]
+			if message[2] in audio_file['stage_stats']:
+				# another segment of the same chain
+				AddStatsDict(audio_file['stage_stats'][message[2]], message[4])
+			else:
+				audio_file['stage_stats'][message[2]] = message[4]
+			print(f"{message[2]} complete, {message[3]} frames")
+		elif message[0] == 'profile':
+			tree_key = modems_codecs.chain_builder.TreeKey(job_files[message[1]][1])
+			profiles.setdefault(tree_key, []).append(message[2])
+		elif message[0] == 'error':
+			print(f"Job {message[1]} {job_files[message[1]][1].names()} failed:\n{message[2]}")
+		elif message[0] == 'done':
+			file_index, tree, job_sample_count = job_files.pop(message[2])
+			audio_file = open_files[file_index]
+			if args.timings and message[3] > 0:
+				timings[modems_codecs.chain_builder.TreeKey(tree)] = message[3] / max(job_sample_count, 1)
+			audio_file['jobs_running'] -= 1
+			if audio_file['jobs_running'] == 0:
+				finish_file(audio_file)
 
-	decoded_datas = []
-	running_process_count = process_count
-	while running_process_count > 0:
-		while not decoded_data_queue.empty():
-			decoded_datas.append(decoded_data_queue.get())
-			running_process_count -= 1
-			print(f"{running_process_count} processes running")
+	if args.output_dir:
+		os.makedirs(args.output_dir, exist_ok=True)
 
-	for i in range(process_count):
-		chain_process_list[i].join()
+	start_time = time.time()
 
-	print("Correlating results.")
+	first_file = load_next_file()
+	if first_file is None:
+		print('No audio files could be opened.')
+		sys.exit(4)
 
-	results = PacketMetaArray()
-	for decoded_data in decoded_datas:
-		results.add(decoded_data)
+	worker_count = args.workers
+	if worker_count < 1:
+		worker_count = len(available_cpus())
+	worker_count = max(1, min(worker_count, len(first_file['demod_trees']) * max(1, args.segments) * len(audio_filenames)))
+	# Files waiting in shared memory for a free worker. Enough to keep every
+	# worker busy without loading the whole batch at once.
+	files_in_flight = max(2, worker_count)
+	pool = WorkerPool(worker_count=worker_count, pin_cpus=args.pin_cpus)
+	print(f"{worker_count} worker processes running")
 
-	results.CalcCRCs()
-	results.Correlate(address_distance=input_sample_rate/40)
+	submit_file(first_file)
+	while len(open_files) < files_in_flight:
+		audio_file = load_next_file()
+		if audio_file is None:
+			break
+		submit_file(audio_file)
 
-	for report_order in report_stack:
-		print(f"Generating {report_order[0]}")
-		print(results.PrintRawBad())
-		print(results.Report(report_order[1]))
+	# Blocks until every job is done, or lost with its worker. Files finishing
+	# start the next files from within on_message.
+	pool.run(on_message)
+	pool.close()
+
+	close_kiss_servers()
+
+	if args.stage_stats:
+		write_stage_stats(args.stage_stats, all_stage_stats)
+
+	if args.profile and len(profiles) > 0:
+		print(ProfileReport(profiles), end='')
+		for filename in WriteProfiles(args.profile, profiles):
+			print(f"Wrote {filename}")
+
+	if args.timings:
+		modems_codecs.chain_builder.SaveTimings(timings_filename, timings)
 
 	end_time = time.time()
 	print(f"Elapsed time: {round(end_time-start_time, 2)} seconds.")
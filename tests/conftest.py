@@ -0,0 +1,9 @@
+# Python3
+# Test setup: import pymodem and modems_codecs from the repository root
+# Nino Carrillo
+# 17 Oct 2026
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
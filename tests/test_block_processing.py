@@ -0,0 +1,141 @@
+# Python3
+# Tests that stages give the same output block by block as on a whole buffer
+# Nino Carrillo
+# 17 Oct 2026
+
+import pytest
+from numpy import allclose, arange, array_equal, concatenate, linspace, sin
+from numpy.random import default_rng
+
+from modems_codecs.fir import FIR
+from modems_codecs.agc import AGC
+from modems_codecs.nco import NCO
+from modems_codecs.psk import BPSKModem, QPSKModem, MPSKModem
+from modems_codecs.synthetic import psk_signal
+
+# Uneven block sizes, so block boundaries fall everywhere relative to filter
+# lengths, AGC windows and loop blocks.
+BLOCK_SIZES = [1, 7, 64, 333, 1000, 4097]
+
+def blocks(samples):
+	# consecutive blocks of samples, cycling through BLOCK_SIZES
+	result = []
+	start = 0
+	index = 0
+	while start < len(samples):
+		size = BLOCK_SIZES[index % len(BLOCK_SIZES)]
+		result.append(samples[start:start + size])
+		start += size
+		index += 1
+	return result
+
+def burst_audio(sample_count, seed):
+	# noise, then a tone that rises in level, then louder noise, so the AGC
+	# attacks, sustains and decays
+	rng = default_rng(seed)
+	third = sample_count // 3
+	tone = 3000.0 * sin(arange(third) * 0.3) * linspace(0.1, 1.0, third)
+	return concatenate((rng.normal(0, 50, third), tone, rng.normal(0, 80, sample_count - 2 * third)))
+
+@pytest.mark.parametrize('method', ['direct', 'fft'])
+@pytest.mark.parametrize('tap_count', [1, 31, 200])
+def test_fir_blocks_match_whole_buffer(method, tap_count):
+	rng = default_rng(tap_count)
+	taps = rng.normal(size=tap_count)
+	samples = rng.normal(size=20000)
+	whole = FIR(taps=taps, method=method).update(samples)
+	block_filter = FIR(taps=taps, method=method)
+	blocked = concatenate([block_filter.update(block) for block in blocks(samples)])
+	assert len(whole) == len(samples) - tap_count + 1
+	assert allclose(whole, blocked, rtol=0, atol=1e-9)
+	assert allclose(whole, FIR(taps=taps, method='direct').update(samples), rtol=0, atol=1e-9)
+
+def test_fir_reset_forgets_history():
+	rng = default_rng(2)
+	taps = rng.normal(size=40)
+	samples = rng.normal(size=5000)
+	fir = FIR(taps=taps)
+	first = fir.update(samples)
+	fir.reset()
+	assert array_equal(fir.update(samples), first)
+
+def test_agc_running_peak_blocks_match_whole_buffer():
+	# decimation above 1 groups samples from the start of each call, so only
+	# the default per-sample envelope is independent of block boundaries.
+	samples = burst_audio(60000, 1)
+	whole = samples.copy()
+	AGC(sample_rate=8000, running_peak=True).apply(whole)
+	agc = AGC(sample_rate=8000, running_peak=True)
+	blocked = []
+	for block in blocks(samples):
+		block = block.copy()
+		agc.apply(block)
+		blocked.append(block)
+	assert array_equal(whole, concatenate(blocked))
+
+def test_agc_whole_buffer_matches_sample_loop():
+	# Without running_peak, the rates are scaled by the peak of the buffer,
+	# as the per-sample peak detector does.
+	samples = burst_audio(30000, 3)
+	expected = samples.copy()
+	agc = AGC(sample_rate=8000)
+	agc.normal = float(expected.max())
+	for index in range(len(expected)):
+		agc.peak_detect(expected[index])
+		if agc.envelope != 0:
+			expected[index] = agc.target_amplitude * expected[index] / agc.envelope
+	whole = samples.copy()
+	AGC(sample_rate=8000).apply(whole)
+	assert array_equal(whole, expected)
+
+def test_nco_blocks_match_sample_loop():
+	control = default_rng(4).normal(0, 30, 20000)
+	nco = NCO(sample_rate=8000.0, amplitude=1.0, set_frequency=1700.0)
+	sines = []
+	for value in control.tolist():
+		nco.control = value
+		nco.update()
+		sines.append(nco.sine_output)
+	whole_nco = NCO(sample_rate=8000.0, amplitude=1.0, set_frequency=1700.0)
+	whole, whole_cosine = whole_nco.update_block(control)
+	block_nco = NCO(sample_rate=8000.0, amplitude=1.0, set_frequency=1700.0)
+	blocked = concatenate([block_nco.update_block(block)[0] for block in blocks(control)])
+	assert array_equal(whole, sines)
+	assert array_equal(blocked, whole)
+	assert block_nco.phase_accumulator == nco.phase_accumulator
+
+def psk_test_signal(symbols_per_sample, carrier_freq, sample_rate, symbol_rate, seed):
+	rng = default_rng(seed)
+	symbols = symbols_per_sample[rng.integers(0, len(symbols_per_sample), round(4 * symbol_rate))]
+	signal = psk_signal(symbols, sample_rate, symbol_rate, carrier_freq, 0.6)
+	return 8000.0 * signal + rng.normal(0, 300, len(signal))
+
+def demod_output(outputs):
+	# one array of the modem outputs from consecutive blocks, for real or IQ
+	# data
+	if hasattr(outputs[0], 'i_data'):
+		return concatenate([output.i_data for output in outputs] + [output.q_data for output in outputs])
+	return concatenate(outputs)
+
+@pytest.mark.parametrize('modem_class, config, loop_block', [
+	(BPSKModem, '300', 1),
+	(BPSKModem, '300', 8),
+	(QPSKModem, '600', 1),
+	(QPSKModem, '600', 8),
+	(MPSKModem, 'qpsk_600', 8)
+])
+def test_costas_loop_blocks_match_whole_buffer(modem_class, config, loop_block):
+	# The carrier loop runs block by block exactly as over the whole buffer,
+	# with the AGC following the running peak as in block processing.
+	def new_modem():
+		modem = modem_class(sample_rate=8000, config=config)
+		modem.StringOptionsRetune({'loop_block': str(loop_block), 'carrier_freq': '1500'})
+		modem.AGC.running_peak = True
+		return modem
+	constellation = concatenate(([1.0, -1.0], [1j, -1j] if modem_class is not BPSKModem else []))
+	samples = psk_test_signal(constellation, 1503.0, 8000, new_modem().symbol_rate, 5)
+	whole = demod_output([new_modem().demod(samples.copy())])
+	modem = new_modem()
+	blocked = demod_output([modem.demod(block.copy()) for block in blocks(samples)])
+	assert len(blocked) == len(whole)
+	assert allclose(whole, blocked, rtol=0, atol=1e-6 * abs(whole).max())
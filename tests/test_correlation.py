@@ -0,0 +1,65 @@
+# Python3
+# Tests that correlating packets from several decoders removes duplicates
+# Nino Carrillo
+# 17 Oct 2026
+
+import pytest
+
+from modems_codecs.packet_meta import PacketMeta, PacketMetaArray, LiveCorrelator
+from modems_codecs.synthetic import ax25_frame
+
+def packet(text, decoder, address):
+	new_packet = PacketMeta()
+	new_packet.data = ax25_frame(text)
+	new_packet.SourceDecoder = decoder
+	new_packet.streamaddress = address
+	return new_packet
+
+@pytest.fixture(params=['array', 'live'])
+def add_packet(request):
+	# the add function of either correlator, with address_distance 100
+	if request.param == 'array':
+		return PacketMetaArray(address_distance=100).AddPacket
+	return LiveCorrelator(address_distance=100).add
+
+def test_same_frame_from_two_decoders_is_one_packet(add_packet):
+	first = packet('hello', 'afsk_a', 5000)
+	assert add_packet(first)
+	assert not add_packet(packet('hello', 'afsk_b', 5040))
+	assert not add_packet(packet('hello', 'afsk_c', 4960))
+	assert first.CorrelatedDecoders == ['afsk_a', 'afsk_b', 'afsk_c']
+
+def test_same_frame_far_apart_is_two_packets(add_packet):
+	assert add_packet(packet('hello', 'afsk_a', 5000))
+	assert add_packet(packet('hello', 'afsk_b', 5100))
+
+def test_same_frame_from_one_decoder_is_two_packets(add_packet):
+	assert add_packet(packet('hello', 'afsk_a', 5000))
+	assert add_packet(packet('hello', 'afsk_a', 5010))
+
+def test_different_frames_are_two_packets(add_packet):
+	assert add_packet(packet('hello', 'afsk_a', 5000))
+	assert add_packet(packet('world', 'afsk_b', 5000))
+
+def test_bad_crc_is_not_a_packet(add_packet):
+	bad = packet('hello', 'afsk_a', 5000)
+	bad.data[-1] ^= 0x01
+	assert not add_packet(bad)
+	assert add_packet(packet('hello', 'afsk_b', 5000))
+
+def test_array_counts_each_unique_packet_once():
+	packets = PacketMetaArray(address_distance=100)
+	for decoder in ['afsk_a', 'afsk_b', 'afsk_c']:
+		for index, text in enumerate(['one', 'two', 'three']):
+			packets.AddPacket(packet(text, decoder, 1000 * index + len(decoder)))
+	packets.Tally()
+	assert packets.CountGood() == 3
+	assert packets.DecoderHistogram == {'afsk_a': 3, 'afsk_b': 3, 'afsk_c': 3}
+	assert [len(unique.CorrelatedDecoders) for unique in packets.unique_packet_array] == [3, 3, 3]
+
+def test_live_correlator_forgets_expired_packets():
+	correlator = LiveCorrelator(address_distance=100)
+	assert correlator.add(packet('hello', 'afsk_a', 5000))
+	correlator.expire(5200)
+	assert correlator.recent_packets == []
+	assert correlator.DecoderUniqueHistogram == {'afsk_a': 1}
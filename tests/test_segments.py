@@ -0,0 +1,81 @@
+# Python3
+# Tests that decoding a file in segments reports the same packets as decoding
+# it whole
+# Nino Carrillo
+# 17 Oct 2026
+
+import os
+import io
+import json
+import copy
+import contextlib
+import queue
+import pytest
+from scipy.io.wavfile import read as readwav
+
+from pymodem import build_stacks
+from modems_codecs.chain_builder import PlanSegments, SegmentOverlap
+from modems_codecs.chain_execute import multiprocess_tree
+from modems_codecs.packet_meta import PacketMetaArray
+from modems_codecs.shared_audio import SharedAudio
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_FILE = os.path.join(REPO_DIRECTORY, 'audio_samples', 'afsk_300_il2pc_noise.wav')
+CONFIG_FILE = os.path.join(REPO_DIRECTORY, 'configs', 'afsk_300.json')
+# Seconds of the sample to decode, enough for several frames in each of
+# three segments
+SAMPLE_SECONDS = 60
+
+@pytest.fixture(scope='module')
+def recording():
+	sample_rate, audio = readwav(SAMPLE_FILE)
+	audio = audio[:SAMPLE_SECONDS * sample_rate]
+	audio_source = SharedAudio(audio)
+	yield sample_rate, len(audio), audio_source
+	audio_source.unlink()
+
+@pytest.fixture(scope='module')
+def demod_trees(recording):
+	sample_rate = recording[0]
+	stack_plan = []
+	config_file = open(CONFIG_FILE, 'r')
+	for line in config_file:
+		stack_plan.append(json.loads(line))
+	config_file.close()
+	with contextlib.redirect_stdout(io.StringIO()):
+		demod_trees, report_stack = build_stacks(stack_plan, sample_rate, CONFIG_FILE)
+	return demod_trees
+
+def correlated_packets(tree, recording, segments, block_size):
+	# the unique packets, as (frame bytes, stream address) in address order,
+	# from running a copy of tree on each segment
+	sample_rate, sample_count, audio_source = recording
+	results = PacketMetaArray(address_distance=sample_rate / 40)
+	for segment in segments:
+		frame_queue = queue.Queue()
+		multiprocess_tree(copy.deepcopy(tree), audio_source, block_size, segment, None, frame_queue, 0)
+		while not frame_queue.empty():
+			message = frame_queue.get()
+			if message[0] == 'frame':
+				results.AddPacket(message[3])
+	results.Tally()
+	return [(bytes(packet.data), packet.streamaddress) for packet in results.unique_packet_array]
+
+@pytest.mark.parametrize('block_size', [0, 8000])
+def test_segments_report_the_same_packets_as_whole_file(demod_trees, recording, block_size):
+	sample_count = recording[1]
+	frame_count = 0
+	for tree in demod_trees:
+		whole = correlated_packets(tree, recording, [None], block_size)
+		segments = PlanSegments(sample_count, 3, SegmentOverlap(tree))
+		assert len(segments) == 3
+		segmented = correlated_packets(tree, recording, segments, block_size)
+		# Segment boundaries fall between stream bytes at slightly different
+		# samples, so addresses may move by a few samples, but every frame is
+		# decoded once.
+		assert [data for data, address in segmented] == [data for data, address in whole]
+		for (segmented_data, segmented_address), (whole_data, whole_address) in zip(segmented, whole):
+			assert abs(segmented_address - whole_address) < recording[0] / 40
+		frame_count += len(whole)
+	# the sample holds IL2P frames, which some chains decode
+	assert frame_count >= 10
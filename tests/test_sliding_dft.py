@@ -0,0 +1,51 @@
+# Python3
+# Tests that the sliding DFT gives the tone magnitudes of the correlators
+# Nino Carrillo
+# 17 Oct 2026
+
+import pytest
+from numpy import allclose, arange, concatenate, cos, pi, sin, sqrt
+from numpy.random import default_rng
+
+from modems_codecs.fir import FIR
+from modems_codecs.sliding_dft import SlidingDFT
+from modems_codecs.afsk import AFSKModem
+from modems_codecs.synthetic import afsk_signal
+
+def correlator_magnitude(audio, sample_rate, frequency, length):
+	# the quadrature correlator of AFSKModem
+	indices = arange(length) * (2.0 * pi * frequency / sample_rate)
+	return sqrt(FIR(taps=cos(indices)).update(audio) ** 2 + FIR(taps=sin(indices)).update(audio) ** 2)
+
+@pytest.mark.parametrize('sample_rate, frequency', [(8000, 1200.0), (44100, 1300.0), (8000, 2200.0)])
+def test_sliding_dft_matches_correlators(sample_rate, frequency):
+	lengths = [3, 37, 56]
+	audio = default_rng(0).normal(0, 1000, 30000)
+	magnitudes = SlidingDFT(sample_rate=sample_rate, frequency=frequency, lengths=lengths).update(audio)
+	for length, magnitude in zip(lengths, magnitudes):
+		expected = correlator_magnitude(audio, sample_rate, frequency, length)
+		assert len(magnitude) == len(expected)
+		assert allclose(magnitude, expected, rtol=0, atol=1e-6 * expected.max())
+
+def test_sliding_dft_blocks_match_whole_buffer():
+	lengths = [5, 27]
+	audio = default_rng(1).normal(0, 1000, 20000)
+	whole = SlidingDFT(sample_rate=8000, frequency=1600.0, lengths=lengths).update(audio)
+	dft = SlidingDFT(sample_rate=8000, frequency=1600.0, lengths=lengths)
+	# blocks shorter than a window, and longer than the mixer's phasor block
+	parts = [dft.update(audio[start:end]) for start, end in [(0, 2), (2, 13), (13, 5013), (5013, 20000)]]
+	for index in range(len(lengths)):
+		blocked = concatenate([part[index] for part in parts])
+		assert allclose(blocked, whole[index], rtol=0, atol=1e-6 * whole[index].max())
+
+@pytest.mark.parametrize('config', ['300', '1200'])
+def test_afsk_sliding_dft_detector_matches_correlator(config):
+	outputs = []
+	for detector in ['correlator', 'sliding_dft']:
+		modem = AFSKModem(sample_rate=8000, config=config)
+		modem.StringOptionsRetune({'detector': detector})
+		levels = default_rng(2).choice([-1, 1], round(2 * modem.symbol_rate))
+		audio = 8000.0 * afsk_signal(levels, 8000, modem.symbol_rate, modem.mark_freq, modem.space_freq)
+		outputs.append(modem.demod(audio))
+	assert len(outputs[0]) == len(outputs[1])
+	assert allclose(outputs[0], outputs[1], rtol=0, atol=1e-6 * abs(outputs[0]).max())